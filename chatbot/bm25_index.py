@@ -0,0 +1,108 @@
+"""
+Índice invertido BM25 en memoria para la búsqueda textual de FAQs.
+
+Se construye junto al índice vectorial de Firebase a partir de las preguntas
+y respuestas ya cargadas, así que una búsqueda textual no lee Firestore.
+Los tokens se pasan a minúsculas y sin tildes ("matrícula" == "matricula").
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a al algo como con cual cuales cuando de del donde el ella en es esta este esto
+fue ha hay la las le les lo los mas me mi muy no o para pero por que se ser si
+sin sobre su sus te tu un una uno y ya yo
+""".split())
+
+
+def plegar_acentos(texto: str) -> str:
+    """
+    Minúsculas y sin diacríticos (la ñ queda como n).
+    """
+    descompuesto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in descompuesto if unicodedata.category(c) != "Mn")
+
+
+def tokenizar(texto: str) -> List[str]:
+    return [t for t in _TOKEN.findall(plegar_acentos(texto or "")) if t not in STOPWORDS]
+
+
+class IndiceBM25:
+    """
+    BM25 sobre dos campos (pregunta y respuesta). La pregunta pesa más:
+    sus frecuencias se multiplican por peso_pregunta antes de saturar.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, peso_pregunta: float = 2.0):
+        self.k1 = k1
+        self.b = b
+        self.peso_pregunta = peso_pregunta
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.longitudes: List[float] = []
+        self.longitud_media = 0.0
+        self.idf: Dict[str, float] = {}
+        self.idf_desconocido = 0.0
+
+    def __len__(self):
+        return len(self.longitudes)
+
+    @classmethod
+    def construir(cls, documentos: List[Dict], **kwargs) -> "IndiceBM25":
+        """
+        Args:
+            documentos: dicts con 'pregunta' y 'respuesta'; la posición en la lista es el id
+        """
+        indice = cls(**kwargs)
+        postings = defaultdict(list)
+
+        for posicion, doc in enumerate(documentos):
+            frecuencias = Counter()
+            for token in tokenizar(doc.get('pregunta', '')):
+                frecuencias[token] += indice.peso_pregunta
+            for token in tokenizar(doc.get('respuesta', '')):
+                frecuencias[token] += 1.0
+
+            for token, tf in frecuencias.items():
+                postings[token].append((posicion, tf))
+            indice.longitudes.append(sum(frecuencias.values()))
+
+        n = len(indice.longitudes)
+        indice.postings = dict(postings)
+        indice.longitud_media = (sum(indice.longitudes) / n) if n else 0.0
+        indice.idf = {
+            token: math.log(1 + (n - len(lista) + 0.5) / (len(lista) + 0.5))
+            for token, lista in indice.postings.items()
+        }
+        indice.idf_desconocido = math.log(1 + (n + 0.5) / 0.5)
+        return indice
+
+    def buscar(self, consulta: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            lista de (posición, score) con el score normalizado a [0, 1]: fracción
+            del peso IDF de la consulta que el documento cubre (con saturación BM25)
+        """
+        terminos = set(tokenizar(consulta))
+        if not terminos or not self.longitudes:
+            return []
+
+        # Máximo alcanzable: todos los términos presentes con tf alto
+        maximo = sum(self.idf.get(t, self.idf_desconocido) for t in terminos) * (self.k1 + 1)
+
+        scores = defaultdict(float)
+        for termino in terminos:
+            lista = self.postings.get(termino)
+            if not lista:
+                continue
+            idf = self.idf[termino]
+            for posicion, tf in lista:
+                norma = self.k1 * (1 - self.b + self.b * self.longitudes[posicion] / self.longitud_media)
+                scores[posicion] += idf * tf * (self.k1 + 1) / (tf + norma)
+
+        mejores = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(posicion, score / maximo) for posicion, score in mejores]
@@ -0,0 +1,157 @@
+"""
+Eliminación de chunks casi duplicados antes de codificarlos (MinHash + LSH).
+
+Cada documento se representa por sus shingles (3-gramas de tokens sin tildes
+ni stopwords) y una firma MinHash; las bandas LSH de la firma proponen
+candidatos y el duplicado se confirma con la similitud de Jaccard exacta de
+los shingles. Se conserva la primera aparición en el orden del corpus (FAQs,
+web, PDFs) y las FAQs nunca se descartan: se referencian por id desde el
+índice de preguntas y las altas/bajas incrementales.
+"""
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .bm25_index import tokenizar
+
+logger = logging.getLogger(__name__)
+
+TAMANO_SHINGLE = 3
+_PRIMO = np.uint64(4294967311)  # primo > 2^32: (a·x + b) cabe en uint64 con a, b, x < 2^32
+
+ultimo_reporte: Dict = {}  # reporte de la última carga del corpus (ver estado_vector_store)
+
+
+def shingles(texto: str, tamano: int = TAMANO_SHINGLE) -> np.ndarray:
+    """
+    Hashes de 32 bits (estables entre procesos) de los n-gramas de tokens del texto.
+    """
+    tokens = tokenizar(texto)
+    if len(tokens) < tamano:
+        gramas = {" ".join(tokens)} if tokens else set()
+    else:
+        gramas = {" ".join(tokens[i:i + tamano]) for i in range(len(tokens) - tamano + 1)}
+    return np.array(
+        sorted(int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in gramas),
+        dtype=np.uint64
+    )
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    if not len(a) or not len(b):
+        return 0.0
+    interseccion = len(np.intersect1d(a, b, assume_unique=True))
+    return interseccion / (len(a) + len(b) - interseccion)
+
+
+def parametros_lsh(num_permutaciones: int, umbral: float) -> Tuple[int, int]:
+    """
+    (bandas, filas) con bandas·filas = num_permutaciones y el mayor umbral
+    aproximado (1/bandas)^(1/filas) que no supere el umbral de Jaccard pedido:
+    así casi todos los pares por encima del umbral llegan a ser candidatos
+    (la verificación exacta descarta el resto).
+    """
+    opciones = [(num_permutaciones // filas, filas) for filas in range(1, num_permutaciones + 1)
+                if num_permutaciones % filas == 0]
+    aproximado = lambda opcion: (1 / opcion[0]) ** (1 / opcion[1])
+    validas = [opcion for opcion in opciones if aproximado(opcion) <= umbral]
+    return max(validas, key=aproximado) if validas else min(opciones, key=aproximado)
+
+
+class DeduplicadorMinHash:
+    """
+    Índice LSH incremental: agregar() devuelve el dato asociado al texto ya
+    indexado del que el nuevo es casi duplicado, o None si es nuevo.
+    """
+
+    def __init__(self, umbral: float = 0.85, num_permutaciones: int = 128, semilla: int = 1):
+        self.umbral = umbral
+        self.bandas, self.filas = parametros_lsh(num_permutaciones, umbral)
+        rng = np.random.default_rng(semilla)
+        self._a = rng.integers(1, 2 ** 32, size=(num_permutaciones, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=(num_permutaciones, 1), dtype=np.uint64)
+        self._buckets = [defaultdict(list) for _ in range(self.bandas)]
+        self._shingles: List[np.ndarray] = []
+        self._datos: List = []
+
+    def firma(self, hashes: np.ndarray) -> np.ndarray:
+        return ((self._a * hashes[None, :] + self._b) % _PRIMO).min(axis=1)
+
+    def agregar(self, texto: str, dato=None):
+        """
+        Si el texto es nuevo lo indexa (con su dato) para comparar los siguientes.
+
+        Returns:
+            (dato del texto original o None si es nuevo, similitud de Jaccard con el más parecido)
+        """
+        hashes = shingles(texto)
+        if not len(hashes):
+            return None, 0.0
+
+        firma = self.firma(hashes)
+        claves = [firma[i * self.filas:(i + 1) * self.filas].tobytes() for i in range(self.bandas)]
+
+        candidatos = set()
+        for banda, clave in enumerate(claves):
+            candidatos.update(self._buckets[banda].get(clave, ()))
+        mejor, similitud = None, 0.0
+        for candidato in sorted(candidatos):
+            valor = jaccard(hashes, self._shingles[candidato])
+            if valor > similitud:
+                mejor, similitud = candidato, valor
+        if mejor is not None and similitud >= self.umbral:
+            return self._datos[mejor], similitud
+
+        posicion = len(self._shingles)
+        self._shingles.append(hashes)
+        self._datos.append(dato)
+        for banda, clave in enumerate(claves):
+            self._buckets[banda][clave].append(posicion)
+        return None, similitud
+
+
+def deduplicar_documentos(documentos: List, umbral: float = None) -> Tuple[List, Dict]:
+    """
+    Descarta los chunks web/PDF casi duplicados (Jaccard >= umbral) de un
+    documento anterior del corpus. Los documentos conservados no se modifican
+    (su metadata entra en el hash del snapshot y en las respuestas de la API):
+    los conteos quedan solo en el reporte.
+
+    Returns:
+        (documentos conservados, reporte de reducción)
+    """
+    if umbral is None:
+        umbral = getattr(settings, 'CORPUS_DEDUP_THRESHOLD', 0.85)
+    deduplicador = DeduplicadorMinHash(umbral, getattr(settings, 'CORPUS_DEDUP_NUM_PERM', 128))
+
+    conservados = []
+    descartados = Counter()
+    for doc in documentos:
+        original, _ = deduplicador.agregar(doc.page_content, doc)
+        if original is not None and doc.metadata.get("source") != "faq":
+            descartados[doc.metadata.get("source", "otro")] += 1
+            continue
+        conservados.append(doc)
+
+    antes, despues = len(documentos), len(conservados)
+    reporte = {
+        'documentos_antes': antes,
+        'documentos_despues': despues,
+        'descartados': antes - despues,
+        'reduccion': round((antes - despues) / antes, 4) if antes else 0.0,
+        'descartados_por_fuente': dict(descartados),
+        'umbral': umbral,
+        'bandas': deduplicador.bandas,
+        'filas': deduplicador.filas,
+    }
+    ultimo_reporte.clear()
+    ultimo_reporte.update(reporte)
+    logger.info(
+        f"🧬 Deduplicación MinHash: {antes} -> {despues} documentos "
+        f"(-{reporte['reduccion']:.1%}, Jaccard >= {umbral}) {dict(descartados)}"
+    )
+    return conservados, reporte
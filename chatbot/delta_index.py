@@ -0,0 +1,76 @@
+"""
+Escrituras recientes sobre un índice FAISS base compartido.
+
+Los snapshots publicados (vector store, índice de preguntas de FAQ) comparten
+su índice base y acumulan las altas/bajas posteriores en un DeltaVectores
+inmutable: copiarlo cuesta O(escrituras pendientes) en lugar de O(corpus).
+Las búsquedas combinan el índice base (sin las claves retiradas) con una
+búsqueda exacta sobre los vectores del delta, y el dueño del índice lo
+consolida en una copia nueva del base cuando el delta supera
+VECTOR_STORE_DELTA_MAX escrituras.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+
+def maximo_delta() -> int:
+    return max(1, getattr(settings, 'VECTOR_STORE_DELTA_MAX', 256))
+
+
+class DeltaVectores:
+    """
+    Vectores agregados (clave -> (dato, vector unitario)) y claves del índice
+    base que ya no son visibles (eliminadas o reemplazadas). No se modifica:
+    con()/sin() devuelven un delta nuevo.
+    """
+
+    def __init__(self, agregados: Optional[Dict] = None, retirados=frozenset()):
+        self.agregados = agregados if agregados is not None else {}
+        self.retirados = frozenset(retirados)
+        self._matriz = None
+
+    def __len__(self):
+        return len(self.agregados) + len(self.retirados)
+
+    def con(self, clave, dato, vector: np.ndarray, en_base: bool) -> 'DeltaVectores':
+        agregados = dict(self.agregados)
+        agregados.pop(clave, None)  # al final: conserva el orden de escritura
+        agregados[clave] = (dato, np.asarray(vector, dtype="float32").reshape(-1))
+        return DeltaVectores(agregados, self.retirados | {clave} if en_base else self.retirados)
+
+    def sin(self, clave, en_base: bool) -> 'DeltaVectores':
+        agregados = dict(self.agregados)
+        agregados.pop(clave, None)
+        return DeltaVectores(agregados, self.retirados | {clave} if en_base else self.retirados)
+
+    def matriz(self) -> np.ndarray:
+        """
+        Vectores agregados apilados en orden de escritura (se calcula una sola vez).
+        """
+        if self._matriz is None:
+            self._matriz = np.vstack([vector for _, vector in self.agregados.values()]).astype("float32")
+        return self._matriz
+
+    def buscar(self, consulta: np.ndarray, top_k: int,
+               filtro: Optional[Callable] = None) -> List[Tuple[object, object, float]]:
+        """
+        Búsqueda exacta por producto interno (coseno) sobre los vectores agregados.
+
+        Returns:
+            lista de (clave, dato, score) de mayor a menor score
+        """
+        if not self.agregados or top_k <= 0:
+            return []
+        scores = self.matriz() @ np.asarray(consulta, dtype="float32").reshape(-1)
+        claves = list(self.agregados)
+        resultados = []
+        for posicion in np.argsort(-scores):
+            clave = claves[posicion]
+            if filtro is not None and not filtro(clave):
+                continue
+            resultados.append((clave, self.agregados[clave][0], float(scores[posicion])))
+            if len(resultados) == top_k:
+                break
+        return resultados
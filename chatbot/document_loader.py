@@ -17,91 +17,137 @@ def indexar_pdfs_en_directorio(directorio=None):
 import pandas as pd
 import os
 import re
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import math
 from langchain.schema import Document
 import csv
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from django.conf import settings
 from django.utils import timezone
 import logging
-from .firebase_service import firebase_service
+from .firebase_service import firebase_service, CAMPOS_FAQ_INDEXACION
+from .pdf_ingestion import ingerir_pdfs
+from .dedup import deduplicar_documentos
 
 logger = logging.getLogger(__name__)
 
 # Ruta base de documentos
 BASE_DIR = os.path.join("media", "docs")
 
+# Líneas que suelen ser navegación o títulos, en un solo patrón precompilado
+_PATRON_BASURA_WEB = re.compile(
+    r'^(?:Saltar al contenido|Alternar menú'
+    r'|QUIÉNES SOMOS|INVESTIGACIÓN|PROYECTOS|PUBLICACIONES|SERVICIOS'
+    r'|Departamentos y Centros|Eventos|Libros|Revistas|Estadísticas|Noticias Vinculación|Convenios'
+    r'|Filosofía|Autoridades|Áreas de Conocimiento|Planta Docente|Horario de Atención|Resultados de la Investigación'
+    r'|Página principal|Inicio|Menú|Información|Descripción)$',
+    re.IGNORECASE
+)
+_SALTOS = re.compile(r'\n+')
+
+
+def _es_linea_basura(linea):
+    return (
+        not linea
+        or _PATRON_BASURA_WEB.match(linea) is not None
+        or (len(linea.split()) <= 2 and linea.isupper())  # evitar encabezados tipo "SERVICIOS"
+        or len(linea) < 5  # saltar texto muy corto que suele ser ruido
+    )
+
+
 def limpiar_contenido_web(texto):
     """
     Limpia texto extraído del sitio web del DCCO para eliminar navegación, encabezados y ruido visual.
     """
-    # 1. Unificar saltos de línea
-    texto = re.sub(r'\n+', '\n', texto)
-    lineas = texto.split("\n")
-    lineas_limpias = []
-
-    # 2. Definir patrones de líneas que suelen ser navegación o títulos
-    patrones_basura = [
-        r'^(Saltar al contenido|Alternar menú)$',
-        r'^(QUIÉNES SOMOS|INVESTIGACIÓN|PROYECTOS|PUBLICACIONES|SERVICIOS)$',
-        r'^(Departamentos y Centros|Eventos|Libros|Revistas|Estadísticas|Noticias Vinculación|Convenios)$',
-        r'^(Filosofía|Autoridades|Áreas de Conocimiento|Planta Docente|Horario de Atención|Resultados de la Investigación)$',
-        r'^Página principal$', r'^Inicio$', r'^Menú$', r'^Información$', r'^Descripción$'
-    ]
-
-    for linea in lineas:
-        linea = linea.strip()
-        if not linea:
-            continue
-        if any(re.match(p, linea, re.IGNORECASE) for p in patrones_basura):
-            continue
-        if len(linea.split()) <= 2 and linea.isupper():
-            continue  # evitar encabezados tipo "SERVICIOS"
-        if len(linea) < 5:
-            continue  # saltar texto muy corto que suele ser ruido
-
-        lineas_limpias.append(linea)
-
-    return "\n".join(lineas_limpias).strip()
+    lineas = (linea.strip() for linea in _SALTOS.sub('\n', texto).split("\n"))
+    return "\n".join(linea for linea in lineas if not _es_linea_basura(linea)).strip()
+
+
+def limpiar_columna_web(contenidos):
+    """
+    Versión vectorizada de limpiar_contenido_web para toda la columna 'Contenido'.
+    Además descarta el boilerplate entre páginas (menús, pies, avisos): líneas que
+    se repiten en al menos WEB_BOILERPLATE_MIN_RATIO de las páginas (y como mínimo
+    en WEB_BOILERPLATE_MIN_PAGES).
+
+    Returns:
+        pd.Series con el contenido limpio, mismo índice que la entrada
+    """
+    lineas = contenidos.astype(str).str.replace(_SALTOS, '\n', regex=True).str.split('\n').explode().str.strip()
+
+    # Reglas por línea, sobre todas las páginas a la vez
+    palabras = lineas.str.split().str.len().fillna(0)
+    basura = (
+        (lineas == '')
+        | lineas.str.match(_PATRON_BASURA_WEB).fillna(False).astype(bool)
+        | ((palabras <= 2) & lineas.str.isupper().fillna(False).astype(bool))
+        | (lineas.str.len() < 5)
+    )
+    lineas = lineas[~basura]
+
+    # Frecuencia de cada línea entre páginas distintas
+    paginas = len(contenidos)
+    minimo = max(
+        getattr(settings, 'WEB_BOILERPLATE_MIN_PAGES', 3),
+        math.ceil(getattr(settings, 'WEB_BOILERPLATE_MIN_RATIO', 0.3) * paginas)
+    )
+    if paginas >= minimo:
+        por_linea = pd.Series(lineas.index, index=lineas.values).groupby(level=0).nunique()
+        repetidas = por_linea.index[por_linea >= minimo]
+        if len(repetidas):
+            logger.info(f"Boilerplate web: {len(repetidas)} líneas repetidas en ≥{minimo} de {paginas} páginas, "
+                        f"p. ej. {list(repetidas[:3])}")
+            lineas = lineas[~lineas.isin(repetidas)]
+
+    limpio = lineas.groupby(level=0).agg('\n'.join)
+    return limpio.reindex(contenidos.index, fill_value='').str.strip()
+
+
+def crear_documento_faq(pregunta, respuesta, tipo, **metadata):
+    """
+    Construye el Document de una FAQ con el mismo formato usado al indexar,
+    tanto en la carga inicial como en las altas incrementales.
+    """
+    return Document(
+        page_content=f"Pregunta: {pregunta}\nRespuesta: {respuesta}",
+        metadata={
+            "source": "faq",
+            "tipo": tipo,
+            "pregunta_original": pregunta,
+            "respuesta_original": respuesta,
+            **metadata
+        }
+    )
 
 
 def cargar_faqs_desde_firebase():
     """
-    Carga FAQs desde Firebase Firestore en lugar del CSV
+    Carga FAQs desde Firebase Firestore en lugar del CSV.
+    Si Firebase no está disponible lanza la excepción: el respaldo desde el CSV
+    lo aplica FuenteFAQs (también cuando Firestore excede su timeout).
     """
     print("Cargando FAQs desde Firebase Firestore...")
     
     if not firebase_service.is_connected():
-        print("Firebase no está conectado, cargando desde CSV como fallback")
-        return cargar_faqs_desde_csv()
+        raise RuntimeError("Firebase no está conectado")
     
-    try:
-        faqs = firebase_service.get_all_faqs()
-        docs = []
-        
-        for faq in faqs:
-            contenido = f"Pregunta: {faq['pregunta']}\nRespuesta: {faq['respuesta']}"
-            doc = Document(
-                page_content=contenido,
-                metadata={
-                    "source": "faq",
-                    "tipo": "faq_firebase",
-                    "pregunta_original": faq["pregunta"],
-                    "respuesta_original": faq["respuesta"],
-                    "categoria": faq.get("categoria", ""),
-                    "firebase_id": faq.get("document_id", ""),
-                    "fecha_creacion": faq.get("fecha_creacion"),
-                    "activo": faq.get("activo", True)
-                }
-            )
-            docs.append(doc)
-        
-        print(f"FAQs cargadas desde Firebase: {len(docs)}")
-        return docs
-        
-    except Exception as e:
-        print(f"Error cargando desde Firebase: {e}")
-        print("Fallback: cargando desde CSV")
-        return cargar_faqs_desde_csv()
+    faqs = firebase_service.get_all_faqs(campos=CAMPOS_FAQ_INDEXACION)
+    docs = []
+    
+    for faq in faqs:
+        doc = crear_documento_faq(
+            faq["pregunta"],
+            faq["respuesta"],
+            tipo="faq_firebase",
+            categoria=faq.get("categoria", ""),
+            firebase_id=faq.get("document_id", ""),
+            fecha_creacion=faq.get("fecha_creacion"),
+            activo=faq.get("activo", True)
+        )
+        docs.append(doc)
+    
+    print(f"FAQs cargadas desde Firebase: {len(docs)}")
+    return docs
 
 def cargar_faqs_desde_csv():
     """
@@ -118,16 +164,7 @@ def cargar_faqs_desde_csv():
             df = df.dropna(subset=["Pregunta", "Respuesta"])
             
             for i, row in df.iterrows():
-                contenido = f"Pregunta: {row['Pregunta']}\nRespuesta: {row['Respuesta']}"
-                doc = Document(
-                    page_content=contenido,
-                    metadata={
-                        "source": "faq",
-                        "tipo": "faq_csv",
-                        "pregunta_original": row["Pregunta"],
-                        "respuesta_original": row["Respuesta"]
-                    }
-                )
+                doc = crear_documento_faq(row["Pregunta"], row["Respuesta"], tipo="faq_csv")
                 docs.append(doc)
             
             print(f"FAQs cargadas desde CSV: {len(docs)}")
@@ -137,95 +174,174 @@ def cargar_faqs_desde_csv():
     
     return docs
 
+def cargar_contenido_web():
+    """
+    Contenido web DCCO (scraping limpio) desde contenido_web_dcco.csv.
+    """
+    docs = []
+    web_csv = os.path.join(BASE_DIR, "contenido_web_dcco.csv")
+    if not os.path.exists(web_csv):
+        return docs
+
+    df = pd.read_csv(web_csv)
+    df = df.dropna(subset=["Titulo", "Contenido"])
+    df["Contenido"] = limpiar_columna_web(df["Contenido"])
+    urls = df["URL"] if "URL" in df.columns else pd.Series("", index=df.index)
+
+    for titulo, url, contenido_limpio in zip(df["Titulo"], urls, df["Contenido"]):
+        if not contenido_limpio:
+            continue  # la página era solo navegación
+        doc = Document(
+            page_content=contenido_limpio,
+            metadata={
+                "source": "web",
+                "tipo": "web",
+                "titulo": titulo,
+                "url": url
+            }
+        )
+        docs.append(doc)
+        print(f"[WEB] {titulo} cargado desde {url}")
+    return docs
+
+
+# --------- FUENTES DEL CORPUS ---------
+
+class FuenteCorpus:
+    """
+    Fuente de documentos del corpus. Cada fuente se carga en su propio hilo, con
+    su timeout (CORPUS_SOURCE_TIMEOUT_<NOMBRE>) y aislada de los errores de las
+    demás. Las fuentes ligadas a CPU reparten su trabajo en procesos por su
+    cuenta (ver pdf_ingestion): el hilo solo las coordina.
+    """
+    nombre = "fuente"
+    timeout_por_defecto = 60.0
+
+    def timeout(self) -> float:
+        return float(getattr(settings, f"CORPUS_SOURCE_TIMEOUT_{self.nombre.upper()}", self.timeout_por_defecto))
+
+    def cargar(self):
+        raise NotImplementedError
+
+    def respaldo(self):
+        """
+        Documentos a usar si cargar() falla o excede su timeout. Tras un timeout
+        el hilo de cargar() no se interrumpe (los hilos no se pueden cancelar):
+        sigue hasta terminar por su cuenta y su resultado se descarta.
+        """
+        return []
+
+
+class FuenteFAQs(FuenteCorpus):
+    # Firebase primero; el CSV es el único fallback (sin conexión, error o timeout)
+    nombre = "faq"
+    timeout_por_defecto = 30.0
+
+    def cargar(self):
+        return cargar_faqs_desde_firebase()
+
+    def respaldo(self):
+        return cargar_faqs_desde_csv()
+
+
+class FuenteWeb(FuenteCorpus):
+    nombre = "web"
+    timeout_por_defecto = 60.0
+
+    def cargar(self):
+        return cargar_contenido_web()
+
+
+class FuentePDFs(FuenteCorpus):
+    # Ligada a CPU: ingerir_pdfs parsea en un pool de procesos
+    nombre = "pdf"
+    timeout_por_defecto = 600.0
+
+    def cargar(self):
+        return ingerir_pdfs(BASE_DIR)
+
+
+# Orden de registro = orden de los documentos en el corpus
+FUENTES_CORPUS = [FuenteFAQs(), FuenteWeb(), FuentePDFs()]
+
+
+def registrar_fuente(fuente):
+    """
+    Agrega una fuente al corpus (se cargará junto a las demás en cargar_documentos).
+    """
+    FUENTES_CORPUS.append(fuente)
+
+
+def _cargar_fuente(fuente):
+    inicio = time.perf_counter()
+    docs = fuente.cargar()
+    return docs, time.perf_counter() - inicio
+
+
+def _registrar_abandono(fuente, futuro):
+    logger.warning(
+        f"⚠️ Fuente {fuente.nombre} abandonada tras su timeout: su hilo sigue ejecutándose "
+        f"en segundo plano y su resultado se descartará"
+    )
+    inicio = time.perf_counter()
+
+    def al_terminar(f):
+        estado = "con error" if f.exception() is not None else "correctamente"
+        logger.warning(f"Fuente abandonada {fuente.nombre} terminó {estado} "
+                       f"{time.perf_counter() - inicio:.0f}s después de su timeout")
+
+    futuro.add_done_callback(al_terminar)
+
+
+def _respaldo_fuente(fuente):
+    try:
+        return fuente.respaldo()
+    except Exception as e:
+        logger.error(f"❌ Error en el respaldo de la fuente {fuente.nombre}: {e}")
+        return []
+
+
 def cargar_documentos():
+    """
+    Carga todas las fuentes del corpus en paralelo y las une en el orden de
+    registro. La ruta crítica es la fuente más lenta, no la suma de todas; una
+    fuente que falla o excede su timeout se reemplaza por su respaldo.
+    El corpus se devuelve completo en una lista: el hash del snapshot necesita
+    todos los documentos y el vector store los conserva como docstore.
+    """
     all_docs = []
     print(f"Iniciando carga de documentos desde {BASE_DIR}")
 
-    # 1. Cargar FAQ (Firebase primero, CSV como fallback)
-    faq_docs = cargar_faqs_desde_firebase()
-    all_docs.extend(faq_docs)
-
-    # 2. Cargar contenido web DCCO (scraping limpio)
-    web_csv = os.path.join(BASE_DIR, "contenido_web_dcco.csv")
-    if os.path.exists(web_csv):
-        df = pd.read_csv(web_csv)
-        df = df.dropna(subset=["Titulo", "Contenido"])
-
-        for _, row in df.iterrows():
-            contenido_limpio = limpiar_contenido_web(row["Contenido"])
-            doc = Document(
-                page_content=contenido_limpio,
-                metadata={
-                    "source": "web",
-                    "tipo": "web",
-                    "titulo": row["Titulo"],
-                    "url": row.get("URL", "")
-                }
-            )
-            all_docs.append(doc)
-            print(f"[WEB] {row['Titulo']} cargado desde {row.get('URL', '')}")
-
-    # 3. Cargar PDFs
-    pdf_count = 0
-    pdf_chunks_total = 0
-    
+    inicio = time.perf_counter()
+    fuentes = list(FUENTES_CORPUS)
+    pool = ThreadPoolExecutor(max_workers=max(1, len(fuentes)), thread_name_prefix="corpus")
     try:
-        pdf_files = [f for f in os.listdir(BASE_DIR) if f.endswith(".pdf")]
-        logger.info(f"Encontrados {len(pdf_files)} archivos PDF en {BASE_DIR}")
-        
-        for filename in pdf_files:
+        futuros = [(fuente, pool.submit(_cargar_fuente, fuente)) for fuente in fuentes]
+        for fuente, futuro in futuros:
+            timeout = fuente.timeout()
+            restante = max(0.0, timeout - (time.perf_counter() - inicio))
             try:
-                pdf_path = os.path.join(BASE_DIR, filename)
-                logger.info(f"Cargando PDF: {filename}")
-                
-                loader = PyMuPDFLoader(pdf_path)
-                raw_docs = loader.load()
-                
-                if not raw_docs:
-                    logger.warning(f"PDF {filename} está vacío o no se pudo leer")
-                    continue
-                
-                # Verificar contenido antes de dividir
-                total_content = "".join([doc.page_content for doc in raw_docs])
-                if len(total_content.strip()) < 100:
-                    logger.warning(f"PDF {filename} tiene muy poco contenido: {len(total_content)} caracteres")
-                
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=500, 
-                    chunk_overlap=50,
-                    separators=["\n\n", "\n", " ", ""]
-                )
-                split_docs = splitter.split_documents(raw_docs)
-                
-                chunks_count = 0
-                for i, doc in enumerate(split_docs):
-                    if len(doc.page_content.strip()) < 50:  # Filtrar chunks muy pequeños
-                        continue
-                        
-                    doc.metadata.update({
-                        "source": "pdf",
-                        "filename": filename,
-                        "chunk_id": i,
-                        "tipo": "pdf",
-                        "tipo_documento": "pdf_syllabus",
-                        "total_chunks": len(split_docs)
-                    })
-                    all_docs.append(doc)
-                    chunks_count += 1
-                
-                pdf_count += 1
-                pdf_chunks_total += chunks_count
-                logger.info(f"✅ PDF {filename} cargado: {chunks_count} chunks válidos de {len(split_docs)} totales")
-                
+                docs, segundos = futuro.result(timeout=restante)
+                logger.info(f"Fuente {fuente.nombre}: {len(docs)} documentos en {segundos:.2f}s")
+            except FuturesTimeout:
+                logger.error(f"⏱️ Fuente {fuente.nombre} excedió su timeout ({timeout:.0f}s), se usa su respaldo")
+                _registrar_abandono(fuente, futuro)
+                docs = _respaldo_fuente(fuente)
             except Exception as e:
-                logger.error(f"❌ Error cargando PDF {filename}: {str(e)}")
-                continue
-                
-    except Exception as e:
-        logger.error(f"❌ Error accediendo al directorio de PDFs: {str(e)}")
-    
-    logger.info(f"📊 Total PDFs cargados: {pdf_count}, Total chunks: {pdf_chunks_total}")
-    
+                logger.error(f"❌ Error cargando la fuente {fuente.nombre}, se usa su respaldo: {e}")
+                docs = _respaldo_fuente(fuente)
+            all_docs.extend(docs)
+    finally:
+        # Una fuente colgada no bloquea el arranque: su hilo sigue vivo hasta que
+        # termine por su cuenta (se registra al abandonarla y al terminar)
+        pool.shutdown(wait=False)
+
+    logger.info(f"📚 Corpus cargado: {len(all_docs)} documentos de {len(fuentes)} fuentes "
+                f"en {time.perf_counter() - inicio:.2f}s")
+
+    # Casi duplicados (solapes del splitter, boilerplate entre PDFs, FAQs copiadas en la web)
+    if getattr(settings, 'CORPUS_DEDUP_ENABLED', True):
+        all_docs, _ = deduplicar_documentos(all_docs)
     return all_docs
 
 
@@ -268,6 +384,10 @@ def agregar_faq_entry(pregunta, respuesta):
             writer.writerow(nueva_entrada)
         
         logger.info(f"FAQ agregado exitosamente: {pregunta[:50]}...")
+
+        # Indexar la nueva FAQ sin esperar a reiniciar el servidor
+        from .vector_store import upsert_faq_csv
+        upsert_faq_csv(nueva_entrada['Pregunta'], nueva_entrada['Respuesta'])
         
         return {
             'success': True,
@@ -284,17 +404,29 @@ def agregar_faq_entry(pregunta, respuesta):
         }
 
 
-def validar_faq_duplicado(pregunta, umbral_similitud=0.8):
+def validar_faq_duplicado(pregunta, umbral_similitud=0.8, umbral_coseno=None):
     """
-    Verifica si ya existe una pregunta similar en el FAQ
+    Verifica si ya existe una pregunta similar en el FAQ (basecsvf.csv)
     
     Args:
         pregunta (str): La pregunta a verificar
-        umbral_similitud (float): Umbral de similitud para considerar duplicado
+        umbral_similitud (float): Umbral de similitud léxica (SequenceMatcher) del recorrido del CSV
+        umbral_coseno (float): Umbral de similitud coseno del índice de preguntas
+            (por defecto FAQ_DUPLICATE_COSINE_THRESHOLD)
     
     Returns:
         dict: Información sobre duplicados encontrados
     """
+    # Índice de preguntas en memoria (top-k coseno) si cubre las FAQs del CSV;
+    # si no (p. ej. el corpus se cargó desde Firebase) se recorre el CSV
+    from .faq_index import detectar_faq_duplicada
+    try:
+        resultado = detectar_faq_duplicada(pregunta, umbral_coseno, fuente='faq_csv')
+        if resultado is not None:
+            return resultado
+    except Exception as e:
+        logger.warning(f"No se pudo usar el índice de preguntas para duplicados: {e}")
+    
     faq_csv = os.path.join(BASE_DIR, "basecsvf.csv")
     
     if not os.path.exists(faq_csv):
@@ -324,7 +456,8 @@ def validar_faq_duplicado(pregunta, umbral_similitud=0.8):
         return {
             'es_duplicado': es_duplicado,
             'pregunta_similar': pregunta_similar if es_duplicado else None,
-            'similitud': max_similitud
+            'similitud': max_similitud,
+            'metodo': 'csv_secuencia'
         }
         
     except Exception as e:
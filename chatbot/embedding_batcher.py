@@ -0,0 +1,123 @@
+"""
+Codificador de consultas con micro-lotes.
+
+Las consultas que llegan dentro de una ventana corta (p. ej. 5 ms o 32 textos)
+se agrupan en una sola llamada a encode(); cada llamador recibe un Future con
+su vector. Con tráfico concurrente esto evita que muchas llamadas batch-1
+compitan por los mismos hilos de torch.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CodificadorMicroLotes:
+    """
+    Agrupa textos enviados desde varios hilos en lotes para un único encoder.
+    """
+
+    def __init__(self, modelo, ventana_ms: float = 5, max_lote: int = 32, nombre: str = ""):
+        self.modelo = modelo
+        self.ventana = ventana_ms / 1000.0
+        self.max_lote = max(1, int(max_lote))
+        self.nombre = nombre
+
+        self._lock = threading.Lock()
+        self._cola = None
+        self._hilo = None
+        self._pid = None
+
+        self.lotes = 0
+        self.items = 0
+        self.max_lote_observado = 0
+        self.espera_total = 0.0
+
+    def _asegurar_hilo(self):
+        # Tras un fork (workers de Gunicorn con preload) el hilo no existe en el hijo
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                self._cola = queue.Queue()
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(
+                    target=self._bucle, name=f"microlotes-{self.nombre}", daemon=True
+                )
+                self._hilo.start()
+
+    def enviar(self, texto: str) -> Future:
+        """
+        Encola un texto y devuelve un Future que se resuelve con su embedding (np.ndarray).
+        """
+        self._asegurar_hilo()
+        futuro = Future()
+        self._cola.put((texto, futuro, time.perf_counter()))
+        return futuro
+
+    def codificar(self, texto: str, timeout: float = 30) -> np.ndarray:
+        return self.enviar(texto).result(timeout=timeout)
+
+    def _bucle(self):
+        cola = self._cola
+        while True:
+            lote = [cola.get()]
+            limite = time.perf_counter() + self.ventana
+            while len(lote) < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        pendientes = [(texto, futuro, encolado) for texto, futuro, encolado in lote
+                      if futuro.set_running_or_notify_cancel()]
+        if not pendientes:
+            return
+
+        inicio = time.perf_counter()
+        try:
+            vectores = np.asarray(
+                self.modelo.encode([texto for texto, _, _ in pendientes],
+                                   batch_size=len(pendientes), convert_to_numpy=True),
+                dtype=np.float32
+            )
+        except Exception as e:
+            logger.error(f"Error codificando micro-lote ({self.nombre}): {e}")
+            for _, futuro, _ in pendientes:
+                futuro.set_exception(e)
+            return
+
+        for (_, futuro, _), vector in zip(pendientes, vectores):
+            futuro.set_result(vector)
+
+        with self._lock:
+            self.lotes += 1
+            self.items += len(pendientes)
+            self.max_lote_observado = max(self.max_lote_observado, len(pendientes))
+            self.espera_total += sum(inicio - encolado for _, _, encolado in pendientes)
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            return {
+                'modelo': self.nombre,
+                'profundidad_cola': self._cola.qsize() if self._cola is not None else 0,
+                'lotes': self.lotes,
+                'items': self.items,
+                'tamano_medio_lote': round(self.items / self.lotes, 2) if self.lotes else 0.0,
+                'tamano_max_lote': self.max_lote_observado,
+                'espera_media_ms': round(self.espera_total / self.items * 1000, 3) if self.items else 0.0,
+                'ventana_ms': self.ventana * 1000,
+                'max_lote': self.max_lote,
+            }
@@ -0,0 +1,253 @@
+"""
+Cache persistente de embeddings indexada por (modelo, sha256 del texto).
+
+Los vectores se guardan en un archivo float32 de solo anexado que se lee con
+np.memmap, y las claves en un log de texto (una clave por línea, la línea N
+corresponde a la fila N). Así un reindexado solo codifica textos nunca vistos.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se sincroniza dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _bloqueo_archivo(ruta):
+    """
+    Bloqueo exclusivo entre procesos (workers) mientras se anexan vectores.
+    """
+    with open(ruta, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def hash_texto(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class CacheEmbeddings:
+    """
+    Cache de embeddings en disco para un modelo concreto.
+    """
+
+    def __init__(self, modelo_id: str, dimension: int, directorio: str = None):
+        self.modelo_id = modelo_id
+        self.dimension = dimension
+
+        base = directorio or getattr(settings, 'EMBEDDING_CACHE_DIR', os.path.join("media", "cache", "embeddings"))
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", modelo_id)
+        self.directorio = os.path.join(base, f"{slug}-{dimension}")
+        os.makedirs(self.directorio, exist_ok=True)
+
+        self._ruta_vectores = os.path.join(self.directorio, "vectores.f32")
+        self._ruta_claves = os.path.join(self.directorio, "claves.txt")
+        self._ruta_bloqueo = os.path.join(self.directorio, ".lock")
+        self._bytes_fila = 4 * dimension
+
+        self._claves: Dict[str, int] = {}
+        self._filas = 0
+        self._offset_claves = 0
+        self._memmap = None
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+        with self._lock:
+            self._sincronizar()
+
+    def _sincronizar(self):
+        """
+        Lee las claves anexadas (por este u otro proceso) desde la última lectura.
+        """
+        if not os.path.exists(self._ruta_claves):
+            return
+
+        with open(self._ruta_claves, "rb") as f:
+            f.seek(self._offset_claves)
+            datos = f.read()
+
+        fin = datos.rfind(b"\n")
+        if fin < 0:
+            return
+
+        for linea in datos[:fin].split(b"\n"):
+            self._claves.setdefault(linea.decode("ascii"), self._filas)
+            self._filas += 1
+        self._offset_claves += fin + 1
+        self._memmap = None
+
+    def _vectores(self):
+        if self._memmap is None and self._filas:
+            self._memmap = np.memmap(
+                self._ruta_vectores, dtype="<f4", mode="r", shape=(self._filas, self.dimension)
+            )
+        return self._memmap
+
+    def _persistir(self, claves: List[str], vectores: np.ndarray):
+        """
+        Anexa vectores nuevos. Primero los vectores y luego las claves, así una
+        clave nunca apunta a una fila inexistente.
+        """
+        with self._lock, _bloqueo_archivo(self._ruta_bloqueo):
+            self._sincronizar()
+            nuevas = [i for i, clave in enumerate(claves) if clave not in self._claves]
+            if not nuevas:
+                return
+
+            with open(self._ruta_vectores, "ab") as f:
+                # Descarta filas huérfanas de una escritura interrumpida
+                f.truncate(self._filas * self._bytes_fila)
+                f.write(np.ascontiguousarray(vectores[nuevas], dtype="<f4").tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self._ruta_claves, "ab") as f:
+                f.write("".join(f"{claves[i]}\n" for i in nuevas).encode("ascii"))
+
+            self._sincronizar()
+
+    def codificar(self, textos: List[str], modelo, **kwargs) -> np.ndarray:
+        """
+        Devuelve la matriz de embeddings de los textos, codificando solo los que faltan.
+        """
+        resultado = np.empty((len(textos), self.dimension), dtype=np.float32)
+        if not textos:
+            return resultado
+
+        claves = [hash_texto(t) for t in textos]
+        faltantes: Dict[str, List[int]] = {}
+
+        with self._lock:
+            self._sincronizar()
+            vectores = self._vectores()
+            for posicion, clave in enumerate(claves):
+                fila = self._claves.get(clave)
+                if fila is not None:
+                    resultado[posicion] = vectores[fila]
+                else:
+                    faltantes.setdefault(clave, []).append(posicion)
+
+        if faltantes:
+            textos_nuevos = [textos[posiciones[0]] for posiciones in faltantes.values()]
+            nuevos = np.asarray(modelo.encode(textos_nuevos, convert_to_numpy=True, **kwargs), dtype=np.float32)
+            for posiciones, vector in zip(faltantes.values(), nuevos):
+                resultado[posiciones] = vector
+            try:
+                self._persistir(list(faltantes), nuevos)
+            except OSError as e:
+                logger.warning(f"No se pudo persistir la cache de embeddings: {e}")
+
+        with self._lock:
+            misses = sum(len(p) for p in faltantes.values())
+            self.hits += len(textos) - misses
+            self.misses += misses
+
+        return resultado
+
+    def buscar_vectores(self, textos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectores ya cacheados de los textos, leídos del memmap sin codificar nada.
+
+        Returns:
+            (matriz, encontrados): las filas no cacheadas quedan en cero y False
+        """
+        resultado = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        encontrados = np.zeros(len(textos), dtype=bool)
+        with self._lock:
+            self._sincronizar()
+            vectores = self._vectores()
+            for posicion, texto in enumerate(textos):
+                fila = self._claves.get(hash_texto(texto))
+                if fila is not None:
+                    resultado[posicion] = vectores[fila]
+                    encontrados[posicion] = True
+        return resultado, encontrados
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'modelo': self.modelo_id,
+                'entradas': self._filas,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_caches: Dict[str, CacheEmbeddings] = {}
+_caches_lock = threading.Lock()
+
+
+def obtener_cache(modelo_id: str, dimension: int) -> CacheEmbeddings:
+    """
+    Devuelve la cache compartida del proceso para un modelo.
+    """
+    clave = f"{modelo_id}|{dimension}"
+    with _caches_lock:
+        if clave not in _caches:
+            _caches[clave] = CacheEmbeddings(modelo_id, dimension)
+        return _caches[clave]
+
+
+def codificar_con_cache(modelo_id: str, modelo, textos: List[str], **kwargs) -> np.ndarray:
+    """
+    Codifica textos usando la cache persistente si está habilitada.
+    Si la cache falla, codifica directamente con el modelo.
+    """
+    if getattr(settings, 'EMBEDDING_CACHE_ENABLED', True):
+        try:
+            cache = obtener_cache(modelo_id, modelo.get_sentence_embedding_dimension())
+            inicio = time.perf_counter()
+            hits, misses = cache.hits, cache.misses
+            resultado = cache.codificar(textos, modelo, **kwargs)
+            if len(textos) > 1:
+                logger.info(
+                    f"Cache de embeddings ({modelo_id}): {cache.hits - hits} hits, "
+                    f"{cache.misses - misses} misses en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+                )
+            return resultado
+        except OSError as e:
+            logger.warning(f"Cache de embeddings no disponible, codificando sin cache: {e}")
+
+    return np.asarray(modelo.encode(textos, convert_to_numpy=True, **kwargs), dtype=np.float32)
+
+
+def estadisticas_cache() -> List[Dict]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.estadisticas() for cache in caches]
+
+
+def vectores_en_cache(modelo_id: str, dimension: int, textos: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Embeddings exactos ya cacheados de los textos (ver CacheEmbeddings.buscar_vectores),
+    o None si la cache está deshabilitada o no se puede leer.
+    """
+    if not getattr(settings, 'EMBEDDING_CACHE_ENABLED', True):
+        return None
+    try:
+        return obtener_cache(modelo_id, dimension).buscar_vectores(textos)
+    except Exception as e:
+        logger.warning(f"No se pudieron leer vectores de la cache de embeddings: {e}")
+        return None
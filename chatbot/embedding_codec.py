@@ -0,0 +1,99 @@
+"""
+Codificación compacta de los embeddings de FAQ en Firestore.
+
+En lugar de tres listas de floats (una por campo, >1000 valores por documento)
+los embeddings pueden guardarse en un único campo binario 'embeddings_blob':
+
+    cabecera (8 bytes, little-endian):
+        magic  b"EMB"     3 bytes
+        version           1 byte
+        dtype             1 byte   (1 = float16, 2 = float32)
+        n_vectores        1 byte   (pregunta, respuesta, combinado)
+        dimension         2 bytes  (uint16)
+    datos: n_vectores * dimension valores del dtype, en el orden de CAMPOS
+
+La lectura es dual: si el documento trae el blob se decodifica con
+np.frombuffer; si no, se usan las listas antiguas.
+"""
+import struct
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+CAMPOS = ('embedding_pregunta', 'embedding_respuesta', 'embedding_combinado')
+CAMPO_BLOB = 'embeddings_blob'
+
+MAGIC = b"EMB"
+VERSION_CODEC = 1
+_CABECERA = struct.Struct("<3sBBBH")
+_DTYPES = {1: np.dtype("<f2"), 2: np.dtype("<f4")}
+_CODIGOS = {'float16': 1, 'float32': 2}
+
+
+def codificar_embeddings(vectores: List[List[float]], formato: str = 'float16') -> bytes:
+    """
+    Empaqueta los vectores (mismo largo) en un blob con cabecera versionada.
+    """
+    codigo = _CODIGOS[formato]
+    matriz = np.asarray(vectores, dtype=_DTYPES[codigo])
+    if matriz.ndim != 2:
+        raise ValueError("Se esperaba una lista de vectores de igual dimensión")
+    cabecera = _CABECERA.pack(MAGIC, VERSION_CODEC, codigo, matriz.shape[0], matriz.shape[1])
+    return cabecera + matriz.tobytes()
+
+
+def decodificar_embeddings(blob: bytes) -> np.ndarray:
+    """
+    Decodifica un blob a una matriz float32 (n_vectores, dimension) sin pasar por listas de Python.
+    """
+    blob = bytes(blob)
+    magic, version, codigo, n, dimension = _CABECERA.unpack_from(blob)
+    if magic != MAGIC or version != VERSION_CODEC or codigo not in _DTYPES:
+        raise ValueError(f"Blob de embeddings no soportado (magic={magic!r}, version={version}, dtype={codigo})")
+    datos = np.frombuffer(blob, dtype=_DTYPES[codigo], count=n * dimension, offset=_CABECERA.size)
+    return datos.reshape(n, dimension).astype(np.float32)
+
+
+def leer_embeddings(data: Dict) -> Dict[str, Optional[np.ndarray]]:
+    """
+    Lectura dual de un documento de Firestore: blob si existe, listas si no.
+
+    Returns:
+        dict campo -> vector float32 (o None si el documento no lo tiene)
+    """
+    blob = data.get(CAMPO_BLOB)
+    if blob:
+        matriz = decodificar_embeddings(blob)
+        return {campo: matriz[i] if i < len(matriz) else None for i, campo in enumerate(CAMPOS)}
+    return {
+        campo: np.asarray(data[campo], dtype=np.float32) if data.get(campo) else None
+        for campo in CAMPOS
+    }
+
+
+def tiene_embeddings(data: Dict) -> bool:
+    return bool(data.get(CAMPO_BLOB)) or all(campo in data for campo in CAMPOS[:2])
+
+
+def campos_embeddings(embedding_pregunta, embedding_respuesta, embedding_combinado) -> Dict:
+    """
+    Campos a escribir en Firestore según FIREBASE_EMBEDDING_ENCODING:
+    'lista' (formato original), 'float16' o 'float32' (blob). Con
+    FIREBASE_EMBEDDING_DUAL_WRITE se escriben ambos durante la migración.
+    """
+    formato = getattr(settings, 'FIREBASE_EMBEDDING_ENCODING', 'lista')
+    listas = {
+        'embedding_pregunta': list(embedding_pregunta),
+        'embedding_respuesta': list(embedding_respuesta),
+        'embedding_combinado': list(embedding_combinado),
+    }
+    if formato not in _CODIGOS:
+        return listas
+
+    campos = {
+        CAMPO_BLOB: codificar_embeddings([embedding_pregunta, embedding_respuesta, embedding_combinado], formato)
+    }
+    if getattr(settings, 'FIREBASE_EMBEDDING_DUAL_WRITE', False):
+        campos.update(listas)
+    return campos
@@ -0,0 +1,213 @@
+"""
+Registro de modelos de embeddings compartido por todo el proceso.
+
+Cada modelo se carga una sola vez por proceso y se reutiliza desde el vector
+store principal, el índice de FAQs de Firebase y las rutas de escritura.
+Las consultas en línea pasan por la cache de consultas y, si no hay acierto,
+por un codificador de micro-lotes por modelo.
+
+El backend de inferencia se elige con EMBEDDING_BACKEND: 'torch' (por defecto),
+'onnx' u 'onnx-int8' (cuantización dinámica int8, exportada con
+'manage.py exportar_onnx'). Si el backend ONNX no está disponible se usa torch.
+"""
+import os
+import re
+import logging
+import threading
+from typing import Dict, List
+
+import numpy as np
+from django.conf import settings
+from huggingface_hub import login
+from sentence_transformers import SentenceTransformer
+
+from .embedding_batcher import CodificadorMicroLotes
+from .query_cache import obtener_cache_consultas
+
+logger = logging.getLogger(__name__)
+
+MODELO_VECTOR_STORE_POR_DEFECTO = "multi-qa-MiniLM-L6-cos-v1"
+MODELO_FAQ_POR_DEFECTO = "sentence-transformers/all-MiniLM-L6-v2"
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+_modelos: Dict[str, SentenceTransformer] = {}
+_backends: Dict[str, str] = {}  # backend con el que realmente se cargó cada modelo
+_codificadores: Dict[str, CodificadorMicroLotes] = {}
+_locks_carga: Dict[str, threading.Lock] = {}
+_lock_registro = threading.Lock()
+_login_realizado = False
+
+
+def nombre_modelo(uso: str) -> str:
+    """
+    Nombre del modelo configurado para un uso ('vector_store' o 'faq').
+    EMBEDDING_MODEL_NAME, si está definido, fuerza el mismo modelo para ambos índices.
+    """
+    comun = getattr(settings, 'EMBEDDING_MODEL_NAME', '')
+    if comun:
+        return comun
+    if uso == 'faq':
+        return getattr(settings, 'EMBEDDING_MODEL_FAQ', MODELO_FAQ_POR_DEFECTO)
+    return getattr(settings, 'EMBEDDING_MODEL_VECTOR_STORE', MODELO_VECTOR_STORE_POR_DEFECTO)
+
+
+def _login_huggingface():
+    global _login_realizado
+    if not _login_realizado:
+        token = getattr(settings, 'HUGGINGFACE_TOKEN', '')
+        if token:
+            login(token)
+        _login_realizado = True
+
+
+# --------- BACKENDS DE INFERENCIA ---------
+
+def directorio_onnx(nombre: str) -> str:
+    base = getattr(settings, 'EMBEDDING_ONNX_DIR', os.path.join("media", "models", "onnx"))
+    return os.path.join(base, re.sub(r"[^A-Za-z0-9_.-]+", "_", nombre))
+
+
+def archivo_onnx(backend: str) -> str:
+    """
+    Ruta relativa del archivo ONNX dentro del directorio exportado.
+    """
+    if backend == 'onnx-int8':
+        cuantizacion = getattr(settings, 'EMBEDDING_ONNX_QUANTIZATION', 'avx512_vnni')
+        return os.path.join("onnx", f"model_qint8_{cuantizacion}.onnx")
+    return os.path.join("onnx", "model.onnx")
+
+
+def cargar_modelo(nombre: str, backend: str = 'torch') -> SentenceTransformer:
+    """
+    Carga un modelo con el backend indicado, sin pasar por el registro
+    (lo usan el registro y el benchmark de backends).
+    """
+    if backend == 'torch':
+        return SentenceTransformer(nombre)
+
+    directorio = directorio_onnx(nombre)
+    archivo = archivo_onnx(backend)
+    if os.path.exists(os.path.join(directorio, archivo)):
+        return SentenceTransformer(directorio, backend='onnx', model_kwargs={'file_name': archivo})
+
+    if backend == 'onnx-int8':
+        raise FileNotFoundError(
+            f"No existe {os.path.join(directorio, archivo)}; ejecute 'python manage.py exportar_onnx'"
+        )
+    # ONNX sin cuantizar: sentence-transformers lo exporta al vuelo
+    return SentenceTransformer(nombre, backend='onnx')
+
+
+def exportar_onnx(nombre: str, cuantizacion: str = 'avx512_vnni') -> str:
+    """
+    Exporta el modelo a ONNX y genera la variante int8 con cuantización dinámica.
+
+    Args:
+        cuantizacion: 'avx512_vnni', 'avx512', 'avx2' o 'arm64' según la CPU de producción
+
+    Returns:
+        str: directorio con onnx/model.onnx y onnx/model_qint8_<cuantizacion>.onnx
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    directorio = directorio_onnx(nombre)
+    os.makedirs(directorio, exist_ok=True)
+
+    modelo = SentenceTransformer(nombre, backend='onnx')
+    modelo.save_pretrained(directorio)
+    export_dynamic_quantized_onnx_model(modelo, cuantizacion, directorio)
+
+    logger.info(f"Modelo {nombre} exportado a ONNX en {directorio}")
+    return directorio
+
+
+# --------- REGISTRO ---------
+
+def obtener_modelo(nombre: str) -> SentenceTransformer:
+    """
+    Devuelve el encoder compartido para el modelo indicado, cargándolo si es la primera vez.
+    Dos hilos que piden el mismo modelo a la vez esperan a una única carga.
+    """
+    modelo = _modelos.get(nombre)
+    if modelo is not None:
+        return modelo
+
+    with _lock_registro:
+        lock = _locks_carga.setdefault(nombre, threading.Lock())
+
+    with lock:
+        modelo = _modelos.get(nombre)
+        if modelo is None:
+            _login_huggingface()
+            backend = getattr(settings, 'EMBEDDING_BACKEND', 'torch')
+            if backend not in BACKENDS:
+                logger.warning(f"Backend de embeddings desconocido '{backend}', usando torch")
+                backend = 'torch'
+
+            logger.info(f"Cargando modelo de embeddings: {nombre} (backend {backend})")
+            try:
+                modelo = cargar_modelo(nombre, backend)
+            except Exception as e:
+                if backend == 'torch':
+                    raise
+                logger.warning(f"Backend {backend} no disponible para {nombre} ({e}), usando torch")
+                backend = 'torch'
+                modelo = cargar_modelo(nombre, backend)
+
+            _backends[nombre] = backend
+            _modelos[nombre] = modelo
+        return modelo
+
+
+def clave_modelo(nombre: str) -> str:
+    """
+    Identificador de los embeddings que produce el modelo cargado (nombre + backend).
+    Los backends ONNX generan vectores ligeramente distintos, así que las caches
+    y snapshots no se comparten entre backends.
+    """
+    obtener_modelo(nombre)
+    backend = _backends.get(nombre, 'torch')
+    return nombre if backend == 'torch' else f"{nombre}@{backend}"
+
+
+def obtener_codificador_consultas(nombre: str) -> CodificadorMicroLotes:
+    """
+    Codificador de micro-lotes compartido para las consultas de un modelo.
+    """
+    codificador = _codificadores.get(nombre)
+    if codificador is None:
+        modelo = obtener_modelo(nombre)
+        with _lock_registro:
+            codificador = _codificadores.get(nombre)
+            if codificador is None:
+                codificador = CodificadorMicroLotes(
+                    modelo,
+                    ventana_ms=getattr(settings, 'EMBEDDING_BATCH_WINDOW_MS', 5),
+                    max_lote=getattr(settings, 'EMBEDDING_BATCH_MAX_SIZE', 32),
+                    nombre=nombre
+                )
+                _codificadores[nombre] = codificador
+    return codificador
+
+
+def _codificar_sin_cache(nombre: str, texto: str) -> np.ndarray:
+    if not getattr(settings, 'EMBEDDING_MICROBATCH_ENABLED', True):
+        return np.asarray(obtener_modelo(nombre).encode([texto], convert_to_numpy=True), dtype=np.float32)[0]
+    return obtener_codificador_consultas(nombre).codificar(texto)
+
+
+def codificar_consulta(nombre: str, texto: str) -> np.ndarray:
+    """
+    Embedding float32 (solo lectura) de una consulta en línea. Las preguntas repetidas
+    salen de la cache; las nuevas se agrupan con las consultas concurrentes.
+    """
+    if not getattr(settings, 'QUERY_CACHE_ENABLED', True):
+        return _codificar_sin_cache(nombre, texto)
+    return obtener_cache_consultas().obtener_o_calcular(
+        nombre, texto, lambda original: _codificar_sin_cache(nombre, original)
+    )
+
+
+def metricas_codificadores() -> List[Dict]:
+    return [codificador.metricas() for codificador in list(_codificadores.values())]
@@ -0,0 +1,205 @@
+"""
+Índice en memoria de las preguntas de FAQ para detectar duplicados.
+
+Vive dentro del snapshot del vector store (se construye y publica con él, y
+cada alta/baja de FAQ publica una copia que comparte el índice base), de modo
+que una comprobación de duplicado es una consulta top-k sobre vectores
+unitarios en lugar de recorrer el CSV.
+"""
+import logging
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+from .bm25_index import tokenizar
+from .delta_index import DeltaVectores, maximo_delta
+
+logger = logging.getLogger(__name__)
+
+# Prefijo del doc_id de cada fuente de FAQs (ver vector_store.obtener_doc_id)
+PREFIJOS_FUENTE = {'faq_csv': 'faq_csv:', 'faq_firebase': 'faq:'}
+
+
+class IndicePreguntasFAQ:
+    """
+    Preguntas de FAQ indexadas por producto interno (coseno sobre vectores normalizados).
+    Las instancias publicadas no se modifican: agregar/eliminar se aplican sobre
+    copiar(), que comparte el índice base y acumula las escrituras en un DeltaVectores.
+    """
+
+    def __init__(self, dimension: int):
+        self.indice = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.preguntas: Dict[int, tuple] = {}  # id del vector -> (doc_id, pregunta)
+        self.ids: Dict[str, int] = {}  # doc_id -> id del vector en el índice base
+        self.siguiente = 0
+        self.fuentes = frozenset()  # fuentes ('faq_csv', 'faq_firebase') cargadas completas al construir
+        self.delta = DeltaVectores()  # altas/bajas sin consolidar en el índice base
+
+    def __len__(self):
+        return len(self.ids) - len(self.delta.retirados) + len(self.delta.agregados)
+
+    def contiene(self, doc_id: str) -> bool:
+        if doc_id in self.delta.agregados:
+            return True
+        return doc_id in self.ids and doc_id not in self.delta.retirados
+
+    @classmethod
+    def construir(cls, dimension: int, doc_ids: List[str], preguntas: List[str], matriz: np.ndarray,
+                  fuentes=()):
+        indice = cls(dimension)
+        indice.fuentes = frozenset(fuentes)
+        if doc_ids:
+            ids = np.arange(len(doc_ids), dtype="int64")
+            indice.indice.add_with_ids(np.ascontiguousarray(matriz, dtype="float32"), ids)
+            indice.preguntas = {i: (doc_id, pregunta) for i, (doc_id, pregunta) in enumerate(zip(doc_ids, preguntas))}
+            indice.ids = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            indice.siguiente = len(doc_ids)
+        return indice
+
+    def copiar(self):
+        # El índice base y el delta no se modifican nunca: basta con compartirlos
+        copia = IndicePreguntasFAQ.__new__(IndicePreguntasFAQ)
+        copia.indice = self.indice
+        copia.preguntas = self.preguntas
+        copia.ids = self.ids
+        copia.siguiente = self.siguiente
+        copia.fuentes = self.fuentes
+        copia.delta = self.delta
+        return copia
+
+    def _consolidar_si_necesario(self):
+        """
+        Pasa el delta a una copia nueva del índice base cuando supera VECTOR_STORE_DELTA_MAX.
+        """
+        if len(self.delta) < maximo_delta():
+            return
+        indice = faiss.clone_index(self.indice)
+        preguntas = dict(self.preguntas)
+        ids = dict(self.ids)
+
+        retirados = [ids.pop(doc_id) for doc_id in self.delta.retirados]
+        for id_vector in retirados:
+            del preguntas[id_vector]
+        if retirados:
+            indice.remove_ids(np.array(retirados, dtype="int64"))
+
+        if self.delta.agregados:
+            nuevos = np.arange(self.siguiente, self.siguiente + len(self.delta.agregados), dtype="int64")
+            for id_vector, (doc_id, (pregunta, _)) in zip(nuevos.tolist(), self.delta.agregados.items()):
+                preguntas[id_vector] = (doc_id, pregunta)
+                ids[doc_id] = id_vector
+            indice.add_with_ids(self.delta.matriz(), nuevos)
+            self.siguiente += len(nuevos)
+
+        self.indice, self.preguntas, self.ids, self.delta = indice, preguntas, ids, DeltaVectores()
+
+    def eliminar(self, doc_id: str) -> bool:
+        if not self.contiene(doc_id):
+            return False
+        self.delta = self.delta.sin(doc_id, en_base=doc_id in self.ids)
+        self._consolidar_si_necesario()
+        return True
+
+    def agregar(self, doc_id: str, pregunta: str, vector: np.ndarray):
+        self.delta = self.delta.con(doc_id, pregunta, vector, en_base=doc_id in self.ids)
+        self._consolidar_si_necesario()
+
+    def buscar(self, vector: np.ndarray, top_k: int = 5, prefijo: Optional[str] = None) -> List[Dict]:
+        """
+        Args:
+            prefijo: solo preguntas cuyo doc_id empieza así (una fuente concreta);
+                la búsqueda recorre entonces todo el índice (plano, unos miles de filas)
+        """
+        retirados = self.delta.retirados
+        filtro = (lambda doc_id: doc_id.startswith(prefijo)) if prefijo else None
+        resultados = []
+        k = min(self.indice.ntotal if prefijo else top_k + len(retirados), self.indice.ntotal)
+        if k > 0:
+            scores, ids = self.indice.search(vector.reshape(1, -1), k)
+            for score, id_vector in zip(scores[0], ids[0]):
+                if id_vector < 0:
+                    continue
+                doc_id, pregunta = self.preguntas[id_vector]
+                if doc_id in retirados or (filtro is not None and not filtro(doc_id)):
+                    continue
+                resultados.append({'doc_id': doc_id, 'pregunta': pregunta, 'score': float(score)})
+                if len(resultados) >= top_k:
+                    break
+
+        resultados.extend(
+            {'doc_id': doc_id, 'pregunta': pregunta, 'score': score}
+            for doc_id, pregunta, score in self.delta.buscar(vector, top_k, filtro)
+        )
+        resultados.sort(key=lambda resultado: resultado['score'], reverse=True)
+        return resultados[:top_k]
+
+
+def confirmacion_lexica(pregunta: str, candidata: str) -> float:
+    """
+    Jaccard de tokens sin tildes ni stopwords (1.0 si una pregunta contiene a la otra).
+    """
+    a, b = set(tokenizar(pregunta)), set(tokenizar(candidata))
+    if not a or not b:
+        return 0.0
+    if a <= b or b <= a:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def detectar_faq_duplicada(pregunta: str, umbral_coseno: Optional[float] = None,
+                           confirmar_lexico: Optional[bool] = None, top_k: int = 5,
+                           fuente: str = 'faq_csv') -> Optional[Dict]:
+    """
+    Busca preguntas de FAQ semánticamente equivalentes en el índice en memoria.
+
+    Args:
+        umbral_coseno: similitud coseno mínima entre embeddings para considerar
+            duplicado (por defecto FAQ_DUPLICATE_COSINE_THRESHOLD). No es la escala
+            de los umbrales léxicos (SequenceMatcher / Jaccard) del recorrido del CSV.
+        confirmar_lexico: exigir además solapamiento léxico mínimo
+            (por defecto FAQ_DUPLICATE_LEXICAL_CONFIRM)
+        fuente: fuente de FAQs contra la que se compara ('faq_csv' o 'faq_firebase')
+
+    Returns:
+        dict con es_duplicado, pregunta_similar, similitud y candidatos, o None si
+        el índice no cubre esa fuente (vector store sin cargar, o corpus cargado
+        desde otra fuente): el llamador recorre entonces el CSV
+    """
+    from .vector_store import obtener_snapshot, codificar_pregunta
+
+    snapshot = obtener_snapshot()
+    if snapshot is None or snapshot.preguntas is None or fuente not in snapshot.preguntas.fuentes:
+        return None
+
+    if umbral_coseno is None:
+        umbral_coseno = getattr(settings, 'FAQ_DUPLICATE_COSINE_THRESHOLD', 0.8)
+    if confirmar_lexico is None:
+        confirmar_lexico = getattr(settings, 'FAQ_DUPLICATE_LEXICAL_CONFIRM', True)
+    minimo_lexico = getattr(settings, 'FAQ_DUPLICATE_LEXICAL_MIN', 0.2)
+
+    candidatos = snapshot.preguntas.buscar(
+        codificar_pregunta(snapshot, pregunta), top_k=top_k, prefijo=PREFIJOS_FUENTE.get(fuente)
+    )
+
+    duplicado = None
+    for candidato in candidatos:
+        if candidato['score'] < umbral_coseno:
+            break
+        if confirmar_lexico:
+            candidato['solapamiento_lexico'] = round(confirmacion_lexica(pregunta, candidato['pregunta']), 3)
+            if candidato['solapamiento_lexico'] < minimo_lexico:
+                continue
+        duplicado = candidato
+        break
+
+    mejor = duplicado or (candidatos[0] if candidatos else None)
+    return {
+        'es_duplicado': duplicado is not None,
+        'pregunta_similar': duplicado['pregunta'] if duplicado else None,
+        'similitud': round(mejor['score'], 4) if mejor else 0,
+        'umbral_coseno': umbral_coseno,
+        'candidatos': candidatos,
+        'metodo': 'indice_vectorial'
+    }
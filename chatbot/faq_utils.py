@@ -58,6 +58,10 @@ def agregar_faq_entry_simple(pregunta, respuesta, categoria="General"):
             writer.writerow(nueva_entrada)
         
         logger.info(f"FAQ agregado exitosamente con ID {next_id}: {pregunta[:50]}...")
+
+        # Indexar la nueva FAQ sin esperar a reiniciar el servidor
+        from .vector_store import upsert_faq_csv
+        upsert_faq_csv(nueva_entrada['Pregunta'], nueva_entrada['Respuesta'], nueva_entrada['Categoría'])
         
         return {
             'success': True,
@@ -74,10 +78,21 @@ def agregar_faq_entry_simple(pregunta, respuesta, categoria="General"):
         }
 
 
-def validar_faq_duplicado_simple(pregunta, umbral_similitud=0.8):
+def validar_faq_duplicado_simple(pregunta, umbral_similitud=0.8, umbral_coseno=None):
     """
-    Versión simplificada para verificar duplicados
+    Versión simplificada para verificar duplicados en basecsvf.csv.
+    umbral_similitud es léxico (palabras comunes) y umbral_coseno es el del índice de preguntas.
     """
+    # Índice de preguntas en memoria (top-k coseno) si cubre las FAQs del CSV;
+    # si no (p. ej. el corpus se cargó desde Firebase) se recorre el CSV
+    from .faq_index import detectar_faq_duplicada
+    try:
+        resultado = detectar_faq_duplicada(pregunta, umbral_coseno, fuente='faq_csv')
+        if resultado is not None:
+            return resultado
+    except Exception as e:
+        logger.warning(f"No se pudo usar el índice de preguntas para duplicados: {e}")
+    
     faq_csv = os.path.join(BASE_DIR, "basecsvf.csv")
     
     if not os.path.exists(faq_csv):
@@ -114,7 +129,8 @@ def validar_faq_duplicado_simple(pregunta, umbral_similitud=0.8):
         return {
             'es_duplicado': es_duplicado,
             'pregunta_similar': pregunta_similar if es_duplicado else None,
-            'similitud': max_similitud
+            'similitud': max_similitud,
+            'metodo': 'csv_palabras'
         }
         
     except Exception as e:
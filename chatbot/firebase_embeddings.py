@@ -1,12 +1,22 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import firebase_admin
 from firebase_admin import firestore
 from django.conf import settings
 import logging
+import os
 import json
+import time
+import threading
+from datetime import datetime
 from typing import List, Dict, Tuple
 import faiss
+from .embedding_cache import codificar_con_cache
+from .embedding_models import nombre_modelo, obtener_modelo, clave_modelo, codificar_consulta, MODELO_FAQ_POR_DEFECTO
+from .index_factory import construir_indice, configuracion_indice, soporta_eliminacion
+from .bm25_index import IndiceBM25
+from .fusion import fusionar
+from .embedding_codec import CAMPOS, CAMPO_BLOB, campos_embeddings, leer_embeddings, tiene_embeddings
+from .firebase_service import CAMPOS_FAQ_EMBEDDINGS
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +26,10 @@ class FirebaseEmbeddingsService:
     """
     
     def __init__(self):
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        # Encoder compartido del registro: no se carga un modelo nuevo por instancia
+        self.modelo_nombre = nombre_modelo('faq')
+        self.model = obtener_modelo(self.modelo_nombre)
+        self.modelo_clave = clave_modelo(self.modelo_nombre)
         
         # Inicializar Firebase si no está inicializado
         try:
@@ -27,11 +40,27 @@ class FirebaseEmbeddingsService:
             firebase_service = FirebaseService()
             self.db = firebase_service.db
         
-        self.dimension = 384  # Dimensión del modelo all-MiniLM-L6-v2
-        self.index = None
-        self.documents = []
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.index = None  # IndexIDMap2: ids derivados del slot de cada FAQ (ver _ids_slot)
+        self.indice_lexico = None  # BM25 sobre pregunta/respuesta, construido con el índice vectorial
+        self.documentos_lexicos = []
+        self.faqs_lexicas = {}  # id de Firestore -> documento (FAQs activas)
+        self.documents = {}  # slot -> documento
+        self.filas_faq = {}  # slot -> filas normalizadas indexadas (para compactar sin re-embeber)
+        self.slots = {}  # id de Firestore -> slot
+        self.siguiente_slot = 0
+        self.vectores_muertos = set()  # tombstones en índices sin remove_ids (HNSW)
+        self.versiones = {}  # id de Firestore -> update_time ya aplicado
+        self.modo_multivector = 'max'
         self._initialized = False  # Flag para saber si ya se inicializó
         
+        # Change feed (on_snapshot) de la colección 'faqs'
+        self._lock = threading.RLock()
+        self._lock_suscripcion = threading.Lock()
+        self._suscripcion = None
+        self._pid_suscripcion = None
+        self.cambios_aplicados = 0
+        
     def inicializar_automaticamente(self):
         """
         Inicializa automáticamente el índice vectorial al arrancar el servidor.
@@ -61,11 +90,31 @@ class FirebaseEmbeddingsService:
         Genera embedding para un texto
         """
         try:
-            embedding = self.model.encode(texto)
+            embedding = codificar_con_cache(self.modelo_clave, self.model, [texto])[0]
             return embedding.tolist()
         except Exception as e:
             logger.error(f"Error generando embedding: {e}")
             return []
+
+    def generar_embedding_consulta(self, pregunta: str) -> np.ndarray:
+        """
+        Genera el embedding de una consulta de usuario (micro-lotes, sin cache en disco)
+        """
+        try:
+            return codificar_consulta(self.modelo_nombre, pregunta)
+        except Exception as e:
+            logger.error(f"Error generando embedding de consulta: {e}")
+            return None
+
+    def generar_embeddings(self, textos: List[str]) -> List[List[float]]:
+        """
+        Genera embeddings para varios textos en una sola llamada al modelo
+        """
+        try:
+            return codificar_con_cache(self.modelo_clave, self.model, textos).tolist()
+        except Exception as e:
+            logger.error(f"Error generando embeddings: {e}")
+            return [[] for _ in textos]
     
     def migrar_faqs_con_embeddings(self):
         """
@@ -74,27 +123,32 @@ class FirebaseEmbeddingsService:
         try:
             # Obtener todas las FAQs de Firebase
             faqs_ref = self.db.collection('faqs')
-            docs = faqs_ref.stream()
+            # Proyección: las listas de embeddings solo se leen si siguen siendo el formato
+            # de escritura; con blob, las FAQs aún sin migrar se re-embeben en memoria
+            leer_listas = getattr(settings, 'FIREBASE_EMBEDDING_ENCODING', 'lista') == 'lista'
+            campos = CAMPOS_FAQ_EMBEDDINGS + list(CAMPOS) if leer_listas else CAMPOS_FAQ_EMBEDDINGS
+            docs = faqs_ref.select(campos).stream()
             
             contador = 0
             for doc in docs:
                 data = doc.to_dict()
                 
-                # Verificar si ya tiene embedding
-                if 'embedding_pregunta' not in data or 'embedding_respuesta' not in data:
+                # Verificar si ya tiene embedding del modelo configurado
+                # (los documentos sin 'modelo_embedding' se generaron con el modelo por defecto)
+                modelo_documento = data.get('modelo_embedding', MODELO_FAQ_POR_DEFECTO)
+                if not tiene_embeddings(data) or modelo_documento != self.modelo_clave:
                     pregunta = data.get('pregunta', '')
                     respuesta = data.get('respuesta', '')
                     
-                    # Generar embeddings
-                    embedding_pregunta = self.generar_embedding(pregunta)
-                    embedding_respuesta = self.generar_embedding(respuesta)
+                    # Generar embeddings (pregunta, respuesta y combinado en un solo batch)
+                    embedding_pregunta, embedding_respuesta, embedding_combinado = self.generar_embeddings(
+                        [pregunta, respuesta, f"{pregunta} {respuesta}"]
+                    )
                     
                     # Actualizar documento en Firebase
-                    from datetime import datetime
                     doc.reference.update({
-                        'embedding_pregunta': embedding_pregunta,
-                        'embedding_respuesta': embedding_respuesta,
-                        'embedding_combinado': self.generar_embedding(f"{pregunta} {respuesta}"),
+                        **campos_embeddings(embedding_pregunta, embedding_respuesta, embedding_combinado),
+                        'modelo_embedding': self.modelo_clave,
                         'fecha_embedding': datetime.now()
                     })
                     
@@ -109,39 +163,179 @@ class FirebaseEmbeddingsService:
             logger.error(f"Error en migración de embeddings: {e}")
             return False
     
+    def _modo_multivector(self):
+        modo = getattr(settings, 'FAQ_MULTIVECTOR_FUSION', 'max')
+        return modo if modo in ('max', 'ponderada') else 'max'
+    
+    def _ids_slot(self, slot: int) -> List[int]:
+        """
+        Ids FAISS de una FAQ: en modo 'max' 2·slot (pregunta) y 2·slot+1 (respuesta),
+        en modo 'ponderada' una sola fila con id = slot.
+        """
+        if self.modo_multivector == 'max':
+            return [2 * slot, 2 * slot + 1]
+        return [slot]
+    
+    def _filas_faq(self, slot: int, embedding_pregunta, embedding_respuesta) -> Tuple[np.ndarray, List[int]]:
+        """
+        Filas normalizadas a indexar para una FAQ y sus ids (ver _ids_slot).
+        """
+        pares = np.vstack([embedding_pregunta, embedding_respuesta]).astype(np.float32)
+        faiss.normalize_L2(pares)  # Normalizar para cosine similarity
+        if self.modo_multivector == 'ponderada':
+            peso_pregunta = getattr(settings, 'FAQ_MULTIVECTOR_PESO_PREGUNTA', 0.6)
+            pares = (peso_pregunta * pares[0] + (1 - peso_pregunta) * pares[1]).reshape(1, -1)
+        return pares, self._ids_slot(slot)
+    
+    def _embeddings_obsoletos(self, data: Dict) -> bool:
+        """
+        True si la FAQ trae embeddings de otro modelo (los documentos sin
+        'modelo_embedding' se generaron con el modelo por defecto).
+        """
+        return tiene_embeddings(data) and data.get('modelo_embedding', MODELO_FAQ_POR_DEFECTO) != self.modelo_clave
+    
+    def _reembeber_faq(self, data: Dict):
+        """
+        (pregunta, respuesta) codificadas con el modelo actual, vía la cache de embeddings.
+        No se escriben en Firestore: eso lo hace 'migrar_faqs_con_embeddings'.
+        """
+        pregunta, respuesta = codificar_con_cache(
+            self.modelo_clave, self.model, [data.get('pregunta', ''), data.get('respuesta', '')]
+        )
+        return pregunta, respuesta
+    
+    def _embeddings_faq(self, data: Dict):
+        """
+        (pregunta, respuesta) desde el blob binario o las listas (lectura dual), o None.
+        FAQs antiguas sin embeddings separados usan el combinado para ambos campos.
+        Si los embeddings guardados son de otro modelo o de otra dimensión se
+        re-embeben en memoria: mezclarlos en el índice haría fallar index.add.
+        """
+        if self._embeddings_obsoletos(data):
+            data.pop(CAMPO_BLOB, None)
+            return self._reembeber_faq(data)
+        
+        embeddings = leer_embeddings(data)
+        data.pop(CAMPO_BLOB, None)
+        combinado = embeddings['embedding_combinado']
+        embedding_pregunta = embeddings['embedding_pregunta']
+        embedding_respuesta = embeddings['embedding_respuesta']
+        embedding_pregunta = embedding_pregunta if embedding_pregunta is not None else combinado
+        embedding_respuesta = embedding_respuesta if embedding_respuesta is not None else combinado
+        if embedding_pregunta is None or embedding_respuesta is None:
+            return None
+        if len(embedding_pregunta) != self.dimension or len(embedding_respuesta) != self.dimension:
+            logger.warning(
+                f"FAQ con embeddings de dimensión {len(embedding_pregunta)} (esperada {self.dimension}); se re-embebe"
+            )
+            return self._reembeber_faq(data)
+        return embedding_pregunta, embedding_respuesta
+    
+    @staticmethod
+    def _documento_faq(doc_id: str, data: Dict) -> Dict:
+        return {
+            'id': doc_id,
+            'pregunta': data.get('pregunta', ''),
+            'respuesta': data.get('respuesta', ''),
+            'metadata': data
+        }
+    
     def cargar_indice_vectorial(self):
         """
-        Carga todas las FAQs de Firebase y crea índice FAISS
+        Carga todas las FAQs activas de Firebase y crea índice FAISS con los embeddings
+        de pregunta y de respuesta de cada FAQ (multi-vector).
+        
+        - 'max': un índice con 2 filas por FAQ (pregunta y respuesta); el score
+          de la FAQ es el mayor de los dos.
+        - 'ponderada': una fila por FAQ con w_p * pregunta + w_r * respuesta;
+          el producto interno con la consulta es exactamente la suma ponderada
+          de ambas similitudes coseno.
+        
+        El índice va envuelto en IndexIDMap2 (ids por slot de FAQ) para que el
+        change feed de Firestore pueda agregar y retirar FAQs sin recargarlo.
         """
         try:
             faqs_ref = self.db.collection('faqs')
-            docs = faqs_ref.stream()
+            # Proyección: las listas de embeddings solo se leen si siguen siendo el formato
+            # de escritura; con blob, las FAQs aún sin migrar se re-embeben en memoria
+            leer_listas = getattr(settings, 'FIREBASE_EMBEDDING_ENCODING', 'lista') == 'lista'
+            campos = CAMPOS_FAQ_EMBEDDINGS + list(CAMPOS) if leer_listas else CAMPOS_FAQ_EMBEDDINGS
+            docs = faqs_ref.select(campos).stream()
             
-            embeddings = []
-            documentos = []
+            modo = self._modo_multivector()
+            self.modo_multivector = modo
+            filas = []
+            ids = []
+            documentos = {}  # slot -> documento
+            filas_faq = {}
+            slots = {}  # id de Firestore -> slot
+            lexicos = {}  # también las FAQs sin embedding, para la búsqueda textual
+            versiones = {}
             
-            for doc in docs:
-                data = doc.to_dict()
+            docs = [(doc.id, doc.update_time, doc.to_dict()) for doc in docs]
+            # De otro modelo, o sin blob cuando las listas no se leyeron: se re-embeben
+            reembeber = {
+                doc_id for doc_id, _, data in docs
+                if data.get('activo', True) and (
+                    self._embeddings_obsoletos(data) or not (leer_listas or data.get(CAMPO_BLOB))
+                )
+            }
+            if reembeber:
+                # Un solo lote al modelo: las llamadas por FAQ de _reembeber_faq salen de la cache
+                logger.warning(
+                    f"{len(reembeber)} FAQs sin embeddings de {self.modelo_clave} legibles; se re-embeben en "
+                    f"memoria (ejecute 'manage.py migrar_embeddings_blob' o la migración de embeddings)"
+                )
+                codificar_con_cache(self.modelo_clave, self.model, [
+                    texto for doc_id, _, data in docs if doc_id in reembeber
+                    for texto in (data.get('pregunta', ''), data.get('respuesta', ''))
+                ])
+            
+            for doc_id, update_time, data in docs:
+                versiones[doc_id] = update_time
+                if not data.get('activo', True):
+                    continue  # desactivada (delete_faq)
                 
-                if 'embedding_combinado' in data:
-                    embedding = np.array(data['embedding_combinado'], dtype=np.float32)
-                    embeddings.append(embedding)
-                    documentos.append({
-                        'id': doc.id,
-                        'pregunta': data.get('pregunta', ''),
-                        'respuesta': data.get('respuesta', ''),
-                        'metadata': data
-                    })
+                documento = self._documento_faq(doc_id, data)
+                lexicos[doc_id] = documento
+                
+                if doc_id in reembeber:
+                    data.pop(CAMPO_BLOB, None)
+                    embeddings = self._reembeber_faq(data)
+                else:
+                    embeddings = self._embeddings_faq(data)
+                if embeddings is not None:
+                    slot = len(documentos)
+                    matriz_faq, ids_faq = self._filas_faq(slot, *embeddings)
+                    filas.append(matriz_faq)
+                    ids.extend(ids_faq)
+                    filas_faq[slot] = matriz_faq
+                    documentos[slot] = documento
+                    slots[doc_id] = slot
             
-            if embeddings:
-                # Crear índice FAISS
-                embeddings_matrix = np.vstack(embeddings)
-                self.index = faiss.IndexFlatIP(self.dimension)  # Inner Product (cosine similarity)
-                faiss.normalize_L2(embeddings_matrix)  # Normalizar para cosine similarity
-                self.index.add(embeddings_matrix)
+            indice = None
+            if documentos:
+                # Inner Product; Flat/HNSW/IVF según VECTOR_INDEX_MODE.
+                # El índice de FAQs es pequeño, se mantiene sin compresión.
+                indice = construir_indice(
+                    np.vstack(filas), ids=np.array(ids, dtype=np.int64), metrica='ip',
+                    config=configuracion_indice(compresion='none'), con_ids=True
+                )
+            
+            with self._lock:
+                self.index = indice
                 self.documents = documentos
-                
-                logger.info(f"✅ Índice vectorial cargado: {len(documentos)} documentos")
+                self.filas_faq = filas_faq
+                self.slots = slots
+                self.siguiente_slot = len(documentos)
+                self.vectores_muertos = set()
+                self.versiones = versiones
+                self.faqs_lexicas = lexicos
+                self._reconstruir_lexico()
+            
+            if documentos:
+                logger.info(f"✅ Índice vectorial cargado: {len(documentos)} documentos (multi-vector {modo})")
+                self.iniciar_suscripcion()
                 return True
             
             return False
@@ -150,9 +344,228 @@ class FirebaseEmbeddingsService:
             logger.error(f"Error cargando índice vectorial: {e}")
             return False
     
+    # --------- CHANGE FEED ---------
+    
+    def _reconstruir_lexico(self):
+        # BM25 de unos cientos de FAQs: reconstruirlo por lote de cambios cuesta milisegundos
+        self.documentos_lexicos = list(self.faqs_lexicas.values())
+        self.indice_lexico = IndiceBM25.construir(self.documentos_lexicos)
+    
+    def _retirar_faq(self, doc_id: str) -> bool:
+        """
+        Quita una FAQ del índice en memoria (remove_ids, o tombstone si el índice
+        no admite eliminación, p. ej. HNSW). Requiere self._lock.
+        """
+        retirada = self.faqs_lexicas.pop(doc_id, None) is not None
+        slot = self.slots.pop(doc_id, None)
+        if slot is None:
+            return retirada
+        ids = self._ids_slot(slot)
+        if soporta_eliminacion(self.index):
+            self.index.remove_ids(np.array(ids, dtype=np.int64))
+        else:
+            self.vectores_muertos.update(ids)
+        del self.documents[slot]
+        del self.filas_faq[slot]
+        return True
+    
+    def _aplicar_faq(self, doc_id: str, data: Dict, version=None) -> bool:
+        """
+        Agrega o reemplaza una FAQ en el índice en memoria; una FAQ con activo=False
+        solo se retira. Requiere self._lock.
+        
+        Returns:
+            True si el índice cambió
+        """
+        if version is not None and self.versiones.get(doc_id) == version:
+            return False  # ya aplicada (p. ej. el primer snapshot del listener repite la carga)
+        self.versiones[doc_id] = version
+        
+        cambio = self._retirar_faq(doc_id)
+        if not data.get('activo', True):
+            return cambio
+        
+        documento = self._documento_faq(doc_id, data)
+        self.faqs_lexicas[doc_id] = documento
+        
+        embeddings = self._embeddings_faq(data)
+        if embeddings is None:
+            return True
+        
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+        slot = self.siguiente_slot
+        self.siguiente_slot += 1
+        matriz_faq, ids_faq = self._filas_faq(slot, *embeddings)
+        self.index.add_with_ids(matriz_faq, np.array(ids_faq, dtype=np.int64))
+        self.filas_faq[slot] = matriz_faq
+        self.documents[slot] = documento
+        self.slots[doc_id] = slot
+        return True
+    
+    def _on_snapshot(self, _snapshot, cambios, _read_time):
+        """
+        Callback del listener de Firestore (hilo del cliente): aplica altas,
+        modificaciones, desactivaciones y borrados al índice en memoria.
+        """
+        try:
+            aplicados = 0
+            with self._lock:
+                for cambio in cambios:
+                    doc = cambio.document
+                    if cambio.type.name == 'REMOVED':
+                        self.versiones.pop(doc.id, None)
+                        aplicados += self._retirar_faq(doc.id)
+                    else:
+                        aplicados += self._aplicar_faq(doc.id, doc.to_dict(), doc.update_time)
+                if aplicados:
+                    self._reconstruir_lexico()
+                    self._compactar_si_necesario()
+                    self.cambios_aplicados += aplicados
+            
+            if aplicados:
+                logger.info(f"🔄 Change feed de FAQs: {aplicados} cambios aplicados al índice en memoria")
+        except Exception as e:
+            logger.error(f"Error aplicando cambios del change feed de FAQs: {e}")
+    
+    def aplicar_faq(self, doc_id: str, data: Dict, version=None) -> bool:
+        """
+        Write-through de una escritura hecha por este proceso (add/update): el índice
+        se actualiza sin esperar al change feed. Con la versión (update_time del
+        WriteResult) el eco posterior del listener no repite el trabajo.
+        """
+        with self._lock:
+            cambio = self._aplicar_faq(doc_id, dict(data), version)
+            if cambio:
+                self._reconstruir_lexico()
+                self._compactar_si_necesario()
+        return cambio
+    
+    def retirar_faq(self, doc_id: str, version=None) -> bool:
+        """
+        Write-through de una desactivación (delete_faq).
+        """
+        with self._lock:
+            if version is not None:
+                self.versiones[doc_id] = version
+            cambio = self._retirar_faq(doc_id)
+            if cambio:
+                self._reconstruir_lexico()
+                self._compactar_si_necesario()
+        return cambio
+    
+    def _compactar_si_necesario(self):
+        if self.index is None or not self.vectores_muertos:
+            return
+        proporcion = getattr(settings, 'FAQ_INDEX_COMPACTION_RATIO', 0.2)
+        if len(self.vectores_muertos) > proporcion * self.index.ntotal:
+            self.compactar_indice()
+    
+    def compactar_indice(self) -> int:
+        """
+        Reconstruye el índice FAISS solo con las filas vivas (sin tombstones) y
+        renumera los slots. Usa las filas ya calculadas: no re-embebe ni lee Firestore.
+        
+        Returns:
+            número de vectores muertos descartados
+        """
+        with self._lock:
+            descartados = (self.index.ntotal - sum(len(f) for f in self.filas_faq.values())) if self.index else 0
+            doc_por_slot = {slot: doc_id for doc_id, slot in self.slots.items()}
+            documentos, filas_faq, slots = {}, {}, {}
+            matrices, ids = [], []
+            for nuevo, slot in enumerate(sorted(self.documents)):
+                documentos[nuevo] = self.documents[slot]
+                filas_faq[nuevo] = self.filas_faq[slot]
+                slots[doc_por_slot[slot]] = nuevo
+                matrices.append(filas_faq[nuevo])
+                ids.extend(self._ids_slot(nuevo))
+            
+            self.index = construir_indice(
+                np.vstack(matrices), ids=np.array(ids, dtype=np.int64), metrica='ip',
+                config=configuracion_indice(compresion='none'), con_ids=True
+            ) if matrices else None
+            self.documents = documentos
+            self.filas_faq = filas_faq
+            self.slots = slots
+            self.siguiente_slot = len(documentos)
+            self.vectores_muertos = set()
+        
+        logger.info(f"🧹 Índice de FAQs compactado: {descartados} vectores muertos descartados")
+        return descartados
+    
+    def campos_reembebidos(self, data: Dict, pregunta: str, respuesta: str) -> Dict:
+        """
+        Campos de embedding a escribir en Firestore tras editar una FAQ. Solo se
+        re-embeben los campos cuyo texto cambió (o que faltan / son de otro modelo),
+        en una sola llamada al modelo; los demás vectores se reutilizan.
+        
+        Returns:
+            dict para doc_ref.update() (vacío si no hace falta re-embeber)
+        """
+        cambio_pregunta = pregunta != data.get('pregunta', '')
+        cambio_respuesta = respuesta != data.get('respuesta', '')
+        mismo_modelo = data.get('modelo_embedding', MODELO_FAQ_POR_DEFECTO) == self.modelo_clave
+        actuales = leer_embeddings(data) if mismo_modelo else dict.fromkeys(CAMPOS)
+        
+        textos = {
+            'embedding_pregunta': (pregunta, cambio_pregunta),
+            'embedding_respuesta': (respuesta, cambio_respuesta),
+            'embedding_combinado': (f"{pregunta} {respuesta}", cambio_pregunta or cambio_respuesta),
+        }
+        pendientes = [campo for campo in CAMPOS if textos[campo][1] or actuales[campo] is None]
+        if not pendientes:
+            return {}
+        
+        nuevos = self.generar_embeddings([textos[campo][0] for campo in pendientes])
+        if not all(nuevos):
+            raise RuntimeError("No se pudieron generar los embeddings de la FAQ")
+        
+        vectores = {campo: (np.asarray(v).tolist() if v is not None else None) for campo, v in actuales.items()}
+        vectores.update(zip(pendientes, nuevos))
+        campos = {
+            **campos_embeddings(*(vectores[campo] for campo in CAMPOS)),
+            'modelo_embedding': self.modelo_clave,
+            'fecha_embedding': datetime.now()
+        }
+        if CAMPO_BLOB in data and CAMPO_BLOB not in campos:
+            campos[CAMPO_BLOB] = firestore.DELETE_FIELD  # la lectura dual prefiere el blob
+        logger.info(f"FAQ re-embebida: {', '.join(pendientes)}")
+        return campos
+    
+    def iniciar_suscripcion(self) -> bool:
+        """
+        Suscribe este proceso a los cambios de la colección 'faqs' (on_snapshot), así
+        cada worker converge en segundos sin recargar la colección. Se vuelve a
+        suscribir tras un fork (los hilos del listener no sobreviven al fork).
+        """
+        if not getattr(settings, 'FAQ_CHANGE_FEED_ENABLED', True):
+            return False
+        pid = os.getpid()
+        if self._suscripcion is not None and self._pid_suscripcion == pid:
+            return True
+        with self._lock_suscripcion:
+            if self._suscripcion is not None and self._pid_suscripcion == pid:
+                return True
+            try:
+                self._suscripcion = self.db.collection('faqs').on_snapshot(self._on_snapshot)
+                self._pid_suscripcion = pid
+                logger.info("📡 Suscrito al change feed de la colección 'faqs'")
+                return True
+            except Exception as e:
+                logger.error(f"No se pudo suscribir al change feed de FAQs: {e}")
+                return False
+    
+    def detener_suscripcion(self):
+        with self._lock_suscripcion:
+            if self._suscripcion is not None and self._pid_suscripcion == os.getpid():
+                self._suscripcion.unsubscribe()
+            self._suscripcion = None
+            self._pid_suscripcion = None
+    
     def buscar_semantica(self, pregunta: str, top_k: int = 5, umbral: float = 0.75) -> List[Dict]:
         """
-        Búsqueda semántica usando embeddings y FAISS
+        Búsqueda semántica usando embeddings y FAISS (pregunta y respuesta en una sola consulta)
         """
         try:
             if not self.index or not self.documents:
@@ -164,27 +577,48 @@ class FirebaseEmbeddingsService:
                 else:
                     logger.warning("Índice vectorial no disponible a pesar de estar inicializado")
                     return []
+            else:
+                self.iniciar_suscripcion()
             
             # Generar embedding de la pregunta
-            query_embedding = self.generar_embedding(pregunta)
-            if not query_embedding:
+            query_embedding = self.generar_embedding_consulta(pregunta)
+            if query_embedding is None:
                 return []
             
             query_vector = np.array([query_embedding], dtype=np.float32)
             faiss.normalize_L2(query_vector)
             
-            # Buscar similares
-            scores, indices = self.index.search(query_vector, top_k)
+            with self._lock:
+                # Dos filas por FAQ en modo 'max': pedir el doble para poder fusionar por documento;
+                # los vectores con tombstone se descartan después
+                filas = 2 * top_k if self.modo_multivector == 'max' else top_k
+                k = min(filas + len(self.vectores_muertos), self.index.ntotal)
+                if k <= 0:
+                    return []
+                scores, indices = self.index.search(query_vector, k)
+                
+                mejores = {}  # slot de la FAQ -> (score, campo)
+                for score, idx in zip(scores[0], indices[0]):
+                    if idx < 0 or idx in self.vectores_muertos:
+                        continue
+                    if self.modo_multivector == 'max':
+                        slot, campo = int(idx) // 2, ('pregunta' if idx % 2 == 0 else 'respuesta')
+                    else:
+                        slot, campo = int(idx), 'ponderada'
+                    if slot in self.documents and (slot not in mejores or score > mejores[slot][0]):
+                        mejores[slot] = (float(score), campo)
+                documentos = {slot: self.documents[slot] for slot in mejores}
             
             resultados = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
+            ordenados = sorted(mejores.items(), key=lambda x: x[1][0], reverse=True)[:top_k]
+            for i, (slot, (score, campo)) in enumerate(ordenados):
                 if score >= umbral:  # Filtrar por umbral de similitud
-                    doc = self.documents[idx]
                     resultados.append({
-                        'documento': doc,
-                        'score': float(score),
+                        'documento': documentos[slot],
+                        'score': score,
                         'rank': i + 1,
-                        'similitud_coseno': float(score)
+                        'similitud_coseno': score,
+                        'campo': campo
                     })
             
             return resultados
@@ -195,40 +629,45 @@ class FirebaseEmbeddingsService:
     
     def buscar_hibrida(self, pregunta: str, top_k: int = 3) -> Dict:
         """
-        Búsqueda híbrida: semántica + textual con respuesta final
+        Búsqueda híbrida: semántica + textual con respuesta final.
+        La búsqueda textual solo se ejecuta si la semántica no es concluyente
+        (mejor score < HYBRID_LEXICAL_THRESHOLD); los rankings se combinan con
+        la estrategia de HYBRID_FUSION.
         """
+        tiempos = {}
+        inicio = time.perf_counter()
         try:
+            pesos = {
+                'semantico': getattr(settings, 'HYBRID_WEIGHT_SEMANTIC', 0.8),
+                'textual': getattr(settings, 'HYBRID_WEIGHT_LEXICAL', 0.4),
+            }
+            
             # 1. Búsqueda semántica (embeddings)
+            marca = time.perf_counter()
             resultados_semanticos = self.buscar_semantica(pregunta, top_k=top_k, umbral=0.7)
+            tiempos['semantico'] = (time.perf_counter() - marca) * 1000
             
-            # 2. Búsqueda textual simple (fallback)
-            resultados_textuales = self._buscar_textual_simple(pregunta, top_k=top_k)
+            listas = {'semantico': resultados_semanticos}
             
-            # 3. Combinar y rankear resultados
-            todos_resultados = []
+            # 2. Búsqueda textual solo si la semántica no alcanza la confianza requerida
+            confianza_semantica = resultados_semanticos[0]['score'] if resultados_semanticos else 0.0
+            if confianza_semantica < getattr(settings, 'HYBRID_LEXICAL_THRESHOLD', 0.85):
+                marca = time.perf_counter()
+                listas['textual'] = self._buscar_textual_simple(pregunta, top_k=top_k)
+                tiempos['textual'] = (time.perf_counter() - marca) * 1000
             
-            # Agregar resultados semánticos con peso alto
-            for resultado in resultados_semanticos:
-                resultado['peso_total'] = resultado['score'] * 0.8  # 80% peso semántico
-                resultado['metodo'] = 'semantico'
-                todos_resultados.append(resultado)
-            
-            # Agregar resultados textuales si no hay suficientes semánticos
-            if len(resultados_semanticos) < 2:
-                for resultado in resultados_textuales:
-                    # Evitar duplicados
-                    ya_existe = any(r['documento']['id'] == resultado['documento']['id'] 
-                                  for r in todos_resultados)
-                    if not ya_existe:
-                        resultado['peso_total'] = resultado['score'] * 0.4  # 40% peso textual
-                        resultado['metodo'] = 'textual'
-                        todos_resultados.append(resultado)
-            
-            # Ordenar por peso total
-            todos_resultados.sort(key=lambda x: x['peso_total'], reverse=True)
+            # 3. Combinar y rankear resultados
+            marca = time.perf_counter()
+            todos_resultados = fusionar(listas, pesos)
+            tiempos['fusion'] = (time.perf_counter() - marca) * 1000
+            tiempos['total'] = (time.perf_counter() - inicio) * 1000
+            tiempos = {etapa: round(ms, 3) for etapa, ms in tiempos.items()}
+            logger.info(f"Búsqueda híbrida: {tiempos} ms, recuperadores={list(listas)}")
             
-            # 4. Si hay resultados, devolver el mejor
-            if todos_resultados and todos_resultados[0]['peso_total'] > 0.3:  # Umbral más alto
+            # 4. Si hay resultados, devolver el mejor (la confianza es el score ponderado
+            #    del recuperador, comparable entre estrategias de fusión)
+            umbral = getattr(settings, 'HYBRID_MIN_CONFIDENCE', 0.3)
+            if todos_resultados and todos_resultados[0]['confianza'] > umbral:
                 mejor_resultado = todos_resultados[0]
                 respuesta_original = mejor_resultado['documento']['respuesta']
                 
@@ -237,8 +676,10 @@ class FirebaseEmbeddingsService:
                     'found': True,
                     'answer': respuesta_original,
                     'pregunta_original': mejor_resultado['documento']['pregunta'],
-                    'similarity': mejor_resultado['peso_total'],
+                    'similarity': mejor_resultado['confianza'],
                     'metodo': mejor_resultado['metodo'],
+                    'recuperadores_ejecutados': list(listas),
+                    'tiempos_ms': tiempos,
                     'resultados_detalle': todos_resultados[:top_k]
                 }
             
@@ -248,6 +689,8 @@ class FirebaseEmbeddingsService:
                 'answer': None,
                 'similarity': 0.0,
                 'metodo': 'sin_resultados',
+                'recuperadores_ejecutados': list(listas),
+                'tiempos_ms': tiempos,
                 'resultados_detalle': todos_resultados[:top_k] if todos_resultados else []
             }
             
@@ -261,40 +704,27 @@ class FirebaseEmbeddingsService:
                 'error': str(e)
             }
     
-    def _buscar_textual_simple(self, pregunta: str, top_k: int = 3) -> List[Dict]:
+    def _buscar_textual_simple(self, pregunta: str, top_k: int = 3, umbral: float = 0.3) -> List[Dict]:
         """
-        Búsqueda textual simple como fallback
+        Búsqueda textual (BM25 en memoria, sin lecturas a Firestore) como fallback
         """
         try:
-            from difflib import SequenceMatcher
-            
-            faqs_ref = self.db.collection('faqs')
-            docs = faqs_ref.stream()
+            if self.indice_lexico is None and not self._initialized:
+                self._initialized = self.cargar_indice_vectorial()
+            with self._lock:
+                indice_lexico, documentos_lexicos = self.indice_lexico, self.documentos_lexicos
+            if indice_lexico is None:
+                return []
             
             resultados = []
-            
-            for doc in docs:
-                data = doc.to_dict()
-                pregunta_faq = data.get('pregunta', '')
-                
-                # Calcular similitud textual
-                similitud = SequenceMatcher(None, pregunta.lower(), pregunta_faq.lower()).ratio()
-                
-                if similitud >= 0.3:  # Umbral mínimo
+            for posicion, score in indice_lexico.buscar(pregunta, top_k=top_k):
+                if score >= umbral:  # Umbral mínimo
                     resultados.append({
-                        'documento': {
-                            'id': doc.id,
-                            'pregunta': pregunta_faq,
-                            'respuesta': data.get('respuesta', ''),
-                            'metadata': data
-                        },
-                        'score': similitud,
-                        'similitud_textual': similitud
+                        'documento': documentos_lexicos[posicion],
+                        'score': score,
+                        'similitud_textual': score
                     })
-            
-            # Ordenar por similitud
-            resultados.sort(key=lambda x: x['score'], reverse=True)
-            return resultados[:top_k]
+            return resultados
             
         except Exception as e:
             logger.error(f"Error en búsqueda textual: {e}")
@@ -8,9 +8,22 @@ from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
 from django.conf import settings
+from .embedding_codec import campos_embeddings, CAMPO_BLOB
 
 logger = logging.getLogger(__name__)
 
+# Proyecciones de lectura (select): cada llamador pide solo los campos que usa,
+# sin descargar los embeddings de cada documento
+CAMPOS_FAQ_TEXTO = ['pregunta', 'respuesta']
+CAMPOS_FAQ_INDEXACION = ['pregunta', 'respuesta', 'categoria', 'fecha_creacion', 'activo']
+CAMPOS_FAQ_LISTADO = [
+    'id', 'pregunta', 'respuesta', 'categoria', 'fecha_creacion', 'fecha_modificacion',
+    'activo', 'fuente', 'metadata'
+]
+CAMPOS_FAQ_ESTADISTICAS = ['activo', 'categoria']
+# Índice vectorial de FAQs: el blob (y las listas solo con FIREBASE_EMBEDDING_ENCODING='lista')
+CAMPOS_FAQ_EMBEDDINGS = CAMPOS_FAQ_INDEXACION + ['modelo_embedding', CAMPO_BLOB]
+
 class FirebaseService:
     """
     Servicio para gestionar el contenido FAQ en Firebase Firestore
@@ -125,19 +138,26 @@ class FirebaseService:
             logger.error(f"Error en migración: {e}")
             return False, f"Error durante la migración: {str(e)}"
     
-    def get_all_faqs(self) -> List[Dict]:
+    def get_all_faqs(self, campos: Optional[List[str]] = None) -> List[Dict]:
         """
         Obtiene todas las FAQs de Firestore
+        
+        Args:
+            campos: proyección a leer (p. ej. CAMPOS_FAQ_LISTADO); None lee el documento completo
         """
         if not self.is_connected():
             return []
         
         try:
-            docs = self.db.collection(self.collection_name).where('activo', '==', True).stream()
+            query = self.db.collection(self.collection_name).where('activo', '==', True)
+            if campos:
+                query = query.select(campos)
+            docs = query.stream()
             faqs = []
             
             for doc in docs:
                 data = doc.to_dict()
+                data.pop(CAMPO_BLOB, None)  # binario, no serializable en las respuestas JSON
                 data['document_id'] = doc.id
                 faqs.append(data)
             
@@ -158,7 +178,8 @@ class FirebaseService:
         try:
             # Búsqueda simple por palabras clave
             query_lower = query.lower()
-            docs = self.db.collection(self.collection_name).where('activo', '==', True).limit(limit * 3).stream()
+            docs = (self.db.collection(self.collection_name).where('activo', '==', True)
+                    .select(CAMPOS_FAQ_LISTADO).limit(limit * 3).stream())
             
             matching_faqs = []
             for doc in docs:
@@ -168,6 +189,7 @@ class FirebaseService:
                 
                 # Búsqueda simple por contención de texto
                 if query_lower in pregunta or query_lower in respuesta:
+                    data.pop(CAMPO_BLOB, None)
                     data['document_id'] = doc.id
                     matching_faqs.append(data)
                     
@@ -187,11 +209,11 @@ class FirebaseService:
         if not self.is_connected():
             return False, "Firebase no está conectado"
         try:
-            from .firebase_embeddings import FirebaseEmbeddingsService
-            embeddings_service = FirebaseEmbeddingsService()
-            embedding_pregunta = embeddings_service.generar_embedding(pregunta)
-            embedding_respuesta = embeddings_service.generar_embedding(respuesta)
-            embedding_combinado = embeddings_service.generar_embedding(f"{pregunta} {respuesta}")
+            # Reutiliza el servicio global (modelo y cliente ya cargados) y codifica en un solo batch
+            from .firebase_embeddings import firebase_embeddings
+            embedding_pregunta, embedding_respuesta, embedding_combinado = firebase_embeddings.generar_embeddings(
+                [pregunta, respuesta, f"{pregunta} {respuesta}"]
+            )
 
             doc_ref = self.db.collection(self.collection_name).document()
             faq_data = {
@@ -202,16 +224,21 @@ class FirebaseService:
                 'fecha_modificacion': None,
                 'activo': True,
                 'fuente': 'api_add',
-                'embedding_pregunta': embedding_pregunta,
-                'embedding_respuesta': embedding_respuesta,
-                'embedding_combinado': embedding_combinado,
+                **campos_embeddings(embedding_pregunta, embedding_respuesta, embedding_combinado),
+                'modelo_embedding': firebase_embeddings.modelo_clave,
                 'metadata': {
                     'palabras_clave': self._extract_keywords(pregunta),
                     'longitud_respuesta': len(respuesta)
                 }
             }
-            doc_ref.set(faq_data)
+            resultado = doc_ref.set(faq_data)
             logger.info(f"FAQ agregada con ID: {doc_ref.id}")
+
+            # Hacerla buscable de inmediato en el índice de FAQs de este proceso
+            # (los demás la reciben por el change feed) y en el vector store principal
+            firebase_embeddings.aplicar_faq(doc_ref.id, faq_data, version=resultado.update_time)
+            from .vector_store import upsert_faq_firebase
+            upsert_faq_firebase(doc_ref.id, faq_data['pregunta'], faq_data['respuesta'], faq_data['categoria'])
             return True, f"FAQ agregada exitosamente con ID: {doc_ref.id}"
         except Exception as e:
             logger.error(f"Error agregando FAQ: {e}")
@@ -219,7 +246,7 @@ class FirebaseService:
     
     def update_faq(self, document_id: str, pregunta: str = None, respuesta: str = None, categoria: str = None) -> Tuple[bool, str]:
         """
-        Actualiza una FAQ existente
+        Actualiza una FAQ existente, re-embebiendo solo los campos de texto que cambiaron
         """
         if not self.is_connected():
             return False, "Firebase no está conectado"
@@ -248,8 +275,30 @@ class FirebaseService:
             if categoria is not None:
                 update_data['categoria'] = categoria.strip()
             
-            doc_ref.update(update_data)
+            # Re-embeber solo lo que cambió (un único encode) para que la búsqueda
+            # semántica no siga encontrando el texto anterior
+            from .firebase_embeddings import firebase_embeddings
+            data = doc.to_dict()
+            nueva_pregunta = update_data.get('pregunta', data.get('pregunta', ''))
+            nueva_respuesta = update_data.get('respuesta', data.get('respuesta', ''))
+            campos = firebase_embeddings.campos_reembebidos(data, nueva_pregunta, nueva_respuesta)
+            update_data.update(campos)
+            
+            resultado = doc_ref.update(update_data)
             logger.info(f"FAQ actualizada: {document_id}")
+            
+            # Write-through: índice de FAQs de este proceso y vector store principal
+            for campo, valor in campos.items():
+                if valor is firestore.DELETE_FIELD:
+                    data.pop(campo, None)
+                else:
+                    data[campo] = valor
+            data.update(pregunta=nueva_pregunta, respuesta=nueva_respuesta,
+                        categoria=update_data.get('categoria', data.get('categoria', '')))
+            firebase_embeddings.aplicar_faq(document_id, data, version=resultado.update_time)
+            if data.get('activo', True):
+                from .vector_store import upsert_faq_firebase
+                upsert_faq_firebase(document_id, nueva_pregunta, nueva_respuesta, data['categoria'])
             return True, f"FAQ {document_id} actualizada exitosamente"
             
         except Exception as e:
@@ -266,18 +315,24 @@ class FirebaseService:
         try:
             doc_ref = self.db.collection(self.collection_name).document(document_id)
             
-            # Verificar que el documento existe
-            doc = doc_ref.get()
+            # Verificar que el documento existe (sin descargar los embeddings)
+            doc = doc_ref.get(field_paths=['activo'])
             if not doc.exists:
                 return False, f"FAQ con ID {document_id} no encontrada"
             
             # Marcar como inactiva en lugar de eliminar
-            doc_ref.update({
+            resultado = doc_ref.update({
                 'activo': False,
                 'fecha_modificacion': datetime.now()
             })
             
             logger.info(f"FAQ desactivada: {document_id}")
+            
+            # Write-through: tombstone en el índice de FAQs y baja en el vector store principal
+            from .firebase_embeddings import firebase_embeddings
+            from .vector_store import remove
+            firebase_embeddings.retirar_faq(document_id, version=resultado.update_time)
+            remove(f"faq:{document_id}")
             return True, f"FAQ {document_id} eliminada exitosamente"
             
         except Exception as e:
@@ -292,19 +347,21 @@ class FirebaseService:
             return {}
         
         try:
-            # Total de FAQs activas
-            active_count = len(list(self.db.collection(self.collection_name).where('activo', '==', True).stream()))
-            
-            # Total de FAQs inactivas
-            inactive_count = len(list(self.db.collection(self.collection_name).where('activo', '==', False).stream()))
-            
-            # FAQs por categoría
-            docs = self.db.collection(self.collection_name).where('activo', '==', True).stream()
+            # Una sola lectura proyectada a activo/categoria para todos los conteos
+            docs = self.db.collection(self.collection_name).select(CAMPOS_FAQ_ESTADISTICAS).stream()
+            active_count = 0
+            inactive_count = 0
             categories = {}
             for doc in docs:
                 data = doc.to_dict()
-                cat = data.get('categoria', 'Sin categoría')
-                categories[cat] = categories.get(cat, 0) + 1
+                activo = data.get('activo')
+                if activo is True:
+                    active_count += 1
+                    # FAQs por categoría
+                    cat = data.get('categoria', 'Sin categoría')
+                    categories[cat] = categories.get(cat, 0) + 1
+                elif activo is False:
+                    inactive_count += 1
             
             return {
                 'total_activas': active_count,
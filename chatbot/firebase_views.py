@@ -5,7 +5,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from .firebase_service import firebase_service
+from .firebase_service import firebase_service, CAMPOS_FAQ_LISTADO
 from .authentication import FAQTokenAuthentication
 import logging
 
@@ -32,7 +32,7 @@ class FirebaseFAQManagementAPIView(APIView):
             })
         
         elif action == 'list':
-            faqs = firebase_service.get_all_faqs()
+            faqs = firebase_service.get_all_faqs(campos=CAMPOS_FAQ_LISTADO)
             return Response({
                 'faqs': faqs,
                 'total': len(faqs),
@@ -0,0 +1,74 @@
+"""
+Fusión de rankings para la búsqueda híbrida (semántica + léxica).
+
+Cada recuperador entrega una lista ordenada de resultados {'documento', 'score'}.
+La estrategia se elige con HYBRID_FUSION: 'rrf' (Reciprocal Rank Fusion, usa
+posiciones ponderadas por recuperador) o 'ponderada' (suma de scores por peso
+del recuperador).
+"""
+from typing import Callable, Dict, List
+
+from django.conf import settings
+
+
+def _clave_documento(resultado: Dict) -> str:
+    return resultado['documento']['id']
+
+
+def _agrupar(listas: Dict[str, List[Dict]], pesos: Dict[str, float],
+             puntuar: Callable[[str, int, Dict], float]) -> List[Dict]:
+    fusionados = {}
+    for recuperador, resultados in listas.items():
+        for rank, resultado in enumerate(resultados, start=1):
+            clave = _clave_documento(resultado)
+            actual = fusionados.setdefault(clave, {
+                'documento': resultado['documento'],
+                'peso_total': 0.0,
+                'confianza': 0.0,
+                'scores': {},
+                'recuperadores': [],
+            })
+            actual['peso_total'] += puntuar(recuperador, rank, resultado)
+            actual['scores'][recuperador] = resultado['score']
+            actual['recuperadores'].append(recuperador)
+            # Confianza calibrada: mejor score individual ponderado por su recuperador
+            actual['confianza'] = max(actual['confianza'], resultado['score'] * pesos.get(recuperador, 1.0))
+
+    resultados = sorted(fusionados.values(), key=lambda r: r['peso_total'], reverse=True)
+    for rank, resultado in enumerate(resultados, start=1):
+        resultado['rank'] = rank
+        resultado['metodo'] = resultado['recuperadores'][0] if len(resultado['recuperadores']) == 1 else 'ambos'
+    return resultados
+
+
+def fusionar_rrf(listas: Dict[str, List[Dict]], pesos: Dict[str, float], k: int = 60) -> List[Dict]:
+    """
+    Reciprocal Rank Fusion ponderada: score = sum(peso / (k + rank)). No depende
+    de la escala de cada recuperador; el peso solo cambia cuánto aporta cada posición.
+    """
+    return _agrupar(listas, pesos, lambda recuperador, rank, resultado: pesos.get(recuperador, 1.0) / (k + rank))
+
+
+def fusionar_ponderada(listas: Dict[str, List[Dict]], pesos: Dict[str, float]) -> List[Dict]:
+    """
+    Combinación lineal de scores (los scores deben estar en [0, 1]).
+    """
+    return _agrupar(listas, pesos, lambda recuperador, rank, resultado: resultado['score'] * pesos.get(recuperador, 1.0))
+
+
+ESTRATEGIAS_FUSION = {
+    'rrf': lambda listas, pesos: fusionar_rrf(listas, pesos, k=getattr(settings, 'HYBRID_RRF_K', 60)),
+    'ponderada': fusionar_ponderada,
+}
+
+
+def fusionar(listas: Dict[str, List[Dict]], pesos: Dict[str, float], estrategia: str = None) -> List[Dict]:
+    """
+    Fusiona las listas con la estrategia configurada (por defecto HYBRID_FUSION).
+
+    Returns:
+        resultados ordenados con 'peso_total' (score de fusión), 'confianza',
+        'scores' por recuperador, 'rank' y 'metodo' (recuperador que lo aportó o 'ambos')
+    """
+    estrategia = estrategia or getattr(settings, 'HYBRID_FUSION', 'rrf')
+    return ESTRATEGIAS_FUSION.get(estrategia, fusionar_rrf)(listas, pesos)
@@ -0,0 +1,296 @@
+"""
+Fábrica de índices FAISS configurable (Flat, HNSW, IVF), con almacenamiento
+comprimido opcional (float16, int8 SQ8, PQ) y evaluador de recall@k / latencia
+frente al baseline exacto.
+"""
+import math
+import time
+import logging
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('flat', 'hnsw', 'ivf')
+COMPRESIONES = ('none', 'fp16', 'sq8', 'pq')
+
+# Mínimo de vectores de entrenamiento por centroide recomendado por FAISS
+PUNTOS_POR_CENTROIDE = 39
+
+
+def configuracion_indice(**overrides) -> Dict:
+    """
+    Configuración del índice a partir de settings, con valores sobreescribibles.
+    """
+    config = {
+        'modo': getattr(settings, 'VECTOR_INDEX_MODE', 'flat'),
+        'hnsw_m': getattr(settings, 'VECTOR_INDEX_HNSW_M', 32),
+        'ef_construction': getattr(settings, 'VECTOR_INDEX_EF_CONSTRUCTION', 80),
+        'ef_search': getattr(settings, 'VECTOR_INDEX_EF_SEARCH', 64),
+        'nlist': getattr(settings, 'VECTOR_INDEX_IVF_NLIST', 0),
+        'nprobe': getattr(settings, 'VECTOR_INDEX_NPROBE', 8),
+        'compresion': getattr(settings, 'VECTOR_INDEX_COMPRESSION', 'none'),
+        'pq_m': getattr(settings, 'VECTOR_INDEX_PQ_M', 48),
+        'rerank': getattr(settings, 'VECTOR_INDEX_RERANK', False),
+        'rerank_factor': getattr(settings, 'VECTOR_INDEX_RERANK_FACTOR', 4),
+    }
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    if config['modo'] not in MODOS:
+        logger.warning(f"Modo de índice desconocido '{config['modo']}', usando flat")
+        config['modo'] = 'flat'
+    if config['compresion'] not in COMPRESIONES:
+        logger.warning(f"Compresión desconocida '{config['compresion']}', usando none")
+        config['compresion'] = 'none'
+    return config
+
+
+def describir_configuracion(config: Dict) -> str:
+    """
+    Descripción estable de los parámetros que afectan a la construcción del índice
+    (se usa para invalidar snapshots cuando cambian).
+    """
+    modo = config['modo']
+    if modo == 'hnsw':
+        descripcion = f"hnsw:M={config['hnsw_m']},efC={config['ef_construction']}"
+    elif modo == 'ivf':
+        descripcion = f"ivf:nlist={config['nlist'] or 'auto'}"
+    else:
+        descripcion = "flat"
+
+    compresion = config['compresion']
+    if compresion != 'none':
+        descripcion += f"|{compresion}"
+        if compresion == 'pq':
+            descripcion += f":m={config['pq_m']}"
+    return descripcion
+
+
+def usa_rerank(config: Optional[Dict] = None) -> bool:
+    """
+    Re-rank exacto de los candidatos con los embeddings originales, leídos del
+    memmap de la cache de embeddings: no agrega nada residente al índice.
+    fp16 ya es prácticamente exacto; el re-rank solo aporta con SQ8/PQ.
+    """
+    config = config or configuracion_indice()
+    return bool(config['rerank']) and config['compresion'] in ('sq8', 'pq')
+
+
+def _metrica_faiss(metrica: str):
+    return faiss.METRIC_INNER_PRODUCT if metrica == 'ip' else faiss.METRIC_L2
+
+
+def _calcular_nlist(config: Dict, n_vectores: int) -> int:
+    nlist = config['nlist'] or int(4 * math.sqrt(max(n_vectores, 1)))
+    # Sin suficientes puntos de entrenamiento los centroides son inestables
+    maximo = max(1, n_vectores // PUNTOS_POR_CENTROIDE)
+    return max(1, min(nlist, maximo))
+
+
+def _calcular_pq(config: Dict, dimension: int, n_vectores: int):
+    """
+    Subcuantizadores (deben dividir la dimensión) y bits por código
+    (2^bits centroides necesitan al menos ese número de puntos de entrenamiento).
+    """
+    m = max(1, min(config['pq_m'], dimension))
+    while dimension % m:
+        m -= 1
+    nbits = max(1, min(8, int(math.log2(max(n_vectores, 2)))))
+    return m, nbits
+
+
+def crear_indice(dimension: int, n_vectores: int, metrica: str = 'l2', config: Optional[Dict] = None):
+    """
+    Crea un índice FAISS vacío (sin entrenar) según la configuración.
+    El índice solo guarda los códigos comprimidos: el re-rank (usa_rerank) se
+    hace fuera, con los vectores de la cache en disco, para que sq8/pq ocupen
+    menos memoria que fp16.
+    """
+    config = config or configuracion_indice()
+    metric = _metrica_faiss(metrica)
+    modo = config['modo']
+    compresion = config['compresion']
+    tipos_sq = {'fp16': faiss.ScalarQuantizer.QT_fp16, 'sq8': faiss.ScalarQuantizer.QT_8bit}
+
+    if modo == 'hnsw':
+        if compresion in tipos_sq:
+            indice = faiss.IndexHNSWSQ(dimension, tipos_sq[compresion], config['hnsw_m'], metric)
+        elif compresion == 'pq':
+            m, nbits = _calcular_pq(config, dimension, n_vectores)
+            indice = faiss.IndexHNSWPQ(dimension, m, config['hnsw_m'], nbits, metric)
+        else:
+            indice = faiss.IndexHNSWFlat(dimension, config['hnsw_m'], metric)
+        indice.hnsw.efConstruction = config['ef_construction']
+
+    elif modo == 'ivf':
+        nlist = _calcular_nlist(config, n_vectores)
+        cuantizador = faiss.IndexFlat(dimension, metric)
+        if compresion in tipos_sq:
+            indice = faiss.IndexIVFScalarQuantizer(cuantizador, dimension, nlist, tipos_sq[compresion], metric)
+        elif compresion == 'pq':
+            m, nbits = _calcular_pq(config, dimension, n_vectores)
+            indice = faiss.IndexIVFPQ(cuantizador, dimension, nlist, m, nbits, metric)
+        else:
+            indice = faiss.IndexIVFFlat(cuantizador, dimension, nlist, metric)
+
+    else:
+        if compresion in tipos_sq:
+            indice = faiss.IndexScalarQuantizer(dimension, tipos_sq[compresion], metric)
+        elif compresion == 'pq':
+            m, nbits = _calcular_pq(config, dimension, n_vectores)
+            indice = faiss.IndexPQ(dimension, m, nbits, metric)
+        else:
+            indice = faiss.IndexFlat(dimension, metric)
+
+    return indice
+
+
+def configurar_busqueda(indice, config: Optional[Dict] = None):
+    """
+    Aplica los parámetros de búsqueda (efSearch / nprobe), también a través de IndexIDMap.
+    """
+    config = config or configuracion_indice()
+    parametros = faiss.ParameterSpace()
+    if config['modo'] == 'hnsw':
+        parametros.set_index_parameter(indice, 'efSearch', int(config['ef_search']))
+    elif config['modo'] == 'ivf':
+        parametros.set_index_parameter(indice, 'nprobe', int(config['nprobe']))
+
+
+def construir_indice(matriz: np.ndarray, ids: Optional[np.ndarray] = None, metrica: str = 'l2',
+                     config: Optional[Dict] = None, con_ids: bool = True):
+    """
+    Crea, entrena y llena un índice con la matriz de embeddings.
+
+    Args:
+        matriz: embeddings float32 (n, d)
+        ids: ids int64 de cada fila (por defecto 0..n-1)
+        metrica: 'l2' o 'ip'
+        con_ids: envolver en IndexIDMap2 para poder agregar/eliminar por id
+    """
+    config = config or configuracion_indice()
+    matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+    n, dimension = matriz.shape
+
+    base = crear_indice(dimension, n, metrica, config)
+    if not base.is_trained:
+        base.train(matriz)
+
+    indice = faiss.IndexIDMap2(base) if con_ids else base
+    if con_ids:
+        if ids is None:
+            ids = np.arange(n, dtype=np.int64)
+        indice.add_with_ids(matriz, np.asarray(ids, dtype=np.int64))
+    else:
+        indice.add(matriz)
+
+    configurar_busqueda(indice, config)
+    return indice
+
+
+def soporta_eliminacion(indice) -> bool:
+    """
+    HNSW no permite eliminar vectores; en ese caso se usan tombstones.
+    """
+    base = faiss.downcast_index(indice.index) if isinstance(indice, faiss.IndexIDMap) else indice
+    return not isinstance(base, faiss.IndexHNSW)
+
+
+def bytes_por_vector(indice) -> float:
+    """
+    Tamaño serializado del índice dividido por el número de vectores.
+    """
+    if not indice.ntotal:
+        return 0.0
+    return round(faiss.serialize_index(indice).nbytes / indice.ntotal, 1)
+
+
+# --------- EVALUACIÓN ---------
+
+def _percentil_ms(latencias: List[float], p: float) -> float:
+    return round(float(np.percentile(latencias, p)) * 1000, 3) if latencias else 0.0
+
+
+def evaluar_modos(matriz: np.ndarray, consultas: np.ndarray, k: int = 10, metrica: str = 'l2',
+                  configuraciones: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Compara varias configuraciones de índice contra la búsqueda exacta (flat).
+    El re-rank se evalúa como en el vector store: rerank_factor·k candidatos
+    reordenados con los vectores originales (aquí la propia matriz, en
+    producción el memmap de la cache), que no cuentan en bytes_vector.
+
+    Returns:
+        lista de dicts con recall@k, latencia p50/p99 por consulta (ms) y tiempo de construcción
+    """
+    matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+    consultas = np.ascontiguousarray(consultas, dtype=np.float32)
+    k = min(k, len(matriz))
+
+    if configuraciones is None:
+        configuraciones = [
+            {'modo': 'flat'},
+            {'modo': 'hnsw', 'ef_search': 16},
+            {'modo': 'hnsw', 'ef_search': 64},
+            {'modo': 'hnsw', 'ef_search': 128},
+            {'modo': 'ivf', 'nprobe': 1},
+            {'modo': 'ivf', 'nprobe': 8},
+            {'modo': 'ivf', 'nprobe': 32},
+            {'modo': 'flat', 'compresion': 'fp16'},
+            {'modo': 'flat', 'compresion': 'sq8', 'rerank': False},
+            {'modo': 'flat', 'compresion': 'sq8', 'rerank': True},
+            {'modo': 'flat', 'compresion': 'pq', 'rerank': False},
+            {'modo': 'flat', 'compresion': 'pq', 'rerank': True},
+        ]
+
+    exacto = construir_indice(matriz, metrica=metrica, config=configuracion_indice(modo='flat'), con_ids=False)
+    _, vecinos_exactos = exacto.search(consultas, k)
+
+    reportes = []
+    for overrides in configuraciones:
+        config = configuracion_indice(**overrides)
+
+        inicio = time.perf_counter()
+        indice = construir_indice(matriz, metrica=metrica, config=config, con_ids=False)
+        tiempo_construccion = time.perf_counter() - inicio
+
+        rerank = usa_rerank(config)
+        k_busqueda = min(k * int(config['rerank_factor']), len(matriz)) if rerank else k
+
+        latencias = []
+        aciertos = 0
+        for fila, consulta in enumerate(consultas):
+            inicio = time.perf_counter()
+            _, vecinos = indice.search(consulta.reshape(1, -1), k_busqueda)
+            if rerank:
+                candidatos = vecinos[0][vecinos[0] >= 0]
+                if metrica == 'ip':
+                    orden = np.argsort(-(matriz[candidatos] @ consulta))
+                else:
+                    orden = np.argsort(((matriz[candidatos] - consulta) ** 2).sum(axis=1))
+                vecinos = candidatos[orden][:k].reshape(1, -1)
+            latencias.append(time.perf_counter() - inicio)
+            aciertos += len(set(vecinos[0]) & set(vecinos_exactos[fila]))
+
+        parametro = ''
+        if config['modo'] == 'hnsw':
+            parametro = f"efSearch={config['ef_search']}"
+        elif config['modo'] == 'ivf':
+            parametro = f"nprobe={config['nprobe']}, nlist={faiss.extract_index_ivf(indice).nlist}"
+
+        if config['compresion'] != 'none':
+            parametro = ", ".join(p for p in (parametro, config['compresion'],
+                                               'rerank' if rerank else '') if p)
+
+        reportes.append({
+            'modo': config['modo'],
+            'parametros': parametro,
+            'bytes_vector': bytes_por_vector(indice),
+            f'recall@{k}': round(aciertos / (k * len(consultas)), 4) if len(consultas) else 0.0,
+            'p50_ms': _percentil_ms(latencias, 50),
+            'p99_ms': _percentil_ms(latencias, 99),
+            'construccion_s': round(tiempo_construccion, 3),
+        })
+
+    return reportes
@@ -0,0 +1,99 @@
+"""
+Compara los backends de inferencia de embeddings (torch, onnx, onnx-int8) sobre
+textos reales del corpus: throughput en lote, latencia de una consulta y
+deriva coseno frente a los vectores de torch.
+
+Uso:
+    python manage.py benchmark_embeddings --textos 512 --lote 32
+"""
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot.document_loader import cargar_documentos
+from chatbot.embedding_models import BACKENDS, nombre_modelo, cargar_modelo
+
+
+def _normalizar(matriz: np.ndarray) -> np.ndarray:
+    return matriz / np.linalg.norm(matriz, axis=1, keepdims=True).clip(min=1e-12)
+
+
+class Command(BaseCommand):
+    help = "Mide throughput, latencia y deriva coseno de los backends de embeddings frente a torch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', default=None, help="Por defecto el del vector store")
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+        parser.add_argument('--textos', type=int, default=512)
+        parser.add_argument('--lote', type=int, default=32)
+        parser.add_argument('--consultas', type=int, default=100,
+                            help="Codificaciones individuales para medir la latencia")
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        nombre = options['modelo'] or nombre_modelo('vector_store')
+
+        documentos = cargar_documentos()
+        if not documentos:
+            self.stderr.write("No hay documentos para el benchmark")
+            return
+        random.seed(options['semilla'])
+        muestra = random.sample(documentos, min(options['textos'], len(documentos)))
+        textos = [d.page_content for d in muestra]
+        consultas = textos[:options['consultas']]
+
+        backends = options['backends']
+        if 'torch' not in backends:
+            backends = ['torch'] + backends  # referencia para la deriva
+
+        self.stdout.write(f"Modelo {nombre}: {len(textos)} textos, lote {options['lote']}")
+
+        referencia = None
+        reportes = []
+        for backend in backends:
+            try:
+                modelo = cargar_modelo(nombre, backend)
+            except Exception as e:
+                self.stderr.write(f"{backend}: no disponible ({e})")
+                continue
+
+            modelo.encode(textos[:options['lote']], batch_size=options['lote'])  # calentamiento
+
+            inicio = time.perf_counter()
+            vectores = np.asarray(
+                modelo.encode(textos, batch_size=options['lote'], convert_to_numpy=True), dtype=np.float32
+            )
+            duracion = time.perf_counter() - inicio
+
+            latencias = []
+            for texto in consultas:
+                inicio = time.perf_counter()
+                modelo.encode([texto], convert_to_numpy=True)
+                latencias.append(time.perf_counter() - inicio)
+
+            vectores = _normalizar(vectores)
+            if backend == 'torch':
+                referencia = vectores
+
+            reporte = {
+                'backend': backend,
+                'textos_s': round(len(textos) / duracion, 1),
+                'p50_ms': round(float(np.percentile(latencias, 50)) * 1000, 2),
+                'p99_ms': round(float(np.percentile(latencias, 99)) * 1000, 2),
+                'coseno_medio': '-',
+                'coseno_min': '-',
+            }
+            if referencia is not None:
+                cosenos = np.sum(vectores * referencia, axis=1)
+                reporte['coseno_medio'] = round(float(cosenos.mean()), 5)
+                reporte['coseno_min'] = round(float(cosenos.min()), 5)
+            reportes.append(reporte)
+
+        if not reportes:
+            return
+        columnas = list(reportes[0].keys())
+        self.stdout.write(" | ".join(f"{c:>14}" for c in columnas))
+        for reporte in reportes:
+            self.stdout.write(" | ".join(f"{str(reporte[c]):>14}" for c in columnas))
@@ -0,0 +1,66 @@
+"""
+Compara los modos de índice (Flat, HNSW, IVF) y las compresiones (fp16, SQ8, PQ)
+sobre el corpus real: recall@k frente a la búsqueda exacta, bytes por vector y
+latencia p50/p99 por consulta.
+
+Uso:
+    python manage.py evaluar_indices --k 10 --consultas 200
+"""
+import random
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot.document_loader import cargar_documentos
+from chatbot.embedding_cache import codificar_con_cache
+from chatbot.embedding_models import nombre_modelo, obtener_modelo, clave_modelo
+from chatbot.index_factory import evaluar_modos
+
+
+class Command(BaseCommand):
+    help = "Evalúa recall@k y latencia de los modos de índice FAISS frente al baseline flat"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--consultas', type=int, default=200,
+                            help="Número máximo de consultas (preguntas de FAQ y chunks muestreados)")
+        parser.add_argument('--metrica', choices=['l2', 'ip'], default='l2')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        nombre = nombre_modelo('vector_store')
+        modelo = obtener_modelo(nombre)
+        modelo_id = clave_modelo(nombre)
+
+        documentos = cargar_documentos()
+        if not documentos:
+            self.stderr.write("No hay documentos para evaluar")
+            return
+
+        matriz = codificar_con_cache(modelo_id, modelo, [d.page_content for d in documentos])
+
+        # Consultas: preguntas reales de FAQ y, si faltan, chunks del corpus
+        random.seed(options['semilla'])
+        textos_consulta = [d.metadata["pregunta_original"] for d in documentos
+                           if d.metadata.get("source") == "faq" and d.metadata.get("pregunta_original")]
+        random.shuffle(textos_consulta)
+        textos_consulta = textos_consulta[:options['consultas']]
+        faltantes = options['consultas'] - len(textos_consulta)
+        if faltantes > 0:
+            muestra = random.sample(documentos, min(faltantes, len(documentos)))
+            textos_consulta += [d.page_content for d in muestra]
+
+        consultas = codificar_con_cache(modelo_id, modelo, textos_consulta)
+        if options['metrica'] == 'ip':
+            matriz = matriz / np.linalg.norm(matriz, axis=1, keepdims=True).clip(min=1e-12)
+            consultas = consultas / np.linalg.norm(consultas, axis=1, keepdims=True).clip(min=1e-12)
+
+        self.stdout.write(
+            f"Corpus: {len(matriz)} vectores (d={matriz.shape[1]}), {len(consultas)} consultas, k={options['k']}"
+        )
+        reportes = evaluar_modos(matriz, consultas, k=options['k'], metrica=options['metrica'])
+
+        columnas = list(reportes[0].keys())
+        self.stdout.write(" | ".join(f"{c:>22}" for c in columnas))
+        for reporte in reportes:
+            self.stdout.write(" | ".join(f"{str(reporte[c]):>22}" for c in columnas))
@@ -0,0 +1,30 @@
+"""
+Exporta los modelos de embeddings configurados a ONNX y genera la variante
+int8 con cuantización dinámica (EMBEDDING_BACKEND=onnx / onnx-int8).
+
+Uso:
+    python manage.py exportar_onnx --cuantizacion avx512_vnni
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embedding_models import nombre_modelo, exportar_onnx
+
+
+class Command(BaseCommand):
+    help = "Exporta los modelos de embeddings a ONNX (fp32 e int8 dinámico)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', action='append',
+                            help="Modelo a exportar (por defecto los de vector store y FAQs)")
+        parser.add_argument('--cuantizacion', choices=['avx512_vnni', 'avx512', 'avx2', 'arm64'],
+                            default=getattr(settings, 'EMBEDDING_ONNX_QUANTIZATION', 'avx512_vnni'))
+
+    def handle(self, *args, **options):
+        modelos = options['modelo'] or sorted({nombre_modelo('vector_store'), nombre_modelo('faq')})
+        for nombre in modelos:
+            try:
+                directorio = exportar_onnx(nombre, options['cuantizacion'])
+            except ImportError as e:
+                raise CommandError(f"Falta el soporte ONNX (pip install optimum[onnxruntime]): {e}")
+            self.stdout.write(f"{nombre} -> {directorio}")
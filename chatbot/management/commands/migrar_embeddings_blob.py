@@ -0,0 +1,61 @@
+"""
+Convierte los embeddings de las FAQs de Firestore (tres listas de floats) al
+campo binario compacto 'embeddings_blob'. Es idempotente: los documentos que
+ya tienen blob se omiten salvo que se indique --forzar.
+
+Uso:
+    python manage.py migrar_embeddings_blob --formato float16 --eliminar-listas
+"""
+from django.core.management.base import BaseCommand, CommandError
+from firebase_admin import firestore
+
+from chatbot.embedding_codec import CAMPOS, CAMPO_BLOB, codificar_embeddings, leer_embeddings
+from chatbot.firebase_service import firebase_service
+
+
+class Command(BaseCommand):
+    help = "Migra los embeddings de FAQs en Firestore al formato binario compacto"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=['float16', 'float32'], default='float16')
+        parser.add_argument('--eliminar-listas', action='store_true',
+                            help="Borrar los campos de listas tras escribir el blob (sin lectura dual)")
+        parser.add_argument('--forzar', action='store_true', help="Reescribir también los documentos con blob")
+        parser.add_argument('--lote', type=int, default=200, help="Escrituras por batch (máx. 500)")
+
+    def handle(self, *args, **options):
+        if not firebase_service.is_connected():
+            raise CommandError("Firebase no está conectado")
+
+        db = firebase_service.db
+        batch = db.batch()
+        pendientes = migrados = omitidos = 0
+
+        for doc in db.collection(firebase_service.collection_name).stream():
+            data = doc.to_dict()
+            if data.get(CAMPO_BLOB) and not options['forzar']:
+                omitidos += 1
+                continue
+
+            embeddings = leer_embeddings(data)
+            if any(embeddings[campo] is None for campo in CAMPOS):
+                omitidos += 1  # sin embeddings completos: migrar_faqs_con_embeddings los genera
+                continue
+
+            cambios = {CAMPO_BLOB: codificar_embeddings([embeddings[c] for c in CAMPOS], options['formato'])}
+            if options['eliminar_listas']:
+                cambios.update({campo: firestore.DELETE_FIELD for campo in CAMPOS})
+
+            batch.update(doc.reference, cambios)
+            pendientes += 1
+            migrados += 1
+            if pendientes >= min(options['lote'], 500):
+                batch.commit()
+                batch = db.batch()
+                pendientes = 0
+                self.stdout.write(f"Migrados {migrados} documentos...")
+
+        if pendientes:
+            batch.commit()
+
+        self.stdout.write(f"Migración completada: {migrados} documentos convertidos, {omitidos} omitidos")
@@ -0,0 +1,268 @@
+"""
+Ingesta de PDFs en paralelo con cache de extracción por archivo.
+
+Cada PDF se parsea y se divide en chunks una sola vez: el resultado se guarda
+en disco indexado por el sha256 de su contenido, y un manifest con
+(ruta, tamaño, mtime) -> sha256 evita incluso volver a leer los archivos que
+no cambiaron. Los PDFs nuevos o modificados se procesan en un pool de
+procesos (PyMuPDF + splitter son CPU-bound y no liberan el GIL).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+MIN_CHUNK = 50  # Filtrar chunks muy pequeños
+
+# Cambia si cambia la extracción o el splitter: invalida las entradas de cache anteriores
+VERSION_EXTRACCION = f"1-{CHUNK_SIZE}-{CHUNK_OVERLAP}-{MIN_CHUNK}"
+
+
+def hash_archivo(ruta: str) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def iterar_chunks_pdf(ruta: str, estadisticas: Optional[Dict] = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Generador página -> chunks -> filtro: PyMuPDF entrega una página a la vez
+    (lazy_load) y cada página se divide y filtra antes de leer la siguiente, así
+    no conviven las páginas, el texto unido y los chunks del PDF. Lo acotado es
+    la extracción: _procesar_pdf junta los chunks del archivo para la cache.
+
+    Args:
+        estadisticas: dict opcional donde se acumulan páginas, caracteres y
+            chunks generados (incluidos los filtrados)
+    """
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    if estadisticas is None:
+        estadisticas = {}
+    estadisticas.update(paginas=0, caracteres=0, chunks_generados=0)
+
+    filename = os.path.basename(ruta)
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    for pagina in PyMuPDFLoader(ruta).lazy_load():
+        estadisticas['paginas'] += 1
+        estadisticas['caracteres'] += len(pagina.page_content)
+        for doc in splitter.split_documents([pagina]):
+            chunk_id = estadisticas['chunks_generados']
+            estadisticas['chunks_generados'] += 1
+            if len(doc.page_content.strip()) < MIN_CHUNK:
+                continue
+            doc.metadata.update({
+                "source": "pdf",
+                "filename": filename,
+                "chunk_id": chunk_id,
+                "tipo": "pdf",
+                "tipo_documento": "pdf_syllabus",
+            })
+            yield doc.page_content, doc.metadata
+
+
+def _procesar_pdf(ruta: str) -> Tuple[List[Tuple[str, Dict]], Dict, float]:
+    """
+    Parsea y divide un PDF (se ejecuta en un proceso del pool: no usa settings
+    ni devuelve objetos pesados, solo (texto, metadata) por chunk). Devuelve la
+    lista completa de chunks del archivo.
+
+    Returns:
+        (chunks, estadísticas, segundos de procesamiento)
+    """
+    inicio = time.perf_counter()
+    estadisticas = {}
+    chunks = list(iterar_chunks_pdf(ruta, estadisticas))
+    # total_chunks solo se conoce al terminar el archivo
+    for _, metadata in chunks:
+        metadata["total_chunks"] = estadisticas['chunks_generados']
+    return chunks, estadisticas, time.perf_counter() - inicio
+
+
+class CacheExtraccionPDF:
+    """
+    Cache en disco de chunks extraídos: manifest.json con (tamaño, mtime, sha256)
+    por ruta y un archivo JSON de chunks por sha256 + versión de extracción.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta_manifest = os.path.join(directorio, "manifest.json")
+        self.manifest = self._leer_json(self.ruta_manifest) or {}
+        self._modificado = False
+
+    @staticmethod
+    def _leer_json(ruta: str):
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _escribir_json(ruta: str, datos):
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, default=str)
+        os.replace(temporal, ruta)
+
+    def _ruta_chunks(self, sha: str) -> str:
+        return os.path.join(self.directorio, f"{sha}-{VERSION_EXTRACCION}.json")
+
+    def huella(self, ruta: str) -> Dict:
+        """
+        (tamaño, mtime, sha256) del archivo; el sha solo se recalcula si cambió tamaño o mtime.
+        """
+        stat = os.stat(ruta)
+        clave = os.path.abspath(ruta)
+        anterior = self.manifest.get(clave)
+        if anterior and anterior['tamano'] == stat.st_size and anterior['mtime_ns'] == stat.st_mtime_ns:
+            return anterior
+        huella = {'tamano': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_archivo(ruta)}
+        self.manifest[clave] = huella
+        self._modificado = True
+        return huella
+
+    def obtener(self, huella: Dict) -> Optional[Dict]:
+        return self._leer_json(self._ruta_chunks(huella['sha256']))
+
+    def guardar(self, huella: Dict, chunks: List[Tuple[str, Dict]], estadisticas: Dict):
+        self._escribir_json(self._ruta_chunks(huella['sha256']), {
+            'chunks': chunks,
+            'estadisticas': estadisticas,
+        })
+
+    def guardar_manifest(self):
+        if self._modificado:
+            self._escribir_json(self.ruta_manifest, self.manifest)
+            self._modificado = False
+
+
+def _numero_workers(pendientes: int) -> int:
+    workers = getattr(settings, 'PDF_INGESTION_WORKERS', 0) or os.cpu_count() or 1
+    return max(1, min(workers, pendientes))
+
+
+def ingerir_pdfs(directorio: str) -> List[Document]:
+    """
+    Carga los chunks de todos los PDFs del directorio: los que no cambiaron salen
+    de la cache, el resto se parsea en paralelo. Registra un reporte de
+    throughput por archivo. Todos los chunks se devuelven en memoria (son parte
+    del docstore del vector store).
+    """
+    inicio = time.perf_counter()
+    try:
+        rutas = sorted(os.path.join(directorio, f) for f in os.listdir(directorio) if f.endswith(".pdf"))
+    except Exception as e:
+        logger.error(f"❌ Error accediendo al directorio de PDFs: {str(e)}")
+        return []
+    logger.info(f"Encontrados {len(rutas)} archivos PDF en {directorio}")
+
+    usar_cache = getattr(settings, 'PDF_INGESTION_CACHE_ENABLED', True)
+    cache = None
+    if usar_cache:
+        cache = CacheExtraccionPDF(
+            getattr(settings, 'PDF_INGESTION_CACHE_DIR', os.path.join("media", "cache", "pdf"))
+        )
+
+    resultados = {}  # ruta -> (chunks, estadisticas, origen, segundos)
+    huellas = {}
+    pendientes = []
+    for ruta in rutas:
+        if cache is None:
+            pendientes.append(ruta)
+            continue
+        try:
+            huellas[ruta] = cache.huella(ruta)
+            marca = time.perf_counter()
+            entrada = cache.obtener(huellas[ruta])
+        except Exception as e:
+            logger.warning(f"Cache de PDFs no disponible para {os.path.basename(ruta)}: {e}")
+            entrada = None
+        if entrada is None:
+            pendientes.append(ruta)
+        else:
+            resultados[ruta] = (entrada['chunks'], entrada['estadisticas'], 'cache', time.perf_counter() - marca)
+
+    if pendientes:
+        workers = _numero_workers(len(pendientes))
+        logger.info(f"Procesando {len(pendientes)} PDFs nuevos o modificados con {workers} procesos")
+
+        def registrar(ruta, chunks, estadisticas, segundos):
+            resultados[ruta] = (chunks, estadisticas, 'parseado', segundos)
+            if cache is not None and ruta in huellas:
+                cache.guardar(huellas[ruta], chunks, estadisticas)
+
+        if workers == 1:
+            # Sin pool: arrancar procesos no compensa para un solo archivo
+            for ruta in pendientes:
+                try:
+                    registrar(ruta, *_procesar_pdf(ruta))
+                except Exception as e:
+                    logger.error(f"❌ Error cargando PDF {os.path.basename(ruta)}: {str(e)}")
+        else:
+            # spawn: hacer fork de un proceso con hilos (listeners, servidores) puede bloquearse
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as pool:
+                futuros = {ruta: pool.submit(_procesar_pdf, ruta) for ruta in pendientes}
+                for ruta, futuro in futuros.items():
+                    try:
+                        registrar(ruta, *futuro.result())
+                    except Exception as e:
+                        logger.error(f"❌ Error cargando PDF {os.path.basename(ruta)}: {str(e)}")
+
+    if cache is not None:
+        try:
+            cache.guardar_manifest()
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el manifest de la cache de PDFs: {e}")
+
+    documentos = []
+    megabytes_total = 0.0
+    for ruta in rutas:
+        if ruta not in resultados:
+            continue
+        chunks, estadisticas, origen, segundos = resultados[ruta]
+        filename = os.path.basename(ruta)
+        if not estadisticas.get('paginas'):
+            logger.warning(f"PDF {filename} está vacío o no se pudo leer")
+            continue
+        if estadisticas.get('caracteres', 0) < 100:
+            logger.warning(f"PDF {filename} tiene muy poco contenido: {estadisticas.get('caracteres', 0)} caracteres")
+
+        documentos.extend(Document(page_content=texto, metadata=metadata) for texto, metadata in chunks)
+        megabytes = os.path.getsize(ruta) / (1024 * 1024)
+        megabytes_total += megabytes
+        logger.info(
+            f"✅ PDF {filename} ({origen}): {estadisticas['paginas']} páginas, {len(chunks)} chunks, "
+            f"{megabytes:.2f} MB en {segundos:.2f}s ({megabytes / max(segundos, 1e-6):.1f} MB/s)"
+        )
+
+    total = time.perf_counter() - inicio
+    cargados = len(resultados)
+    desde_cache = sum(1 for resultado in resultados.values() if resultado[2] == 'cache')
+    logger.info(
+        f"📊 Total PDFs cargados: {cargados} ({desde_cache} desde cache), "
+        f"Total chunks: {len(documentos)}, {megabytes_total:.1f} MB en {total:.2f}s "
+        f"({cargados / max(total, 1e-6):.1f} PDFs/s)"
+    )
+    return documentos
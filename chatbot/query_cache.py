@@ -0,0 +1,97 @@
+"""
+Cache en memoria de embeddings de consultas (texto normalizado -> vector).
+
+Las mismas preguntas de estudiantes llegan miles de veces al día; con esta
+cache las repeticiones no pasan por el modelo. Está acotada por tamaño (LRU)
+y por tiempo de vida (TTL).
+"""
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from cachetools import TTLCache
+from django.conf import settings
+
+_ESPACIOS = re.compile(r"\s+")
+_PUNTUACION_EXTREMOS = "¿?¡!.,;: \t\n"
+
+
+def normalizar_consulta(texto: str) -> str:
+    """
+    Normaliza una consulta para usarla como clave: NFC, minúsculas, espacios
+    colapsados y sin signos de interrogación/exclamación en los extremos.
+    """
+    texto = unicodedata.normalize("NFC", texto).lower()
+    texto = _ESPACIOS.sub(" ", texto)
+    return texto.strip(_PUNTUACION_EXTREMOS)
+
+
+class CacheConsultas:
+    """
+    Cache LRU con TTL, segura entre hilos y con contadores de aciertos.
+    """
+
+    def __init__(self, max_entradas: int = 10000, ttl_segundos: float = 3600):
+        self._cache = TTLCache(maxsize=max_entradas, ttl=ttl_segundos)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener_o_calcular(self, modelo: str, texto: str,
+                           calcular: Callable[[str], np.ndarray]) -> np.ndarray:
+        """
+        Devuelve el vector cacheado para (modelo, texto normalizado) o lo calcula
+        y lo guarda. El texto normalizado es solo la clave: el vector se calcula
+        con la consulta original, así activar la cache no cambia los rankings
+        (las variantes con la misma clave comparten el vector de la primera).
+        """
+        normalizado = normalizar_consulta(texto) or texto
+        clave = (modelo, normalizado)
+
+        with self._lock:
+            vector = self._cache.get(clave)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = calcular(texto)
+        vector.setflags(write=False)  # el mismo array se comparte entre peticiones
+
+        with self._lock:
+            self._cache[clave] = vector
+        return vector
+
+    def limpiar(self):
+        with self._lock:
+            self._cache.clear()
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._cache),
+                'max_entradas': self._cache.maxsize,
+                'ttl_segundos': self._cache.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_cache_consultas: Optional[CacheConsultas] = None
+_lock_global = threading.Lock()
+
+
+def obtener_cache_consultas() -> CacheConsultas:
+    global _cache_consultas
+    if _cache_consultas is None:
+        with _lock_global:
+            if _cache_consultas is None:
+                _cache_consultas = CacheConsultas(
+                    max_entradas=getattr(settings, 'QUERY_CACHE_MAX_ENTRIES', 10000),
+                    ttl_segundos=getattr(settings, 'QUERY_CACHE_TTL_SECONDS', 3600)
+                )
+    return _cache_consultas
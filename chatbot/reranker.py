@@ -0,0 +1,162 @@
+"""
+Re-ranking opcional de candidatos con un cross-encoder pequeño.
+
+Los top-N candidatos de la primera etapa se puntúan en un solo lote con
+presupuesto de tiempo por petición: si el modelo no responde a tiempo se
+conserva el orden original. Los scores (consulta, chunk) se cachean, así las
+preguntas frecuentes solo pagan el re-rank una vez.
+"""
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from .query_cache import normalizar_consulta
+
+logger = logging.getLogger(__name__)
+
+MODELO_RERANKER_POR_DEFECTO = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class ReordenadorCrossEncoder:
+    """
+    Cross-encoder compartido con cache de scores y ejecución acotada en tiempo.
+    """
+
+    def __init__(self, nombre_modelo: str, presupuesto_ms: float = 150,
+                 max_entradas: int = 20000, ttl_segundos: float = 3600):
+        self.nombre_modelo = nombre_modelo
+        self.presupuesto = presupuesto_ms / 1000.0
+        self._modelo = None
+        self._lock_modelo = threading.Lock()
+        self._cache = TTLCache(maxsize=max_entradas, ttl=ttl_segundos)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.errores = 0
+
+    def _obtener_modelo(self):
+        if self._modelo is None:
+            with self._lock_modelo:
+                if self._modelo is None:
+                    from sentence_transformers import CrossEncoder
+                    logger.info(f"Cargando cross-encoder: {self.nombre_modelo}")
+                    self._modelo = CrossEncoder(self.nombre_modelo)
+        return self._modelo
+
+    def precargar(self):
+        """
+        Carga el modelo por adelantado para que la primera petición no agote su presupuesto.
+        """
+        self._obtener_modelo()
+
+    def _obtener_executor(self) -> ThreadPoolExecutor:
+        # Un solo hilo: bajo carga las peticiones agotan su presupuesto en vez de
+        # encolar inferencias en paralelo. Se recrea tras un fork.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+                    self._pid = os.getpid()
+        return self._executor
+
+    @staticmethod
+    def _clave(consulta: str, texto: str) -> Tuple[str, str]:
+        return consulta, hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+    def _puntuar(self, consulta: str, pendientes: Dict[Tuple[str, str], str]) -> Dict[Tuple[str, str], float]:
+        claves = list(pendientes)
+        scores = self._obtener_modelo().predict(
+            [(consulta, pendientes[clave]) for clave in claves], batch_size=len(claves), show_progress_bar=False
+        )
+        resultado = {clave: float(score) for clave, score in zip(claves, scores)}
+        # Se guardan aunque la petición ya haya agotado su presupuesto: la siguiente acierta
+        with self._lock:
+            self._cache.update(resultado)
+        return resultado
+
+    def reordenar(self, consulta: str, candidatos: List,
+                  texto: Callable = lambda c: c['documento'].page_content) -> Tuple[List, Optional[List[float]]]:
+        """
+        Reordena los candidatos (resultados de buscar_documentos) por score del cross-encoder.
+
+        Returns:
+            (candidatos reordenados, scores en [0, 1]) o (candidatos en el orden
+            original, None) si se agotó el presupuesto o hubo un error
+        """
+        if not candidatos:
+            return candidatos, None
+
+        consulta_normalizada = normalizar_consulta(consulta) or consulta
+        claves = [self._clave(consulta_normalizada, texto(c)) for c in candidatos]
+
+        with self._lock:
+            scores = {clave: self._cache[clave] for clave in claves if clave in self._cache}
+            self.hits += len(scores)
+            self.misses += len(claves) - len(scores)
+
+        pendientes = {clave: texto(c) for clave, c in zip(claves, candidatos) if clave not in scores}
+        if pendientes:
+            futuro = self._obtener_executor().submit(self._puntuar, consulta_normalizada, pendientes)
+            try:
+                scores.update(futuro.result(timeout=self.presupuesto))
+            except FuturesTimeout:
+                with self._lock:
+                    self.timeouts += 1
+                logger.info(f"Re-rank fuera de presupuesto ({self.presupuesto * 1000:.0f} ms), se usa el orden original")
+                return candidatos, None
+            except Exception as e:
+                with self._lock:
+                    self.errores += 1
+                logger.error(f"Error en re-rank: {e}")
+                return candidatos, None
+
+        orden = sorted(range(len(candidatos)), key=lambda i: scores[claves[i]], reverse=True)
+        return [candidatos[i] for i in orden], [scores[claves[i]] for i in orden]
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'modelo': self.nombre_modelo,
+                'cargado': self._modelo is not None,
+                'presupuesto_ms': self.presupuesto * 1000,
+                'entradas': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'timeouts': self.timeouts,
+                'errores': self.errores,
+            }
+
+
+_reordenador: Optional[ReordenadorCrossEncoder] = None
+_lock_global = threading.Lock()
+
+
+def obtener_reordenador() -> Optional[ReordenadorCrossEncoder]:
+    """
+    Reordenador compartido, o None si RERANKER_ENABLED está desactivado.
+    """
+    global _reordenador
+    if not getattr(settings, 'RERANKER_ENABLED', False):
+        return None
+    if _reordenador is None:
+        with _lock_global:
+            if _reordenador is None:
+                _reordenador = ReordenadorCrossEncoder(
+                    getattr(settings, 'RERANKER_MODEL', MODELO_RERANKER_POR_DEFECTO),
+                    presupuesto_ms=getattr(settings, 'RERANKER_TIMEOUT_MS', 150),
+                    max_entradas=getattr(settings, 'RERANKER_CACHE_MAX_ENTRIES', 20000),
+                    ttl_segundos=getattr(settings, 'RERANKER_CACHE_TTL_SECONDS', 3600)
+                )
+    return _reordenador
@@ -107,11 +107,24 @@ class FAQDuplicateCheckAPIView(APIView):
                 'error': 'umbral_similitud debe ser un número entre 0 y 1'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        resultado = validar_faq_duplicado_simple(pregunta, umbral)
+        umbral_coseno = request.data.get('umbral_coseno')
+        if umbral_coseno is not None:
+            try:
+                umbral_coseno = float(umbral_coseno)
+                if not 0 <= umbral_coseno <= 1:
+                    raise ValueError()
+            except (ValueError, TypeError):
+                return Response({
+                    'error': 'umbral_coseno debe ser un número entre 0 y 1'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        resultado = validar_faq_duplicado_simple(pregunta, umbral, umbral_coseno)
         
         return Response({
             'pregunta_consultada': pregunta,
             'umbral_usado': umbral,
+            'umbral_coseno_usado': resultado.get('umbral_coseno'),
+            'metodo': resultado.get('metodo'),
             'es_duplicado': resultado['es_duplicado'],
             'pregunta_similar': resultado['pregunta_similar'],
             'similitud': resultado['similitud'],
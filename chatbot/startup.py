@@ -34,6 +34,12 @@ def inicializar_chatbot_startup():
             except Exception as e:
                 logger.info(f"Vector store principal se cargará bajo demanda: {e}")
             
+            # 3. Precargar el cross-encoder de re-ranking (si está habilitado)
+            from .reranker import obtener_reordenador
+            reordenador = obtener_reordenador()
+            if reordenador is not None:
+                reordenador.precargar()
+            
             logger.info("🎉 Precarga automática del chatbot completada exitosamente")
             
         except Exception as e:
@@ -1,3 +1,286 @@
-from django.test import TestCase
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from langchain.schema import Document
 
-# Create your tests here.
+from . import vector_store
+from .bm25_index import IndiceBM25
+from .dedup import DeduplicadorMinHash, deduplicar_documentos
+from .document_loader import limpiar_columna_web
+from .embedding_codec import CAMPO_BLOB, codificar_embeddings, decodificar_embeddings, leer_embeddings
+from .fusion import fusionar
+from .index_factory import configuracion_indice, construir_indice
+from .query_cache import normalizar_consulta
+from .vector_store import SnapshotVectorStore, normalizar_vectores
+
+DIMENSION = 8
+
+
+def _vectores(n, semilla=0):
+    return normalizar_vectores(np.random.default_rng(semilla).normal(size=(n, DIMENSION)))
+
+
+def _documento(doc_id):
+    return Document(page_content=f"contenido {doc_id}", metadata={"source": "web", "doc_id": doc_id})
+
+
+def _snapshot(n=6):
+    """
+    Snapshot con n documentos web y vectores aleatorios, más los vectores para
+    comparar con la búsqueda exacta.
+    """
+    matriz = _vectores(n)
+    documentos = [_documento(f"web:{i}") for i in range(n)]
+    indice = construir_indice(matriz, metrica='l2', config=configuracion_indice())
+    ids = {doc.metadata["doc_id"]: i for i, doc in enumerate(documentos)}
+    snapshot = SnapshotVectorStore(documentos, indice, ids, "modelo", "modelo")
+    return snapshot, {doc.metadata["doc_id"]: matriz[i] for i, doc in enumerate(documentos)}
+
+
+def _ids_encontrados(snapshot, consulta, top_k):
+    return [r['documento'].metadata["doc_id"] for r in snapshot.buscar(consulta.reshape(1, -1), top_k)]
+
+
+def _ids_exactos(vivos, consulta, top_k):
+    return sorted(vivos, key=lambda doc_id: -float(vivos[doc_id] @ consulta))[:top_k]
+
+
+@override_settings(VECTOR_INDEX_MODE='flat', VECTOR_INDEX_COMPRESSION='none', VECTOR_STORE_DELTA_MAX=3)
+class DeltaVectoresTests(SimpleTestCase):
+
+    def tearDown(self):
+        vector_store._publicar(None)
+
+    def test_consolida_al_llegar_a_delta_max(self):
+        snapshot, vivos = _snapshot()
+        nuevos = _vectores(3, semilla=1)
+
+        actual = snapshot.con_documento("web:nuevo0", _documento("web:nuevo0"), nuevos[:1])
+        actual = actual.sin_documento("web:0")
+        # Por debajo del máximo se comparte el índice base
+        self.assertIs(actual.indice, snapshot.indice)
+        self.assertEqual(len(actual.delta), 2)
+
+        actual = actual.con_documento("web:1", _documento("web:1"), nuevos[1:2])
+        self.assertIsNot(actual.indice, snapshot.indice)
+        self.assertEqual(len(actual.delta), 0)
+        self.assertEqual(len(snapshot.delta), 0)  # el snapshot publicado no cambia
+
+        vivos.pop("web:0")
+        vivos["web:nuevo0"], vivos["web:1"] = nuevos[0], nuevos[1]
+        self.assertEqual(len(actual), len(vivos))
+        for consulta in _vectores(4, semilla=2):
+            self.assertEqual(_ids_encontrados(actual, consulta, 3), _ids_exactos(vivos, consulta, 3))
+
+    @override_settings(VECTOR_STORE_DELTA_MAX=10)
+    def test_busqueda_combina_base_y_delta(self):
+        snapshot, vivos = _snapshot()
+        nuevo = _vectores(1, semilla=3)
+        actual = snapshot.con_documento("web:2", _documento("web:2"), nuevo).sin_documento("web:4")
+        # Reemplazar web:2 lo retira del base y lo agrega al delta
+        self.assertEqual(actual.delta.retirados, {"web:2", "web:4"})
+        self.assertEqual(list(actual.delta.agregados), ["web:2"])
+
+        vivos["web:2"] = nuevo[0]
+        vivos.pop("web:4")
+        for consulta in _vectores(4, semilla=4):
+            self.assertEqual(_ids_encontrados(actual, consulta, 5), _ids_exactos(vivos, consulta, 5))
+
+    def test_reconstruccion_reaplica_escrituras_recibidas(self):
+        base, _ = _snapshot()
+        vector_store._publicar(base)
+        nuevo = _vectores(1, semilla=5)
+
+        def construir(_):
+            # Escritura que llega mientras se construye el snapshot nuevo
+            vector_store._aplicar_escritura(
+                lambda actual: actual.con_documento("web:durante", _documento("web:durante"), nuevo)
+            )
+            reconstruido, _ = _snapshot()
+            return reconstruido
+
+        self.assertTrue(vector_store._reemplazar_snapshot(construir, "reconstruido", en_segundo_plano=False))
+        publicado = vector_store.obtener_snapshot()
+        self.assertIsNot(publicado, base)
+        self.assertTrue(publicado.contiene("web:durante"))
+        self.assertEqual(len(publicado), len(base) + 1)
+        self.assertIsNone(vector_store._operaciones_pendientes)
+
+
+@override_settings(VECTOR_INDEX_MODE='hnsw', VECTOR_INDEX_COMPRESSION='none', VECTOR_STORE_DELTA_MAX=1,
+                   VECTOR_STORE_COMPACTION_RATIO=1.0)
+class SnapshotTombstonesTests(SimpleTestCase):
+
+    def test_buscar_omite_tombstones(self):
+        snapshot, vivos = _snapshot()
+        actual = snapshot.sin_documento("web:0").sin_documento("web:3")
+        self.assertEqual(len(actual.vectores_muertos), 2)
+        self.assertEqual(actual.indice.ntotal, 6)  # HNSW no elimina: quedan como tombstones
+
+        vivos.pop("web:0")
+        vivos.pop("web:3")
+        self.assertEqual(len(actual), 4)
+        for doc_id in ("web:0", "web:3"):
+            consulta = snapshot.indice.reconstruct(int(doc_id.split(":")[1]))
+            self.assertEqual(_ids_encontrados(actual, consulta, 4), _ids_exactos(vivos, consulta, 4))
+
+
+class IndiceBM25Tests(SimpleTestCase):
+
+    def setUp(self):
+        self.indice = IndiceBM25.construir([
+            {'pregunta': '¿Cuándo es la matrícula?', 'respuesta': 'La matrícula ordinaria es en marzo.'},
+            {'pregunta': '¿Dónde está la biblioteca?', 'respuesta': 'En el bloque central.'},
+            {'pregunta': 'Horario de la biblioteca', 'respuesta': 'De lunes a viernes.'},
+        ])
+
+    def test_scores_normalizados_y_ordenados(self):
+        resultados = self.indice.buscar("matricula marzo", top_k=3)
+        self.assertEqual(resultados[0][0], 0)
+        scores = [score for _, score in resultados]
+        self.assertTrue(all(0.0 < score <= 1.0 for score in scores))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_cobertura_parcial_puntua_menos(self):
+        completa = dict(self.indice.buscar("horario biblioteca"))
+        parcial = dict(self.indice.buscar("horario matricula"))
+        self.assertGreater(completa[2], parcial[2])
+
+    def test_sin_terminos_conocidos(self):
+        self.assertEqual(self.indice.buscar("laboratorio"), [])
+        self.assertEqual(self.indice.buscar("de la"), [])  # solo stopwords
+
+
+@override_settings(HYBRID_RRF_K=60)
+class FusionTests(SimpleTestCase):
+
+    def setUp(self):
+        documento = lambda doc_id: {'id': doc_id}
+        self.listas = {
+            'semantico': [{'documento': documento('a'), 'score': 0.9}, {'documento': documento('b'), 'score': 0.5}],
+            'textual': [{'documento': documento('b'), 'score': 0.9}, {'documento': documento('c'), 'score': 0.7}],
+        }
+        self.pesos = {'semantico': 0.8, 'textual': 0.4}
+
+    def _por_id(self, resultados):
+        return {r['documento']['id']: r for r in resultados}
+
+    def test_rrf_pondera_por_recuperador(self):
+        resultados = fusionar(self.listas, self.pesos, estrategia='rrf')
+        por_id = self._por_id(resultados)
+        self.assertAlmostEqual(por_id['b']['peso_total'], 0.8 / 62 + 0.4 / 61)
+        self.assertAlmostEqual(por_id['a']['peso_total'], 0.8 / 61)
+        self.assertAlmostEqual(por_id['c']['peso_total'], 0.4 / 62)
+        self.assertEqual([r['documento']['id'] for r in resultados], ['b', 'a', 'c'])
+        self.assertEqual(por_id['b']['metodo'], 'ambos')
+        self.assertEqual(por_id['c']['metodo'], 'textual')
+        self.assertEqual([r['rank'] for r in resultados], [1, 2, 3])
+
+    def test_ponderada_suma_scores(self):
+        resultados = fusionar(self.listas, self.pesos, estrategia='ponderada')
+        por_id = self._por_id(resultados)
+        self.assertAlmostEqual(por_id['a']['peso_total'], 0.9 * 0.8)
+        self.assertAlmostEqual(por_id['b']['peso_total'], 0.5 * 0.8 + 0.9 * 0.4)
+        self.assertAlmostEqual(por_id['b']['confianza'], 0.5 * 0.8)
+        self.assertEqual(por_id['b']['scores'], {'semantico': 0.5, 'textual': 0.9})
+        self.assertEqual([r['documento']['id'] for r in resultados], ['b', 'a', 'c'])
+
+
+class EmbeddingCodecTests(SimpleTestCase):
+
+    def setUp(self):
+        self.vectores = np.random.default_rng(0).normal(size=(3, 384)).astype(np.float32)
+
+    def test_ida_y_vuelta_float32(self):
+        matriz = decodificar_embeddings(codificar_embeddings(self.vectores.tolist(), 'float32'))
+        self.assertEqual(matriz.dtype, np.float32)
+        np.testing.assert_array_equal(matriz, self.vectores)
+
+    def test_ida_y_vuelta_float16(self):
+        blob = codificar_embeddings(self.vectores.tolist(), 'float16')
+        self.assertEqual(len(blob), 8 + 3 * 384 * 2)
+        np.testing.assert_allclose(decodificar_embeddings(blob), self.vectores, atol=1e-2)
+
+    def test_lectura_dual(self):
+        listas = {
+            'embedding_pregunta': self.vectores[0].tolist(),
+            'embedding_respuesta': self.vectores[1].tolist(),
+            'embedding_combinado': self.vectores[2].tolist(),
+        }
+        desde_blob = leer_embeddings({CAMPO_BLOB: codificar_embeddings(self.vectores.tolist(), 'float32')})
+        desde_listas = leer_embeddings(listas)
+        for campo, vector in desde_listas.items():
+            np.testing.assert_array_equal(desde_blob[campo], vector)
+        self.assertEqual(leer_embeddings({}), dict.fromkeys(listas))
+
+    def test_blob_invalido(self):
+        with self.assertRaises(ValueError):
+            decodificar_embeddings(b"XYZ" + bytes(5))
+
+
+@override_settings(CORPUS_DEDUP_NUM_PERM=128)
+class DeduplicacionTests(SimpleTestCase):
+    TEXTO = ("La Universidad de las Fuerzas Armadas ESPE ofrece la carrera de Ingeniería de Software "
+             "con mallas actualizadas, laboratorios equipados y docentes con experiencia en la industria")
+
+    def test_minhash_detecta_casi_duplicados(self):
+        deduplicador = DeduplicadorMinHash(umbral=0.8)
+        self.assertEqual(deduplicador.agregar(self.TEXTO, 'original'), (None, 0.0))
+        original, similitud = deduplicador.agregar(self.TEXTO + " y convenios", 'copia')
+        self.assertEqual(original, 'original')
+        self.assertGreaterEqual(similitud, 0.8)
+        nuevo, _ = deduplicador.agregar("Horario de atención de la secretaría académica del departamento", 'otro')
+        self.assertIsNone(nuevo)
+
+    def test_conserva_faqs_y_metadata(self):
+        documentos = [
+            Document(self.TEXTO, {"source": "web", "url": "u1"}),
+            Document(self.TEXTO, {"source": "pdf", "filename": "a.pdf", "chunk_id": 0}),
+            Document(self.TEXTO, {"source": "faq", "pregunta_original": "p"}),
+            Document("Contenido distinto sobre becas y ayudas económicas para estudiantes", {"source": "web"}),
+        ]
+        metadata = [dict(doc.metadata) for doc in documentos]
+
+        conservados, reporte = deduplicar_documentos(documentos, umbral=0.85)
+
+        self.assertEqual([doc.metadata.get("source") for doc in conservados], ["web", "faq", "web"])
+        self.assertEqual(reporte['descartados_por_fuente'], {"pdf": 1})
+        self.assertEqual([doc.metadata for doc in documentos], metadata)
+
+
+@override_settings(WEB_BOILERPLATE_MIN_PAGES=3, WEB_BOILERPLATE_MIN_RATIO=0.3)
+class LimpiezaWebTests(SimpleTestCase):
+    PIE = "Sangolquí, Av. General Rumiñahui s/n, todos los derechos reservados"
+
+    def test_descarta_boilerplate_y_lineas_basura(self):
+        contenidos = pd.Series([
+            f"Inicio\nMatrícula abierta hasta el 15 de marzo\n{self.PIE}",
+            f"SERVICIOS\nLa biblioteca atiende de lunes a viernes\n\n\n{self.PIE}",
+            f"Becas para estudiantes de grado\n{self.PIE}",
+            "Página sin pie",
+        ], index=[10, 11, 12, 13])
+
+        limpio = limpiar_columna_web(contenidos)
+
+        self.assertEqual(list(limpio.index), [10, 11, 12, 13])
+        self.assertEqual(limpio[10], "Matrícula abierta hasta el 15 de marzo")
+        self.assertEqual(limpio[11], "La biblioteca atiende de lunes a viernes")
+        self.assertEqual(limpio[12], "Becas para estudiantes de grado")
+        self.assertEqual(limpio[13], "Página sin pie")
+
+    def test_pocas_paginas_conservan_lineas_repetidas(self):
+        contenidos = pd.Series([f"Contenido uno\n{self.PIE}", f"Contenido dos\n{self.PIE}"])
+        self.assertTrue(all(self.PIE in texto for texto in limpiar_columna_web(contenidos)))
+
+
+class NormalizarConsultaTests(SimpleTestCase):
+
+    def test_normaliza_mayusculas_espacios_y_signos(self):
+        self.assertEqual(normalizar_consulta("  ¿Cómo me   MATRICULO?\n"), "cómo me matriculo")
+        self.assertEqual(normalizar_consulta("¡Hola!"), "hola")
+
+    def test_formas_unicode_equivalentes(self):
+        self.assertEqual(normalizar_consulta("matri\u0301cula"), normalizar_consulta("matr\u00edcula"))
+
+    def test_conserva_signos_internos(self):
+        self.assertEqual(normalizar_consulta("¿Costo, en USD?"), "costo, en usd")
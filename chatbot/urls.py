@@ -4,6 +4,11 @@ from .simple_views import FAQManagementAPIView, FAQDuplicateCheckAPIView, Simple
 from .firebase_views import FirebaseFAQManagementAPIView, FirebaseFAQSearchAPIView, FirebaseStatusAPIView
 from django.http import JsonResponse
 from django.views import View
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from .authentication import FAQTokenAuthentication
 from .document_loader import cargar_documentos
 
 class TestView(View):
@@ -55,9 +60,65 @@ class DocumentCheckView(View):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+class EmbeddingMetricsView(APIView):
+    """
+    Métricas internas de embeddings (requiere el token de gestión de FAQ)
+    """
+    authentication_classes = [FAQTokenAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Métricas de los codificadores de consultas (profundidad de cola, tamaño de lote),
+        de la cache de embeddings de consultas y de la cache persistente de embeddings
+        (entradas y tasa de aciertos por modelo)
+        """
+        if request.auth is None:
+            return Response({'error': 'Token de autorización requerido'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        from .embedding_cache import estadisticas_cache
+        from .embedding_models import metricas_codificadores
+        from .query_cache import obtener_cache_consultas
+        from .reranker import obtener_reordenador
+        reordenador = obtener_reordenador()
+        return Response({
+            "codificadores": metricas_codificadores(),
+            "cache_consultas": obtener_cache_consultas().metricas(),
+            "cache_embeddings": estadisticas_cache(),
+            "reranker": reordenador.metricas() if reordenador else None
+        })
+
+class VectorStoreReindexView(APIView):
+    """
+    Estado y reconstrucción del vector store (requiere el token de gestión de FAQ para POST)
+    """
+    authentication_classes = [FAQTokenAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from .vector_store import estado_vector_store
+        return Response(estado_vector_store())
+
+    def post(self, request):
+        """
+        Reconstruye el vector store en segundo plano; las búsquedas siguen
+        usando el índice actual hasta que el nuevo se publica
+        """
+        if request.auth is None:
+            return Response({'error': 'Token de autorización requerido'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        from .vector_store import reconstruir_vector_store
+        iniciada = reconstruir_vector_store(en_segundo_plano=True)
+        return Response(
+            {'reconstruccion_iniciada': iniciada},
+            status=status.HTTP_202_ACCEPTED if iniciada else status.HTTP_409_CONFLICT
+        )
+
 urlpatterns = [
     path('test/', TestView.as_view(), name='test'),
     path('docs/check/', DocumentCheckView.as_view(), name='document-check'),
+    path('metrics/embeddings/', EmbeddingMetricsView.as_view(), name='embedding-metrics'),
+    path('vector-store/reindex/', VectorStoreReindexView.as_view(), name='vector-store-reindex'),
     path('chatbot/', ChatbotAPIView.as_view(), name='chatbot'),
     path('chatbot/test-context/', ChatbotTestContextAPIView.as_view(), name='chatbot-test-context'),
     
@@ -1,57 +1,795 @@
-from huggingface_hub import login
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
 from django.conf import settings
-from .document_loader import cargar_documentos
+from langchain.schema import Document
+from .document_loader import cargar_documentos, cargar_faqs_desde_csv, crear_documento_faq
+from .embedding_cache import codificar_con_cache, vectores_en_cache
+from .embedding_models import nombre_modelo, obtener_modelo, clave_modelo, codificar_consulta
+from .dedup import ultimo_reporte
+from .delta_index import DeltaVectores, maximo_delta
+from .faq_index import IndicePreguntasFAQ
+from .index_factory import (
+    configuracion_indice, describir_configuracion, construir_indice, crear_indice, configurar_busqueda,
+    soporta_eliminacion, usa_rerank
+)
+
+logger = logging.getLogger(__name__)
+
+# Versión del formato del snapshot en disco. Incrementarla invalida los snapshots existentes.
+VERSION_SNAPSHOT = 3
+SNAPSHOTS_A_CONSERVAR = 2
+# Tope de vecinos extra por búsqueda para saltar tombstones (la compactación los mantiene pocos)
+MAX_VECINOS_EXTRA = 128
+
+# Referencia atómica al estado publicado. Las búsquedas leen la referencia una
+# sola vez y trabajan sobre ese objeto aunque entretanto se publique otro.
+_snapshot_actual = None
+
+_lock_inicializacion = threading.Lock()  # single-flight de la carga inicial
+_lock_escritura = threading.Lock()  # serializa upsert/remove y la publicación de reconstrucciones
+_lock_reconstruccion = threading.Lock()  # solo una reconstrucción a la vez
+_operaciones_pendientes = None  # escrituras (snapshot -> snapshot) recibidas durante una reconstrucción
+
+
+# --------- SNAPSHOT PERSISTENTE DEL ÍNDICE ---------
+
+def _directorio_base_snapshots():
+    return getattr(settings, 'VECTOR_STORE_DIR', os.path.join("media", "index"))
+
+
+def calcular_hash_corpus(documentos, modelo, descripcion_indice=""):
+    """
+    Calcula un hash estable del corpus (modelo + tipo de índice + contenido + metadata, en orden).
+    Cualquier cambio en un documento, en el modelo o en el índice produce un hash distinto.
+    """
+    h = hashlib.sha256()
+    h.update(f"v{VERSION_SNAPSHOT}|{modelo}|{descripcion_indice}".encode("utf-8"))
+    for doc in documentos:
+        h.update(b"\x00")
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(b"\x01")
+        h.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _directorio_snapshot(hash_corpus):
+    return os.path.join(_directorio_base_snapshots(), f"v{VERSION_SNAPSHOT}-{hash_corpus[:24]}")
+
+
+def guardar_snapshot(documentos, indice, hash_corpus, modelo):
+    """
+    Guarda índice FAISS, chunks y manifest en un directorio versionado.
+    Se escribe primero en un directorio temporal y luego se renombra,
+    de modo que un lector nunca ve un snapshot a medio escribir.
+    """
+    destino = _directorio_snapshot(hash_corpus)
+    if os.path.exists(os.path.join(destino, "manifest.json")):
+        return destino
+
+    base = _directorio_base_snapshots()
+    os.makedirs(base, exist_ok=True)
+    temporal = f"{destino}.tmp-{os.getpid()}"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    try:
+        faiss.write_index(indice, os.path.join(temporal, "index.faiss"))
+
+        with open(os.path.join(temporal, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                [{"page_content": d.page_content, "metadata": d.metadata} for d in documentos],
+                f, ensure_ascii=False, default=str
+            )
+
+        manifest = {
+            "version": VERSION_SNAPSHOT,
+            "modelo": modelo,
+            "hash_corpus": hash_corpus,
+            "documentos": len(documentos),
+            "indice": describir_configuracion(configuracion_indice()),
+            "dimension": indice.d,
+            "vectores": indice.ntotal,
+            "creado": datetime.now().isoformat()
+        }
+        with open(os.path.join(temporal, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        try:
+            os.rename(temporal, destino)
+        except OSError:
+            # Otro proceso publicó el mismo snapshot primero
+            shutil.rmtree(temporal, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+    _podar_snapshots(conservar=destino)
+    logger.info(f"Snapshot del vector store guardado en {destino}")
+    return destino
+
+
+def cargar_snapshot(hash_corpus, modelo):
+    """
+    Carga el snapshot que corresponde al hash del corpus, si existe y su manifest es válido.
+
+    Returns:
+        tuple (documentos, indice) o None si hay que reconstruir
+    """
+    directorio = _directorio_snapshot(hash_corpus)
+    ruta_manifest = os.path.join(directorio, "manifest.json")
+    if not os.path.exists(ruta_manifest):
+        return None
+
+    try:
+        with open(ruta_manifest, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if (manifest.get("version") != VERSION_SNAPSHOT
+                or manifest.get("modelo") != modelo
+                or manifest.get("hash_corpus") != hash_corpus):
+            logger.info("Manifest del snapshot no coincide, se reconstruirá el índice")
+            return None
+
+        indice = faiss.read_index(os.path.join(directorio, "index.faiss"))
+        with open(os.path.join(directorio, "chunks.json"), encoding="utf-8") as f:
+            chunks = json.load(f)
+
+        if indice.ntotal != manifest["vectores"] or len(chunks) != manifest["documentos"]:
+            logger.warning(f"Snapshot inconsistente en {directorio}, se reconstruirá el índice")
+            return None
+
+        documentos = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks]
+        return documentos, indice
+
+    except Exception as e:
+        logger.warning(f"No se pudo leer el snapshot {directorio}: {e}")
+        return None
+
+
+def _podar_snapshots(conservar):
+    """
+    Elimina snapshots antiguos dejando solo los más recientes.
+    """
+    base = _directorio_base_snapshots()
+    try:
+        candidatos = [
+            os.path.join(base, nombre) for nombre in os.listdir(base)
+            if nombre.startswith("v") and ".tmp-" not in nombre
+        ]
+        candidatos.sort(key=os.path.getmtime, reverse=True)
+        for ruta in candidatos[SNAPSHOTS_A_CONSERVAR:]:
+            if ruta != conservar:
+                shutil.rmtree(ruta, ignore_errors=True)
+    except OSError as e:
+        logger.warning(f"No se pudieron podar snapshots antiguos: {e}")
+
+
+# --------- IDENTIFICADORES DE DOCUMENTOS ---------
+
+def obtener_doc_id(doc):
+    """
+    Identificador estable de un documento del corpus, usado por upsert/remove.
+    """
+    metadata = doc.metadata
+    source = metadata.get("source")
+
+    if source == "faq":
+        if metadata.get("firebase_id"):
+            return f"faq:{metadata['firebase_id']}"
+        return faq_csv_doc_id(str(metadata.get("pregunta_original", "")))
+    if source == "web":
+        return f"web:{metadata.get('url') or metadata.get('titulo', '')}"
+    if source == "pdf":
+        return f"pdf:{metadata.get('filename', '')}:{metadata.get('chunk_id', '')}"
+
+    return f"doc:{hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()[:16]}"
+
+
+def faq_csv_doc_id(pregunta):
+    pregunta = pregunta.strip().lower()
+    return f"faq_csv:{hashlib.sha256(pregunta.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _asignar_doc_ids(documentos):
+    """
+    Guarda el doc_id en la metadata de cada documento (desambiguando repetidos)
+    y devuelve el mapa doc_id -> posición en el índice.
+    """
+    ids = {}
+    for posicion, doc in enumerate(documentos):
+        doc_id = doc.metadata.get("doc_id") or obtener_doc_id(doc)
+        base, n = doc_id, 1
+        while doc_id in ids:
+            n += 1
+            doc_id = f"{base}#{n}"
+        doc.metadata["doc_id"] = doc_id
+        ids[doc_id] = posicion
+    return ids
+
+
+# --------- SIMILITUD ---------
+
+def normalizar_vectores(matriz):
+    """
+    Copia float32 con filas de norma 1: la distancia L2 del índice queda
+    ligada a la similitud coseno.
+    """
+    matriz = np.array(matriz, dtype="float32", ndmin=2)
+    faiss.normalize_L2(matriz)
+    return matriz
+
+
+def similitud_coseno(distancia_l2):
+    # Vectores unitarios: ||a - b||² = 2 - 2·cos(a, b)
+    return float(np.clip(1.0 - distancia_l2 / 2.0, -1.0, 1.0))
+
+
+# --------- ESTADO INMUTABLE DEL VECTOR STORE ---------
+
+class SnapshotVectorStore:
+    """
+    Estado del vector store en un instante: índice FAISS base, documentos e ids,
+    más las escrituras posteriores (DeltaVectores). Una vez publicado no se
+    modifica: upsert/remove publican un snapshot que comparte el índice base y
+    solo copia el delta, y cada VECTOR_STORE_DELTA_MAX escrituras el delta se
+    consolida en una copia nueva del índice base.
+    """
+
+    def __init__(self, documentos, indice, ids_documentos, modelo, clave, vectores_muertos=frozenset(),
+                 preguntas=None, delta=None, fuentes_faq=frozenset()):
+        self.documentos = documentos  # posición = id del vector; None si fue eliminado
+        self.indice = indice
+        self.ids_documentos = ids_documentos  # doc_id -> posición en el índice base
+        self.modelo = modelo  # nombre del modelo de embeddings
+        self.clave = clave  # modelo + backend, clave de caches y snapshots
+        self.vectores_muertos = frozenset(vectores_muertos)  # tombstones en índices sin eliminación (HNSW)
+        self.preguntas = preguntas  # IndicePreguntasFAQ para detección de duplicados
+        self.delta = delta if delta is not None else DeltaVectores()  # escrituras sin consolidar
+        self.fuentes_faq = frozenset(fuentes_faq)  # tipos de FAQ del corpus ('faq_csv' / 'faq_firebase')
+        self.creado = datetime.now()
+
+    def __len__(self):
+        return len(self.ids_documentos) - len(self.delta.retirados) + len(self.delta.agregados)
+
+    def contiene(self, doc_id):
+        if doc_id in self.delta.agregados:
+            return True
+        return doc_id in self.ids_documentos and doc_id not in self.delta.retirados
+
+    def buscar(self, query_embedding, top_k=3):
+        """
+        Returns:
+            lista de {'documento', 'score', 'rank'} con la similitud coseno como score
+        """
+        retirados = self.delta.retirados
+        config = configuracion_indice()
+        rerank = usa_rerank(config)
+        # Con re-rank se piden rerank_factor·top_k candidatos al índice comprimido
+        objetivo = top_k * int(config['rerank_factor']) if rerank else top_k
+        candidatos = []
+        # Vecinos extra para compensar tombstones y documentos reemplazados, acotados:
+        # solo si los descartados llenan la ventana se repite la búsqueda con k doble
+        descartables = min(len(self.vectores_muertos) + len(retirados), MAX_VECINOS_EXTRA)
+        k = min(objetivo + descartables, self.indice.ntotal)
+        while k > 0:
+            candidatos = []
+            distancias, indices = self.indice.search(query_embedding, k)
+            for distancia, i in zip(distancias[0], indices[0]):
+                if i < 0 or self.documentos[i] is None or self.documentos[i].metadata.get("doc_id") in retirados:
+                    continue
+                candidatos.append((similitud_coseno(distancia), self.documentos[i]))
+                if len(candidatos) == objetivo:
+                    break
+            if len(candidatos) == objetivo or k == self.indice.ntotal:
+                break
+            k = min(k * 2, self.indice.ntotal)
+        if rerank and candidatos:
+            candidatos = self._reordenar_exacto(query_embedding, candidatos)[:top_k]
+
+        candidatos.extend((score, doc) for _, doc, score in self.delta.buscar(query_embedding, top_k))
+        candidatos.sort(key=lambda candidato: candidato[0], reverse=True)
+        return [
+            {'documento': doc, 'score': score, 'rank': rank}
+            for rank, (score, doc) in enumerate(candidatos[:top_k], start=1)
+        ]
+
+    def _reordenar_exacto(self, query_embedding, candidatos):
+        """
+        Reemplaza el score aproximado (sq8/pq) por la similitud coseno exacta con
+        el embedding original, leído del memmap de la cache de embeddings.
+        Los candidatos que no están en la cache conservan su score aproximado.
+        """
+        cacheados = vectores_en_cache(self.clave, self.indice.d, [doc.page_content for _, doc in candidatos])
+        if cacheados is None:
+            return candidatos
+        vectores, encontrados = cacheados
+        exactos = normalizar_vectores(vectores) @ np.asarray(query_embedding, dtype="float32").reshape(-1)
+        reordenados = [
+            (float(exactos[i]) if encontrados[i] else score, doc)
+            for i, (score, doc) in enumerate(candidatos)
+        ]
+        reordenados.sort(key=lambda candidato: candidato[0], reverse=True)
+        return reordenados
+
+    def _con_delta(self, delta, preguntas):
+        snapshot = SnapshotVectorStore(
+            self.documentos, self.indice, self.ids_documentos, self.modelo, self.clave,
+            self.vectores_muertos, preguntas, delta, self.fuentes_faq
+        )
+        return snapshot.consolidar() if len(delta) >= maximo_delta() else snapshot
+
+    def consolidar(self):
+        """
+        Aplica el delta sobre una copia del índice base (una copia por lote de escrituras).
+        En índices que no admiten eliminación (HNSW) los vectores retirados quedan
+        como tombstones: el documento pasa a None y se filtra en la búsqueda.
+        """
+        if not len(self.delta):
+            return self
+        indice = faiss.clone_index(self.indice)
+        configurar_busqueda(indice)
+        documentos = list(self.documentos)
+        ids = dict(self.ids_documentos)
+        muertos = set(self.vectores_muertos)
+
+        posiciones = [ids.pop(doc_id) for doc_id in self.delta.retirados]
+        for posicion in posiciones:
+            documentos[posicion] = None
+        if posiciones:
+            if soporta_eliminacion(indice):
+                indice.remove_ids(np.array(posiciones, dtype="int64"))
+            else:
+                muertos.update(posiciones)
+
+        if self.delta.agregados:
+            inicio = len(documentos)
+            for doc_id, (doc, _) in self.delta.agregados.items():
+                ids[doc_id] = len(documentos)
+                documentos.append(doc)
+            indice.add_with_ids(self.delta.matriz(), np.arange(inicio, len(documentos), dtype="int64"))
+
+        return SnapshotVectorStore(
+            documentos, indice, ids, self.modelo, self.clave, muertos, self.preguntas, fuentes_faq=self.fuentes_faq
+        )
+
+    def _preguntas_sin(self, doc_id):
+        if self.preguntas is None or not self.preguntas.contiene(doc_id):
+            return self.preguntas
+        preguntas = self.preguntas.copiar()
+        preguntas.eliminar(doc_id)
+        return preguntas
+
+    def con_documento(self, doc_id, doc, vector, vector_pregunta=None):
+        """
+        Snapshot con el documento agregado o reemplazado.
+        vector_pregunta (FAQs) actualiza también el índice de preguntas.
+        """
+        delta = self.delta.con(doc_id, doc, vector, en_base=doc_id in self.ids_documentos)
+        preguntas = self._preguntas_sin(doc_id)
+        if vector_pregunta is not None and preguntas is not None:
+            if preguntas is self.preguntas:
+                preguntas = preguntas.copiar()
+            preguntas.agregar(doc_id, doc.metadata.get("pregunta_original", ""), vector_pregunta)
+        return self._con_delta(delta, preguntas)
+
+    def sin_documento(self, doc_id):
+        """
+        Snapshot sin el documento (ni su pregunta), o None si no existía.
+        """
+        if not self.contiene(doc_id):
+            if self.preguntas is None or not self.preguntas.contiene(doc_id):
+                return None
+            # Pregunta del CSV indexada solo para duplicados (el corpus usa Firebase)
+            return self._con_delta(self.delta, self._preguntas_sin(doc_id))
+        delta = self.delta.sin(doc_id, en_base=doc_id in self.ids_documentos)
+        return self._con_delta(delta, self._preguntas_sin(doc_id))
+
+    def con_pregunta(self, doc_id, pregunta, vector_pregunta):
+        """
+        Snapshot con la pregunta en el índice de preguntas, sin tocar el corpus.
+        """
+        if self.preguntas is None:
+            return self
+        preguntas = self.preguntas.copiar()
+        preguntas.agregar(doc_id, pregunta, vector_pregunta)
+        return self._con_delta(self.delta, preguntas)
+
+    def estado(self):
+        return {
+            "documentos": len(self),
+            "vectores": self.indice.ntotal,
+            "tombstones": len(self.vectores_muertos),
+            "escrituras_sin_consolidar": len(self.delta),
+            "preguntas_faq": len(self.preguntas) if self.preguntas is not None else 0,
+            "modelo": self.clave,
+            "creado": self.creado.isoformat()
+        }
+
+
+# --------- INICIALIZACIÓN ---------
+
+def _crear_indice(matriz, ids=None):
+    # IDMap2 permite agregar/eliminar vectores por id sin reconstruir el índice
+    return construir_indice(matriz, ids, metrica='l2', config=configuracion_indice())
+
+
+def _crear_indice_por_ventanas(textos, clave, embedding_model):
+    """
+    Codifica el corpus en ventanas de VECTOR_STORE_ENCODE_WINDOW textos y agrega
+    cada ventana al índice antes de codificar la siguiente: la matriz float32 de
+    embeddings temporal es de una ventana y no del corpus. Los textos sí están
+    todos en memoria (los documentos forman el docstore del snapshot). Los
+    índices que requieren entrenamiento (IVF, PQ) se entrenan con todos los
+    vectores, así que en ese caso se materializa la matriz completa.
+    """
+    ventana = max(1, getattr(settings, 'VECTOR_STORE_ENCODE_WINDOW', 512))
+    config = configuracion_indice()
+    base = crear_indice(embedding_model.get_sentence_embedding_dimension(), len(textos), 'l2', config)
+
+    if len(textos) <= ventana or not base.is_trained:
+        embeddings = codificar_con_cache(clave, embedding_model, textos)
+        return _crear_indice(normalizar_vectores(embeddings))
+
+    indice = faiss.IndexIDMap2(base)
+    for inicio in range(0, len(textos), ventana):
+        lote = normalizar_vectores(codificar_con_cache(clave, embedding_model, textos[inicio:inicio + ventana]))
+        indice.add_with_ids(lote, np.arange(inicio, inicio + len(lote), dtype="int64"))
+    configurar_busqueda(indice, config)
+    return indice
+
+
+def _fuentes_faq(documentos):
+    return frozenset(doc.metadata.get("tipo") for doc in documentos
+                     if doc is not None and doc.metadata.get("source") == "faq")
+
+
+def _construir_indice_preguntas(documentos, clave, embedding_model):
+    """
+    Índice de preguntas de FAQ (para duplicados) con las FAQs del corpus y, si el
+    corpus las cargó desde Firebase, también las de basecsvf.csv: los endpoints
+    del CSV comprueban duplicados contra ese archivo.
+    """
+    faqs = [doc for doc in documentos if doc is not None and doc.metadata.get("source") == "faq"
+            and doc.metadata.get("pregunta_original")]
+    if "faq_csv" not in _fuentes_faq(documentos):
+        vistos = {doc.metadata["doc_id"] for doc in faqs}
+        for doc in cargar_faqs_desde_csv():
+            doc_id = obtener_doc_id(doc)
+            if doc_id not in vistos:
+                vistos.add(doc_id)
+                doc.metadata["doc_id"] = doc_id
+                faqs.append(doc)
+    dimension = embedding_model.get_sentence_embedding_dimension()
+    if not faqs:
+        return IndicePreguntasFAQ(dimension)
+    preguntas = [str(doc.metadata["pregunta_original"]) for doc in faqs]
+    matriz = normalizar_vectores(codificar_con_cache(clave, embedding_model, preguntas))
+    # Fuentes cargadas completas: solo contra ellas el índice sustituye al recorrido del CSV
+    fuentes = {doc.metadata.get("tipo") for doc in faqs}
+    return IndicePreguntasFAQ.construir(
+        dimension, [doc.metadata["doc_id"] for doc in faqs], preguntas, matriz, fuentes=fuentes
+    )
+
+
+def _construir_snapshot():
+    """
+    Carga el corpus y construye el estado completo del vector store.
+    Reutiliza el snapshot en disco si el modelo y el corpus no cambiaron.
+    """
+    modelo = nombre_modelo('vector_store')
+    documentos = cargar_documentos()
+    embedding_model = obtener_modelo(modelo)
+    clave = clave_modelo(modelo)
+    ids = _asignar_doc_ids(documentos)
+    hash_corpus = calcular_hash_corpus(documentos, clave, describir_configuracion(configuracion_indice()))
+
+    snapshot = cargar_snapshot(hash_corpus, clave)
+    if snapshot is not None:
+        documentos, indice = snapshot
+        configurar_busqueda(indice)
+        ids = _asignar_doc_ids(documentos)
+        preguntas = _construir_indice_preguntas(documentos, clave, embedding_model)
+        print(f"Vector store cargado desde snapshot con {len(documentos)} documentos")
+        return SnapshotVectorStore(
+            documentos, indice, ids, modelo, clave, preguntas=preguntas, fuentes_faq=_fuentes_faq(documentos)
+        )
+
+    # Sin matriz float32 del corpus completo: el índice (posiblemente comprimido)
+    # es la única copia residente de los vectores
+    indice = _crear_indice_por_ventanas([doc.page_content for doc in documentos], clave, embedding_model)
+
+    try:
+        guardar_snapshot(documentos, indice, hash_corpus, clave)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el snapshot del vector store: {e}")
+
+    preguntas = _construir_indice_preguntas(documentos, clave, embedding_model)
+    print(f"Vector store inicializado con {len(documentos)} documentos")
+    return SnapshotVectorStore(
+        documentos, indice, ids, modelo, clave, preguntas=preguntas, fuentes_faq=_fuentes_faq(documentos)
+    )
+
+
+def _snapshot_vacio():
+    # Estructuras vacías para evitar errores en las búsquedas
+    modelo = nombre_modelo('vector_store')
+    dimension = obtener_modelo(modelo).get_sentence_embedding_dimension()
+    indice = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    return SnapshotVectorStore([], indice, {}, modelo, clave_modelo(modelo), preguntas=IndicePreguntasFAQ(dimension))
+
+
+def _publicar(snapshot):
+    global _snapshot_actual
+    _snapshot_actual = snapshot
+
+
+def obtener_snapshot():
+    """
+    Snapshot publicado actualmente (None si el vector store no se inicializó).
+    """
+    return _snapshot_actual
 
-# Global variables that will be initialized lazily
-all_documents = None
-embedding_model = None
-index = None
-embedding_matrix = None
 
 def inicializar_vector_store():
     """
     Inicializa el vector store de manera lazy.
-    Solo se ejecuta cuando se necesita buscar documentos.
+    Si varias peticiones llegan a la vez, solo una construye el índice y
+    las demás esperan su resultado.
     """
-    global all_documents, embedding_model, index, embedding_matrix
-    
-    if all_documents is None:
+    if _snapshot_actual is not None:
+        return _snapshot_actual
+
+    with _lock_inicializacion:
+        if _snapshot_actual is None:
+            try:
+                _publicar(_construir_snapshot())
+            except Exception as e:
+                print(f"Error al inicializar vector store: {e}")
+                _publicar(_snapshot_vacio())
+    return _snapshot_actual
+
+
+def _reemplazar_snapshot(construir, accion, en_segundo_plano):
+    """
+    Construye un snapshot nuevo fuera del lock de escritura y lo publica con un
+    cambio de referencia. Las búsquedas en curso siguen usando el anterior; las
+    escrituras recibidas mientras tanto se aplican al nuevo antes de publicarlo.
+
+    Args:
+        construir: recibe el snapshot publicado al empezar y devuelve el nuevo
+        accion: participio para los logs ('reconstruido', 'compactado')
+
+    Returns:
+        bool: False si ya había una reconstrucción en curso
+    """
+    global _operaciones_pendientes
+
+    if not _lock_reconstruccion.acquire(blocking=False):
+        logger.info("Vector store: ya hay una reconstrucción en curso")
+        return False
+
+    with _lock_escritura:
+        _operaciones_pendientes = []
+        base = _snapshot_actual
+
+    def tarea():
+        global _operaciones_pendientes
+        inicio = datetime.now()
         try:
-            # Use token from environment variable if available
-            if settings.HUGGINGFACE_TOKEN:
-                login(settings.HUGGINGFACE_TOKEN)
-            all_documents = cargar_documentos()
-            embedding_model = SentenceTransformer("multi-qa-MiniLM-L6-cos-v1")
-            
-            texts = [doc.page_content for doc in all_documents]
-            embeddings = embedding_model.encode(texts, convert_to_numpy=True)
-            embedding_matrix = np.array(embeddings).astype("float32")
-            
-            index = faiss.IndexFlatL2(embedding_matrix.shape[1])
-            index.add(embedding_matrix)
-            
-            print(f"Vector store inicializado con {len(all_documents)} documentos")
+            nuevo = construir(base)
+            with _lock_escritura:
+                for operacion in _operaciones_pendientes:
+                    nuevo = operacion(nuevo) or nuevo
+                _publicar(nuevo)
+                pendientes = len(_operaciones_pendientes)
+            logger.info(
+                f"Vector store {accion} en {(datetime.now() - inicio).total_seconds():.1f}s "
+                f"({len(nuevo)} documentos, {pendientes} escrituras reaplicadas)"
+            )
         except Exception as e:
-            print(f"Error al inicializar vector store: {e}")
-            # Crear estructuras vacías para evitar errores
-            all_documents = []
-            embedding_model = SentenceTransformer("multi-qa-MiniLM-L6-cos-v1")
-            embedding_matrix = np.array([[0.0] * 384]).astype("float32")  # Dimensión por defecto del modelo
-            index = faiss.IndexFlatL2(384)
+            logger.error(f"Error: vector store no {accion}, se mantiene el índice anterior: {e}")
+        finally:
+            with _lock_escritura:
+                _operaciones_pendientes = None
+            _lock_reconstruccion.release()
+
+    if en_segundo_plano:
+        threading.Thread(target=tarea, name="reconstruccion-vector-store", daemon=True).start()
+    else:
+        tarea()
+    return True
+
+
+def reconstruir_vector_store(en_segundo_plano=True):
+    """
+    Reconstruye el índice desde las fuentes y lo publica con un cambio de referencia.
+
+    Returns:
+        bool: False si ya había una reconstrucción en curso
+    """
+    return _reemplazar_snapshot(lambda _: _construir_snapshot(), "reconstruido", en_segundo_plano)
+
+
+def _compactar_snapshot(snapshot):
+    """
+    Índice nuevo solo con los documentos vivos del snapshot: sin tombstones ni
+    delta. No vuelve a leer las fuentes y los embeddings salen de la cache.
+    """
+    retirados = snapshot.delta.retirados
+    documentos = [doc for doc in snapshot.documentos
+                  if doc is not None and doc.metadata.get("doc_id") not in retirados]
+    documentos.extend(doc for doc, _ in snapshot.delta.agregados.values())
+    indice = _crear_indice_por_ventanas(
+        [doc.page_content for doc in documentos], snapshot.clave, obtener_modelo(snapshot.modelo)
+    )
+    return SnapshotVectorStore(
+        documentos, indice, _asignar_doc_ids(documentos), snapshot.modelo, snapshot.clave,
+        preguntas=snapshot.preguntas, fuentes_faq=snapshot.fuentes_faq
+    )
+
+
+def compactar_vector_store(en_segundo_plano=True):
+    """
+    Descarta los tombstones reconstruyendo el índice con los documentos actuales.
+
+    Returns:
+        bool: False si el vector store no está cargado o ya hay una reconstrucción en curso
+    """
+    if _snapshot_actual is None:
+        return False
+    return _reemplazar_snapshot(_compactar_snapshot, "compactado", en_segundo_plano)
+
+
+def _compactar_si_necesario(snapshot):
+    # Los índices sin eliminación (HNSW) acumulan tombstones en cada consolidación
+    proporcion = getattr(settings, 'VECTOR_STORE_COMPACTION_RATIO', 0.2)
+    if snapshot.vectores_muertos and len(snapshot.vectores_muertos) > proporcion * snapshot.indice.ntotal:
+        compactar_vector_store(en_segundo_plano=True)
+
+
+def estado_vector_store():
+    snapshot = _snapshot_actual
+    estado = snapshot.estado() if snapshot is not None else {"documentos": 0, "inicializado": False}
+    estado["reconstruyendo"] = _lock_reconstruccion.locked()
+    estado["deduplicacion"] = dict(ultimo_reporte)
+    return estado
+
+
+# --------- ACTUALIZACIÓN INCREMENTAL ---------
+
+def _aplicar_escritura(operacion):
+    """
+    Aplica una escritura (snapshot -> snapshot, o None si no cambia nada) al
+    snapshot publicado y la registra para reaplicarla si hay una reconstrucción
+    en curso (aunque aquí no cambie nada: el snapshot nuevo sí puede tener el documento).
+
+    Returns:
+        el snapshot publicado, o None si la operación no cambió nada
+    """
+    with _lock_escritura:
+        if _operaciones_pendientes is not None:
+            _operaciones_pendientes.append(operacion)
+        nuevo = operacion(_snapshot_actual)
+        if nuevo is None:
+            return None
+        _publicar(nuevo)
+    _compactar_si_necesario(nuevo)
+    return nuevo
+
+
+def upsert(doc_id, text, metadata=None):
+    """
+    Agrega o reemplaza un documento sin reconstruir el índice: se publica un
+    snapshot con el cambio en su delta. Si el vector store aún no se inicializó
+    no hace nada: la carga inicial ya incluirá el documento.
+
+    Returns:
+        bool: True si el índice quedó actualizado
+    """
+    snapshot = _snapshot_actual
+    if snapshot is None:
+        return False
+
+    try:
+        doc = Document(page_content=text, metadata={**(metadata or {}), "doc_id": doc_id})
+        textos = [text]
+        pregunta = doc.metadata.get("pregunta_original") if doc.metadata.get("source") == "faq" else None
+        if pregunta:
+            textos.append(str(pregunta))
+        vectores = normalizar_vectores(codificar_con_cache(snapshot.clave, obtener_modelo(snapshot.modelo), textos))
+        vector, vector_pregunta = vectores[:1], (vectores[1] if pregunta else None)
+
+        existia = _snapshot_actual.contiene(doc_id)
+        _aplicar_escritura(lambda actual: actual.con_documento(doc_id, doc, vector, vector_pregunta))
+
+        logger.info(f"Vector store: documento {doc_id} {'actualizado' if existia else 'agregado'}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error actualizando vector store ({doc_id}): {e}")
+        return False
+
+
+def remove(doc_id):
+    """
+    Elimina un documento publicando un snapshot sin él.
+
+    Returns:
+        bool: True si el documento existía y fue eliminado
+    """
+    if _snapshot_actual is None:
+        return False
+
+    if _aplicar_escritura(lambda actual: actual.sin_documento(doc_id)) is None:
+        return False
+
+    logger.info(f"Vector store: documento {doc_id} eliminado")
+    return True
+
+
+def upsert_faq_csv(pregunta, respuesta, categoria=""):
+    """
+    Indexa una FAQ recién escrita en el CSV. Si el corpus cargó las FAQs desde
+    Firebase el CSV no forma parte de él: solo se actualiza el índice de
+    preguntas (duplicados), en lugar de agregar un documento que la próxima
+    reconstrucción haría desaparecer.
+    """
+    snapshot = _snapshot_actual
+    if snapshot is not None and "faq_csv" not in snapshot.fuentes_faq:
+        return _upsert_pregunta(faq_csv_doc_id(pregunta), pregunta)
+    doc = crear_documento_faq(pregunta, respuesta, tipo="faq_csv", categoria=categoria)
+    return upsert(faq_csv_doc_id(pregunta), doc.page_content, doc.metadata)
+
+
+def _upsert_pregunta(doc_id, pregunta):
+    snapshot = _snapshot_actual
+    try:
+        vector = normalizar_vectores(
+            codificar_con_cache(snapshot.clave, obtener_modelo(snapshot.modelo), [str(pregunta)])
+        )[0]
+        _aplicar_escritura(lambda actual: actual.con_pregunta(doc_id, pregunta, vector))
+        logger.info(f"Vector store: pregunta {doc_id} indexada para duplicados")
+        return True
+    except Exception as e:
+        logger.error(f"Error actualizando el índice de preguntas ({doc_id}): {e}")
+        return False
+
+
+def upsert_faq_firebase(document_id, pregunta, respuesta, categoria=""):
+    """
+    Indexa una FAQ recién escrita en Firestore.
+    """
+    doc = crear_documento_faq(
+        pregunta, respuesta, tipo="faq_firebase", categoria=categoria, firebase_id=document_id, activo=True
+    )
+    return upsert(f"faq:{document_id}", doc.page_content, doc.metadata)
+
+
+def codificar_pregunta(snapshot, pregunta):
+    """
+    Embedding normalizado de una pregunta con el modelo del snapshot.
+    """
+    return normalizar_vectores(codificar_consulta(snapshot.modelo, pregunta))
 
 
 # Búsqueda semántica
 def buscar_documentos(query, top_k=3):
+    """
+    Returns:
+        lista de {'documento': Document, 'score': similitud coseno, 'rank': posición}
+    """
     # Inicializar el vector store si no está inicializado
-    inicializar_vector_store()
-    
-    if not all_documents:
+    snapshot = inicializar_vector_store()
+
+    if not len(snapshot):
         return []
-    
-    query_embedding = embedding_model.encode([query]).astype("float32")
-    _, indices = index.search(query_embedding, top_k)
-    resultados = [all_documents[i] for i in indices[0]]
-    return resultados
+
+    query_embedding = codificar_pregunta(snapshot, query)
+    return snapshot.buscar(query_embedding, top_k)
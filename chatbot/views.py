@@ -11,11 +11,12 @@ import re
 import requests
 import ollama
 
-from .vector_store import buscar_documentos
+from .vector_store import buscar_documentos, upsert_faq_csv, remove, faq_csv_doc_id
 from .serializers import FAQEntrySerializer, ChatbotQuerySerializer
 from .authentication import FAQTokenAuthentication, PublicAuthentication
 from .document_loader import agregar_faq_entry, validar_faq_duplicado, obtener_estadisticas_faq
 from .firebase_embeddings import firebase_embeddings
+from .reranker import obtener_reordenador
 
 import logging
 
@@ -253,21 +254,21 @@ def validar_relevancia_respuesta(pregunta, respuesta, documentos):
     """
     Valida si la respuesta generada es relevante para el contexto DCCO/ESPE.
     Retorna True si la relevancia es suficiente, False si debe rechazarse.
+    `documentos` son los resultados de buscar_documentos (con score coseno).
     """
     # Calcular relevancia promedio de los documentos encontrados
     relevancia_promedio = 0
     documentos_validos = 0
-    for doc in documentos:
+    for resultado in documentos:
         # Solo considerar documentos relevantes
-        if doc.metadata.get("source") in ["faq", "web", "pdf"]:
-            score = similitud_texto(pregunta, doc.page_content[:200])
-            relevancia_promedio += score
+        if resultado['documento'].metadata.get("source") in ["faq", "web", "pdf"]:
+            relevancia_promedio += resultado['score']
             documentos_validos += 1
     if documentos_validos == 0:
         return False
     relevancia_promedio /= documentos_validos
     # UMBRAL ESTRICTO: Solo permitir preguntas con alta relevancia
-    umbral_estricto = 0.25  # Mucho más alto para evitar falsos positivos
+    umbral_estricto = getattr(settings, 'VECTOR_RELEVANCE_THRESHOLD', 0.3)
     if relevancia_promedio < umbral_estricto:
         return False
     # Si la respuesta está vacía (llamada previa), verificar palabras clave en la pregunta
@@ -613,19 +614,24 @@ class ChatbotAPIView(APIView):
             logger.info("No se encontró respuesta en Firebase RAG, usando sistema de respaldo...")
 
             # 4. Si no hay resultados en Firebase, usar búsqueda semántica tradicional
-            documentos = buscar_documentos(pregunta, top_k=5)
+            reordenador = obtener_reordenador()
+            top_k = max(5, getattr(settings, 'RERANKER_TOP_N', 10)) if reordenador else 5
+            documentos_candidatos = buscar_documentos(pregunta, top_k=top_k)
+            documentos = documentos_candidatos[:5]
             logger.info(f"[DEPURACIÓN] Documentos devueltos por buscar_documentos para la pregunta: '{pregunta}'")
-            for idx, doc in enumerate(documentos):
-                logger.info(f"[DEPURACIÓN] Documento #{idx+1}: source={doc.metadata.get('source')}, filename={doc.metadata.get('filename', '')}, chunk_id={doc.metadata.get('chunk_id', '')}, preview='{doc.page_content[:100].replace(chr(10),' ')}'")
+            for resultado in documentos:
+                doc = resultado['documento']
+                logger.info(f"[DEPURACIÓN] Documento #{resultado['rank']}: source={doc.metadata.get('source')}, filename={doc.metadata.get('filename', '')}, chunk_id={doc.metadata.get('chunk_id', '')}, score={resultado['score']:.3f}, preview='{doc.page_content[:100].replace(chr(10),' ')}'")
 
             # 5. Buscar coincidencia exacta en FAQs del vector store (fallback)
+            #    Los scores son similitud coseno del índice; los resultados ya vienen ordenados
             mejor_faq_doc = None
             mejor_faq_score = 0
-            for doc in documentos:
+            for resultado in documentos:
+                doc, score = resultado['documento'], resultado['score']
                 if doc.metadata.get("source") == "faq":
-                    score = similitud_texto(pregunta, doc.metadata.get("pregunta_original", ""))
                     logger.info(f"[DEPURACIÓN] FAQ: score={score:.3f}, pregunta_original='{doc.metadata.get('pregunta_original','')[:80]}'")
-                    if score >= 0.75:
+                    if score >= getattr(settings, 'VECTOR_FAQ_DIRECT_THRESHOLD', 0.75):
                         respuesta_base = doc.metadata["respuesta_original"]
                         prompt = (
                             "Eres un asistente de la ESPE. Reformula ÚNICAMENTE el estilo manteniendo EXACTAMENTE la misma información.\n"
@@ -657,15 +663,21 @@ class ChatbotAPIView(APIView):
             # 6. Buscar mejor contenido en web/pdf
             mejor_doc = None
             mejor_score = 0
-            for doc in documentos:
-                if doc.metadata.get("source") != "faq":
-                    score = similitud_texto(pregunta, doc.page_content[:200])
-                    logger.info(f"[DEPURACIÓN] Documento no-FAQ: source={doc.metadata.get('source')}, filename={doc.metadata.get('filename','')}, score={score:.3f}, preview='{doc.page_content[:80].replace(chr(10),' ')}'")
-                    if score > mejor_score:
-                        mejor_doc = doc
-                        mejor_score = score
-
-            if mejor_doc and mejor_score >= 0.3:
+            umbral_contenido = getattr(settings, 'VECTOR_CONTENT_THRESHOLD', 0.4)
+            candidatos = [r for r in documentos_candidatos if r['documento'].metadata.get("source") != "faq"]
+            scores_rerank = None
+            if reordenador and candidatos:
+                # Re-rank con cross-encoder; si se agota el presupuesto, scores_rerank es None
+                candidatos, scores_rerank = reordenador.reordenar(pregunta, candidatos)
+            if scores_rerank:
+                mejor_doc, mejor_score = candidatos[0]['documento'], scores_rerank[0]
+                umbral_contenido = getattr(settings, 'RERANKER_MIN_SCORE', 0.3)
+                logger.info(f"[DEPURACIÓN] Re-rank cross-encoder: scores={[round(s, 3) for s in scores_rerank]}")
+            elif candidatos:
+                # Orden de la primera etapa: el primero es el de mayor similitud coseno
+                mejor_doc, mejor_score = candidatos[0]['documento'], candidatos[0]['score']
+
+            if mejor_doc and mejor_score >= umbral_contenido:
                 contexto = mejor_doc.page_content[:800]
                 logger.info(f"[DEPURACIÓN] Mejor documento no-FAQ seleccionado: source={mejor_doc.metadata.get('source')}, filename={mejor_doc.metadata.get('filename','')}, score={mejor_score:.3f}")
                 
@@ -688,7 +700,7 @@ class ChatbotAPIView(APIView):
                 }, status=200)
 
             # 7. Si no hay buen contenido web/pdf, usar el mejor FAQ si es suficientemente bueno
-            if mejor_faq_doc and mejor_faq_score >= 0.6:
+            if mejor_faq_doc and mejor_faq_score >= getattr(settings, 'VECTOR_FAQ_FALLBACK_THRESHOLD', 0.6):
                 respuesta_base = mejor_faq_doc.metadata["respuesta_original"]
                 prompt = (
                     "Eres un asistente de la ESPE. Reformula ÚNICAMENTE el estilo manteniendo EXACTAMENTE la misma información.\n"
@@ -725,7 +737,7 @@ class ChatbotAPIView(APIView):
                 }, status=200)
 
             # 9. Último recurso mejorado: LLM inteligente para preguntas académicas válidas
-            contexto_general = "\n\n".join([doc.page_content[:400] for doc in documentos])
+            contexto_general = "\n\n".join([r['documento'].page_content[:400] for r in documentos])
             logger.info(f"[DEPURACIÓN] Enviando contexto general al LLM. Longitud total: {len(contexto_general)}")
             
             # Prompt mejorado que incluye conocimiento general del DCCO/ESPE
@@ -769,7 +781,7 @@ RESPUESTA (específica y útil):"""
             respuesta_fallback = consultar_llm_inteligente(prompt_inteligente)
             if respuesta_fallback is None:
                 if documentos:
-                    primer_doc = documentos[0]
+                    primer_doc = documentos[0]['documento']
                     if primer_doc.metadata.get("source") == "faq":
                         respuesta_fallback = primer_doc.metadata.get("respuesta_original", "")
                     else:
@@ -810,13 +822,13 @@ RESPUESTA (específica y útil):"""
         Busca en Firebase con algoritmo inteligente y robusto de matching semántico
         """
         try:
-            from .firebase_service import FirebaseService
+            from .firebase_service import FirebaseService, CAMPOS_FAQ_TEXTO
             firebase_service = FirebaseService()
             
             pregunta_lower = pregunta.lower().strip()
             
             # Obtener todas las FAQs de Firebase
-            faqs = firebase_service.get_all_faqs()
+            faqs = firebase_service.get_all_faqs(campos=CAMPOS_FAQ_TEXTO)
             
             mejor_resultado = None
             mejor_score = 0
@@ -936,6 +948,7 @@ class KnowledgeBaseAPIView(APIView):
         }
         rows.append(new_row)
         self._write_rows(rows)
+        upsert_faq_csv(pregunta, respuesta, categoria)
         return Response(new_row, status=201)
 
     # ---------- PUT update ----------
@@ -946,6 +959,7 @@ class KnowledgeBaseAPIView(APIView):
 
         for row in rows:
             if row["id"] == str(entry_id):
+                pregunta_anterior = row["Pregunta"]
                 row["Pregunta"] = request.data.get("pregunta", row["Pregunta"]).strip()
                 row["Respuesta"] = request.data.get("respuesta", row["Respuesta"]).strip()
                 row["Categoría"] = request.data.get("categoria", row["Categoría"]).strip()
@@ -957,6 +971,9 @@ class KnowledgeBaseAPIView(APIView):
             raise Http404("Entrada no encontrada")
 
         self._write_rows(rows)
+        if faq_csv_doc_id(pregunta_anterior) != faq_csv_doc_id(row["Pregunta"]):
+            remove(faq_csv_doc_id(pregunta_anterior))
+        upsert_faq_csv(row["Pregunta"], row["Respuesta"], row["Categoría"])
         return Response(row)                       # la fila actualizada
 
     # ---------- DELETE ----------
@@ -968,6 +985,9 @@ class KnowledgeBaseAPIView(APIView):
             raise Http404("Entrada no encontrada")
 
         self._write_rows(new_rows)
+        for r in rows:
+            if r["id"] == str(entry_id):
+                remove(faq_csv_doc_id(r["Pregunta"]))
         return Response({"message": "Entrada eliminada"})
 
 class FAQManagementAPIView(APIView):
@@ -1058,8 +1078,13 @@ class FAQDuplicateCheckAPIView(APIView):
         Body JSON:
         {
             "pregunta": "¿Cuál es el horario?",
-            "umbral_similitud": 0.8  # opcional, por defecto 0.8
+            "umbral_similitud": 0.8,  # opcional, similitud léxica del recorrido del CSV
+            "umbral_coseno": 0.8      # opcional, similitud coseno del índice de preguntas
+                                      # (por defecto FAQ_DUPLICATE_COSINE_THRESHOLD)
         }
+        
+        El índice de preguntas solo se usa si el vector store se cargó con las
+        FAQs del CSV; si no, se recorre basecsvf.csv con umbral_similitud.
         """
         pregunta = request.data.get('pregunta')
         if not pregunta:
@@ -1078,11 +1103,24 @@ class FAQDuplicateCheckAPIView(APIView):
                 'error': 'umbral_similitud debe ser un número entre 0 y 1'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        resultado = validar_faq_duplicado(pregunta, umbral)
+        umbral_coseno = request.data.get('umbral_coseno')
+        if umbral_coseno is not None:
+            try:
+                umbral_coseno = float(umbral_coseno)
+                if not 0 <= umbral_coseno <= 1:
+                    raise ValueError()
+            except (ValueError, TypeError):
+                return Response({
+                    'error': 'umbral_coseno debe ser un número entre 0 y 1'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        resultado = validar_faq_duplicado(pregunta, umbral, umbral_coseno)
         
         return Response({
             'pregunta_consultada': pregunta,
             'umbral_usado': umbral,
+            'umbral_coseno_usado': resultado.get('umbral_coseno'),
+            'metodo': resultado.get('metodo'),
             'es_duplicado': resultado['es_duplicado'],
             'pregunta_similar': resultado['pregunta_similar'],
             'similitud': resultado['similitud'],
@@ -1107,13 +1145,10 @@ class ChatbotTestContextAPIView(APIView):
         # Obtener documentos relevantes
         documentos = buscar_documentos(pregunta, top_k=3)
         
-        # Calcular relevancia promedio
+        # Relevancia promedio (similitud coseno del índice)
         relevancia_promedio = 0
         if documentos:
-            for doc in documentos:
-                score = similitud_texto(pregunta, doc.page_content[:200])
-                relevancia_promedio += score
-            relevancia_promedio /= len(documentos)
+            relevancia_promedio = sum(r['score'] for r in documentos) / len(documentos)
         
         return Response({
             "pregunta": pregunta,
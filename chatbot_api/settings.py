@@ -195,3 +195,127 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', '')
 # Chatbot Configuration
 CHATBOT_PRELOAD_ON_STARTUP = os.getenv('CHATBOT_PRELOAD_ON_STARTUP', 'True').lower() == 'true'
 
+
+# Vector store Configuration
+# Directorio donde se guardan los snapshots del índice FAISS (índice + chunks + manifest)
+VECTOR_STORE_DIR = os.getenv('VECTOR_STORE_DIR', str(BASE_DIR / 'media' / 'index'))
+
+# Cache persistente de embeddings por (modelo, sha256 del texto)
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', str(BASE_DIR / 'media' / 'cache' / 'embeddings'))
+
+# Ingesta de PDFs: chunks cacheados por (ruta, tamaño, mtime, sha256); los PDFs nuevos
+# o modificados se procesan en un pool de procesos (0 = un proceso por núcleo)
+PDF_INGESTION_CACHE_ENABLED = os.getenv('PDF_INGESTION_CACHE_ENABLED', 'True').lower() == 'true'
+PDF_INGESTION_CACHE_DIR = os.getenv('PDF_INGESTION_CACHE_DIR', str(BASE_DIR / 'media' / 'cache' / 'pdf'))
+PDF_INGESTION_WORKERS = int(os.getenv('PDF_INGESTION_WORKERS', '0'))
+# Textos por ventana al codificar el corpus: acota la matriz de embeddings temporal de la construcción del índice
+VECTOR_STORE_ENCODE_WINDOW = int(os.getenv('VECTOR_STORE_ENCODE_WINDOW', '512'))
+# Altas/bajas incrementales acumuladas sobre el índice compartido antes de consolidarlas
+# en una copia nueva (una copia del índice por lote de escrituras y no por escritura)
+VECTOR_STORE_DELTA_MAX = int(os.getenv('VECTOR_STORE_DELTA_MAX', '256'))
+# Con índices sin eliminación (HNSW) el vector store se compacta en segundo plano
+# cuando los tombstones superan esta fracción de los vectores
+VECTOR_STORE_COMPACTION_RATIO = float(os.getenv('VECTOR_STORE_COMPACTION_RATIO', '0.2'))
+
+# Las fuentes del corpus (FAQs, web, PDFs) se cargan en paralelo; timeout en segundos por fuente.
+# Si Firestore no responde a tiempo las FAQs se cargan desde el CSV.
+CORPUS_SOURCE_TIMEOUT_FAQ = float(os.getenv('CORPUS_SOURCE_TIMEOUT_FAQ', '30'))
+CORPUS_SOURCE_TIMEOUT_WEB = float(os.getenv('CORPUS_SOURCE_TIMEOUT_WEB', '60'))
+CORPUS_SOURCE_TIMEOUT_PDF = float(os.getenv('CORPUS_SOURCE_TIMEOUT_PDF', '600'))
+
+# Limpieza del contenido web: se descartan las líneas (menús, pies de página) que se
+# repiten en al menos esta fracción de las páginas y en no menos de MIN_PAGES páginas
+WEB_BOILERPLATE_MIN_RATIO = float(os.getenv('WEB_BOILERPLATE_MIN_RATIO', '0.3'))
+WEB_BOILERPLATE_MIN_PAGES = int(os.getenv('WEB_BOILERPLATE_MIN_PAGES', '3'))
+
+# Eliminación de chunks casi duplicados (MinHash + LSH) antes de codificar el corpus
+CORPUS_DEDUP_ENABLED = os.getenv('CORPUS_DEDUP_ENABLED', 'True').lower() == 'true'
+CORPUS_DEDUP_THRESHOLD = float(os.getenv('CORPUS_DEDUP_THRESHOLD', '0.85'))
+CORPUS_DEDUP_NUM_PERM = int(os.getenv('CORPUS_DEDUP_NUM_PERM', '128'))
+
+# Modelos de embeddings (se cargan una sola vez por proceso, ver chatbot/embedding_models.py)
+EMBEDDING_MODEL_VECTOR_STORE = os.getenv('EMBEDDING_MODEL_VECTOR_STORE', 'multi-qa-MiniLM-L6-cos-v1')
+EMBEDDING_MODEL_FAQ = os.getenv('EMBEDDING_MODEL_FAQ', 'sentence-transformers/all-MiniLM-L6-v2')
+# Si se define, ambos índices usan este modelo. Los embeddings de FAQ guardados en
+# Firestore con otro modelo se regeneran con migrar_faqs_con_embeddings.
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', '')
+
+# Tipo de índice vectorial: flat (exacto), hnsw o ivf (aproximados).
+# Comparar recall/latencia con: python manage.py evaluar_indices
+VECTOR_INDEX_MODE = os.getenv('VECTOR_INDEX_MODE', 'flat')
+VECTOR_INDEX_HNSW_M = int(os.getenv('VECTOR_INDEX_HNSW_M', '32'))
+VECTOR_INDEX_EF_CONSTRUCTION = int(os.getenv('VECTOR_INDEX_EF_CONSTRUCTION', '80'))
+VECTOR_INDEX_EF_SEARCH = int(os.getenv('VECTOR_INDEX_EF_SEARCH', '64'))
+VECTOR_INDEX_IVF_NLIST = int(os.getenv('VECTOR_INDEX_IVF_NLIST', '0'))  # 0 = automático (4·√n)
+VECTOR_INDEX_NPROBE = int(os.getenv('VECTOR_INDEX_NPROBE', '8'))
+
+# Compresión de vectores del índice de chunks: none, fp16, sq8 (int8) o pq.
+# Con sq8/pq y VECTOR_INDEX_RERANK los candidatos se reordenan con los embeddings exactos
+# leídos (memmap) de la cache de embeddings: el índice en memoria solo guarda los códigos.
+VECTOR_INDEX_COMPRESSION = os.getenv('VECTOR_INDEX_COMPRESSION', 'none')
+VECTOR_INDEX_PQ_M = int(os.getenv('VECTOR_INDEX_PQ_M', '48'))
+VECTOR_INDEX_RERANK = os.getenv('VECTOR_INDEX_RERANK', 'False').lower() == 'true'
+VECTOR_INDEX_RERANK_FACTOR = int(os.getenv('VECTOR_INDEX_RERANK_FACTOR', '4'))
+
+# Micro-lotes para embeddings de consultas concurrentes (métricas en /metrics/embeddings/)
+EMBEDDING_MICROBATCH_ENABLED = os.getenv('EMBEDDING_MICROBATCH_ENABLED', 'True').lower() == 'true'
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', '5'))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '32'))
+
+# Cache LRU/TTL de embeddings de consultas (texto normalizado -> vector)
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'True').lower() == 'true'
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '10000'))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv('QUERY_CACHE_TTL_SECONDS', '3600'))
+
+# Backend de inferencia de embeddings: torch, onnx u onnx-int8
+# (requiere optimum[onnxruntime]; sin él se usa torch). Exportar con 'manage.py exportar_onnx'.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_DIR = os.getenv('EMBEDDING_ONNX_DIR', os.path.join(BASE_DIR, 'media', 'models', 'onnx'))
+EMBEDDING_ONNX_QUANTIZATION = os.getenv('EMBEDDING_ONNX_QUANTIZATION', 'avx512_vnni')
+
+# Búsqueda híbrida de FAQs: fusión 'rrf' o 'ponderada'; la búsqueda textual solo
+# se ejecuta si el mejor score semántico queda por debajo de HYBRID_LEXICAL_THRESHOLD
+HYBRID_FUSION = os.getenv('HYBRID_FUSION', 'rrf')
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+HYBRID_WEIGHT_SEMANTIC = float(os.getenv('HYBRID_WEIGHT_SEMANTIC', '0.8'))
+HYBRID_WEIGHT_LEXICAL = float(os.getenv('HYBRID_WEIGHT_LEXICAL', '0.4'))
+HYBRID_LEXICAL_THRESHOLD = float(os.getenv('HYBRID_LEXICAL_THRESHOLD', '0.85'))
+HYBRID_MIN_CONFIDENCE = float(os.getenv('HYBRID_MIN_CONFIDENCE', '0.3'))
+
+# Re-ranking opcional de candidatos web/PDF con un cross-encoder
+RERANKER_ENABLED = os.getenv('RERANKER_ENABLED', 'False').lower() == 'true'
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+RERANKER_TOP_N = int(os.getenv('RERANKER_TOP_N', '10'))
+RERANKER_TIMEOUT_MS = int(os.getenv('RERANKER_TIMEOUT_MS', '150'))
+RERANKER_MIN_SCORE = float(os.getenv('RERANKER_MIN_SCORE', '0.3'))
+RERANKER_CACHE_MAX_ENTRIES = int(os.getenv('RERANKER_CACHE_MAX_ENTRIES', '20000'))
+RERANKER_CACHE_TTL_SECONDS = int(os.getenv('RERANKER_CACHE_TTL_SECONDS', '3600'))
+
+# Umbrales de similitud coseno sobre los resultados de buscar_documentos
+VECTOR_FAQ_DIRECT_THRESHOLD = float(os.getenv('VECTOR_FAQ_DIRECT_THRESHOLD', '0.75'))
+VECTOR_FAQ_FALLBACK_THRESHOLD = float(os.getenv('VECTOR_FAQ_FALLBACK_THRESHOLD', '0.6'))
+VECTOR_CONTENT_THRESHOLD = float(os.getenv('VECTOR_CONTENT_THRESHOLD', '0.4'))
+VECTOR_RELEVANCE_THRESHOLD = float(os.getenv('VECTOR_RELEVANCE_THRESHOLD', '0.3'))
+
+# Detección de FAQs duplicadas con el índice de preguntas en memoria
+# (similitud coseno entre embeddings; el recorrido léxico del CSV usa umbral_similitud)
+FAQ_DUPLICATE_COSINE_THRESHOLD = float(os.getenv('FAQ_DUPLICATE_COSINE_THRESHOLD', '0.8'))
+FAQ_DUPLICATE_LEXICAL_CONFIRM = os.getenv('FAQ_DUPLICATE_LEXICAL_CONFIRM', 'True').lower() == 'true'
+FAQ_DUPLICATE_LEXICAL_MIN = float(os.getenv('FAQ_DUPLICATE_LEXICAL_MIN', '0.2'))
+
+# Búsqueda de FAQs multi-vector (embeddings de pregunta y de respuesta):
+# 'max' toma la mejor de las dos similitudes, 'ponderada' las combina con estos pesos
+FAQ_MULTIVECTOR_FUSION = os.getenv('FAQ_MULTIVECTOR_FUSION', 'max')
+FAQ_MULTIVECTOR_PESO_PREGUNTA = float(os.getenv('FAQ_MULTIVECTOR_PESO_PREGUNTA', '0.6'))
+
+# Cada proceso se suscribe a los cambios de la colección 'faqs' (on_snapshot) y los
+# aplica a su índice en memoria: altas, modificaciones y desactivaciones (activo=False)
+FAQ_CHANGE_FEED_ENABLED = os.getenv('FAQ_CHANGE_FEED_ENABLED', 'True').lower() == 'true'
+# El índice de FAQs se compacta (sin re-embeber) cuando los tombstones superan esta fracción
+FAQ_INDEX_COMPACTION_RATIO = float(os.getenv('FAQ_INDEX_COMPACTION_RATIO', '0.2'))
+
+# Formato de los embeddings de FAQ en Firestore: 'lista' (original), 'float16' o 'float32'
+# (blob binario). La lectura acepta ambos; DUAL_WRITE escribe los dos durante la migración.
+FIREBASE_EMBEDDING_ENCODING = os.getenv('FIREBASE_EMBEDDING_ENCODING', 'lista')
+FIREBASE_EMBEDDING_DUAL_WRITE = os.getenv('FIREBASE_EMBEDDING_DUAL_WRITE', 'False').lower() == 'true'